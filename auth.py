@@ -10,49 +10,334 @@ Reusable authentication module for all Microsoft services:
 - etc.
 """
 
+import asyncio
+import logging
 import os
+import time
+import uuid
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
+from typing import Any
 
 import httpx
 from dotenv import load_dotenv
 
+from caching import SingleFlight
+from json_stream import iter_object_items
+from metrics import (
+    JSON_PARSE,
+    REQUESTS_IN_FLIGHT,
+    RESPONSES,
+    RETRIES,
+    TOKEN_FETCH,
+    TRANSPORT_ERRORS,
+    HttpTrace,
+)
+from throttling import RETRYABLE_STATUS_CODES, RateLimiter, RetryPolicy, endpoint_key
+from tracing import span
+
 # Load .env from project directory
 load_dotenv(Path(__file__).parent / ".env")
 
+logger = logging.getLogger(__name__)
+
 TENANT_ID = os.environ.get("AZURE_TENANT_ID")
 CLIENT_ID = os.environ.get("AZURE_CLIENT_ID")
 CLIENT_SECRET = os.environ.get("AZURE_CLIENT_SECRET")
 
+# Overridable so benchmarks can point the server at a local stand-in
+GRAPH_BASE_URL = os.environ.get("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0").rstrip("/")
+GRAPH_LOGIN_URL = os.environ.get("GRAPH_LOGIN_URL", "https://login.microsoftonline.com").rstrip("/")
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+
+# Refresh tokens in the background this many seconds before they expire
+TOKEN_REFRESH_MARGIN = float(os.environ.get("GRAPH_TOKEN_REFRESH_MARGIN", "300"))
+
+# Never hand out a token this close to expiry, it may lapse while in flight
+TOKEN_EXPIRY_SKEW = 30.0
+
+
+@dataclass
+class CachedToken:
+    """Access token together with its expiry on the monotonic clock."""
+
+    access_token: str
+    expires_at: float
+
+    def is_valid(self, now: float) -> bool:
+        return now < self.expires_at - TOKEN_EXPIRY_SKEW
+
+    def needs_refresh(self, now: float) -> bool:
+        return now >= self.expires_at - TOKEN_REFRESH_MARGIN
+
+
+# Connection pool settings for the shared HTTP client
+HTTP_MAX_CONNECTIONS = int(os.environ.get("GRAPH_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("GRAPH_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("GRAPH_KEEPALIVE_EXPIRY", "60"))
+
+# Opt in to HTTP/2 so concurrent requests multiplex over a single connection
+HTTP2_ENABLED = os.environ.get("GRAPH_HTTP2", "").lower() in ("1", "true", "yes")
+
+_http_client: httpx.AsyncClient | None = None
+
+# Graph accepts at most this many requests in one JSON $batch call
+BATCH_MAX_REQUESTS = 20
+
+# Retry decisions for throttled and transiently failing Graph requests
+retry_policy = RetryPolicy()
+
+# Client-side pacing per Graph workload (hunting queries, directory reads)
+rate_limiter = RateLimiter()
+
+# Tokens and in-flight token requests, keyed by (tenant, client, scope)
+_token_cache: dict[tuple[str, str, str], CachedToken] = {}
+_token_refreshes: dict[tuple[str, str, str], asyncio.Task] = {}
+
+# Identical GET requests in flight at the same time share one upstream call
+inflight_requests = SingleFlight()
+
 
 def is_configured() -> bool:
     """Check if Azure credentials are configured."""
     return all([TENANT_ID, CLIENT_ID, CLIENT_SECRET])
 
 
-async def get_graph_token() -> str:
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_http_client(http2: bool = HTTP2_ENABLED, **kwargs) -> httpx.AsyncClient:
+    """
+    Build a pooled HTTP client.
+
+    With http2=True the client offers HTTP/2 during the TLS handshake and
+    falls back to HTTP/1.1 when the server doesn't accept it. If the optional
+    h2 package is missing, HTTP/1.1 is used throughout.
+    """
+    if http2 and not _http2_available():
+        logger.warning("GRAPH_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=120.0,
+        **kwargs,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client used for all Entra ID and Graph traffic.
+
+    The client is created on first use and keeps its connection pool warm
+    across tool calls until close_http_client() is called.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Cancel pending token refreshes and close the shared HTTP client."""
+    global _http_client
+    client, _http_client = _http_client, None
+
+    for task in list(_token_refreshes.values()):
+        task.cancel()
+    inflight_requests.cancel_all()
+
+    if client is not None:
+        await client.aclose()
+
+
+async def _fetch_token(scope: str) -> CachedToken:
+    """Request a new token from Entra ID using the client credentials flow."""
+    started = time.perf_counter()
+    response = await get_http_client().post(
+        f"{GRAPH_LOGIN_URL}/{TENANT_ID}/oauth2/v2.0/token",
+        data={
+            "client_id": CLIENT_ID,
+            "client_secret": CLIENT_SECRET,
+            "scope": scope,
+            "grant_type": "client_credentials",
+        },
+    )
+    response.raise_for_status()
+    payload = response.json()
+    TOKEN_FETCH.observe(time.perf_counter() - started)
+    return CachedToken(
+        access_token=payload["access_token"],
+        expires_at=time.monotonic() + float(payload.get("expires_in", 3599)),
+    )
+
+
+def _store_token(key: tuple[str, str, str], task: asyncio.Task) -> None:
+    _token_refreshes.pop(key, None)
+    # Retrieving the exception also keeps failed background refreshes quiet;
+    # the next caller that actually needs a token will retry and see the error.
+    if not task.cancelled() and task.exception() is None:
+        _token_cache[key] = task.result()
+
+
+def _refresh_token(key: tuple[str, str, str], scope: str) -> asyncio.Task:
+    """Start a token request, or join the one already in flight for this key."""
+    task = _token_refreshes.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_token(scope))
+        task.add_done_callback(partial(_store_token, key))
+        _token_refreshes[key] = task
+    return task
+
+
+def clear_token_cache() -> None:
+    """Forget all cached tokens so the next request fetches a fresh one."""
+    _token_cache.clear()
+
+
+async def get_graph_token(scope: str = GRAPH_SCOPE) -> str:
     """
     Get Microsoft Graph access token.
 
     Uses client credentials flow (app-only authentication).
-    Token is cached for reuse within the session.
+    Tokens are cached per (tenant, client, scope) for the lifetime of the
+    process and refreshed in the background once they are within
+    GRAPH_TOKEN_REFRESH_MARGIN seconds of expiry. Concurrent callers share a
+    single in-flight token request.
     """
     if not is_configured():
         raise ValueError(
             "Missing Azure credentials. Set AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET."
         )
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token",
-            data={
-                "client_id": CLIENT_ID,
-                "client_secret": CLIENT_SECRET,
-                "scope": "https://graph.microsoft.com/.default",
-                "grant_type": "client_credentials",
+    key = (TENANT_ID, CLIENT_ID, scope)
+    now = time.monotonic()
+    cached = _token_cache.get(key)
+
+    if cached is not None and cached.is_valid(now):
+        if cached.needs_refresh(now):
+            _refresh_token(key, scope)
+        return cached.access_token
+
+    with span("graph.token", {"graph.token.scope": scope}):
+        # Shield the shared request so one cancelled caller doesn't fail the rest
+        token = await asyncio.shield(_refresh_token(key, scope))
+    return token.access_token
+
+
+async def _send(
+    method: str,
+    endpoint: str,
+    json: dict | None = None,
+    headers: dict | None = None,
+    timeout: float = 120.0,
+    stream: bool = False,
+) -> httpx.Response:
+    """
+    Send an authenticated Graph request, retrying throttled and transient failures.
+
+    Every attempt, including retries, first waits for the workload's rate limiter,
+    and is traced as its own span. All attempts carry the same client-request-id
+    header unless the caller supplies one. A 401 response, e.g. for a token
+    revoked before its expiry, clears the token cache and is retried right
+    away, once, with a fresh token. With stream=True a successful response is
+    returned before its body is read; the caller must close it.
+
+    Raises httpx.HTTPStatusError once retries are exhausted or not allowed.
+    """
+    # Absolute URLs come from Graph itself, e.g. @odata.nextLink
+    url = endpoint if endpoint.startswith(("https://", "http://")) else f"{GRAPH_BASE_URL}{endpoint}"
+    client = get_http_client()
+    workload = endpoint_key(endpoint)
+    in_flight = REQUESTS_IN_FLIGHT.labels(workload)
+    client_request_id = str(uuid.uuid4())
+    attempt = 0
+    reauthenticated = False
+
+    while True:
+        request_headers = {
+            "Authorization": f"Bearer {await get_graph_token()}",
+            "Content-Type": "application/json",
+            # Graph echoes this back and logs it, so a request can be looked up with Microsoft support
+            "client-request-id": client_request_id,
+        }
+        if headers:
+            request_headers.update(headers)
+
+        with span(
+            f"graph.request {method.upper()} {workload}",
+            {
+                "http.request.method": method.upper(),
+                "url.full": url.split("?")[0],
+                "graph.endpoint": workload,
+                "http.request.resend_count": attempt or None,
             },
-        )
-        response.raise_for_status()
-        return response.json()["access_token"]
+            client=True,
+        ) as current:
+            queued = time.perf_counter()
+            await rate_limiter.acquire(endpoint)
+            current.set_attribute("graph.rate_limit_wait_ms", round((time.perf_counter() - queued) * 1000, 1))
+            request = client.build_request(
+                method=method,
+                url=url,
+                headers=request_headers,
+                json=json,
+                timeout=timeout,
+                extensions={"trace": HttpTrace(workload)},
+            )
+            current.set_attribute("graph.client_request_id", request.headers.get("client-request-id"))
+            in_flight.inc()
+            try:
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                TRANSPORT_ERRORS.labels(workload).inc()
+                delay = retry_policy.next_delay(method, endpoint, attempt, error=e)
+                if delay is None:
+                    raise
+                RETRIES.labels(workload, "transport").inc()
+                current.record_error(f"{type(e).__name__}: {e}")
+            else:
+                RESPONSES.labels(workload, method.upper(), response.status_code).inc()
+                current.set_attributes(
+                    {
+                        "http.response.status_code": response.status_code,
+                        "graph.request_id": response.headers.get("request-id"),
+                    }
+                )
+                if response.is_success:
+                    return response
+                current.record_error(f"HTTP {response.status_code}")
+                # Error bodies are small; reading them also releases the connection
+                await response.aread()
+                if response.status_code == 401 and not reauthenticated:
+                    reauthenticated = True
+                    clear_token_cache()
+                    RETRIES.labels(workload, response.status_code).inc()
+                    continue
+                delay = retry_policy.next_delay(method, endpoint, attempt, response=response)
+                if delay is None:
+                    response.raise_for_status()
+                    return response
+                RETRIES.labels(workload, response.status_code).inc()
+                if response.status_code == 429:
+                    rate_limiter.pause(endpoint, delay)
+            finally:
+                in_flight.dec()
+
+        await asyncio.sleep(delay)
+        attempt += 1
 
 
 async def graph_request(
@@ -65,9 +350,15 @@ async def graph_request(
     """
     Make an authenticated request to Microsoft Graph API.
 
+    Throttled (429) and transient (503/504) failures are retried inside the
+    call according to retry_policy, honouring Graph's Retry-After header.
+    Concurrent GET requests for the same URL and headers are sent once and
+    every caller receives the same (read-only) result.
+
     Args:
         method: HTTP method (GET, POST, etc.)
-        endpoint: API endpoint (e.g., "/security/runHuntingQuery")
+        endpoint: API endpoint (e.g., "/security/runHuntingQuery") or an
+                  absolute Graph URL such as an @odata.nextLink
         json: Request body for POST/PATCH requests
         headers: Additional headers to include in the request
         timeout: Request timeout in seconds
@@ -75,22 +366,185 @@ async def graph_request(
     Returns:
         JSON response from the API
     """
-    token = await get_graph_token()
-    url = f"https://graph.microsoft.com/v1.0{endpoint}"
-
-    request_headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
-    if headers:
-        request_headers.update(headers)
-
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        response = await client.request(
-            method=method,
-            url=url,
-            headers=request_headers,
-            json=json,
+    if method.upper() == "GET" and json is None:
+        key = (endpoint, tuple(sorted((headers or {}).items())))
+        return await inflight_requests.do(key, partial(_request_json, method, endpoint, None, headers, timeout))
+    return await _request_json(method, endpoint, json, headers, timeout)
+
+
+async def _request_json(method: str, endpoint: str, json: dict | None, headers: dict | None, timeout: float) -> dict:
+    response = await _send(method, endpoint, json=json, headers=headers, timeout=timeout)
+    started = time.perf_counter()
+    payload = response.json()
+    JSON_PARSE.labels(endpoint_key(endpoint)).observe(time.perf_counter() - started)
+    return payload
+
+
+async def graph_stream(
+    method: str,
+    endpoint: str,
+    json: dict | None = None,
+    headers: dict | None = None,
+    stream_key: str = "results",
+    timeout: float = 120.0,
+    on_response: Callable[[httpx.Response], None] | None = None,
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Make an authenticated Graph request and parse the JSON response as it arrives.
+
+    Throttling and transient failures are retried as in graph_request, as long
+    as they happen before the response body starts streaming.
+
+    Args:
+        method: HTTP method (GET, POST, etc.)
+        endpoint: API endpoint (e.g., "/security/runHuntingQuery")
+        json: Request body for POST/PATCH requests
+        headers: Additional headers to include in the request
+        stream_key: Top-level array member to yield element by element
+        timeout: Request timeout in seconds
+        on_response: Called with the successful response before its body is read;
+            once the stream ends, its elapsed covers only that attempt
+
+    Yields:
+        (key, value) for each top-level member of the response, with each
+        element of the stream_key array yielded separately
+    """
+    response = await _send(method, endpoint, json=json, headers=headers, timeout=timeout, stream=True)
+    if on_response is not None:
+        on_response(response)
+    try:
+        async for item in iter_object_items(response.aiter_bytes(), stream_key):
+            yield item
+    finally:
+        await response.aclose()
+
+
+async def graph_pages(
+    endpoint: str,
+    headers: dict | None = None,
+    prefetch: int = 1,
+    timeout: float = 120.0,
+) -> AsyncIterator[dict]:
+    """
+    Iterate over the pages of a Graph collection, following @odata.nextLink.
+
+    Pages are fetched lazily. With prefetch > 0 a background task keeps up
+    to that many pages queued ahead of the consumer (plus one more waiting
+    for room in the queue), so the next page downloads while the current one
+    is being processed. Stopping iteration early cancels any outstanding fetch.
+
+    Args:
+        endpoint: Collection endpoint (e.g., "/users?$top=999")
+        headers: Additional headers to include in every page request
+        prefetch: Number of pages to fetch ahead of the consumer (0 = none)
+        timeout: Request timeout in seconds for each page
+
+    Yields:
+        Each page's JSON response, with items under "value"
+    """
+    if prefetch < 1:
+        link = endpoint
+        while link:
+            page = await graph_request("GET", link, headers=headers, timeout=timeout)
+            link = page.get("@odata.nextLink")
+            yield page
+        return
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch)
+
+    async def produce() -> None:
+        link = endpoint
+        try:
+            while link:
+                page = await graph_request("GET", link, headers=headers, timeout=timeout)
+                await queue.put(page)
+                link = page.get("@odata.nextLink")
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (page := await queue.get()) is not None:
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        producer.cancel()
+
+
+async def graph_batch(requests: list[dict], timeout: float = 120.0) -> list[dict]:
+    """
+    Send up to 20 requests in a single Microsoft Graph JSON $batch call.
+
+    Items that Graph throttles inside the batch (429/503/504) are resent in a
+    follow-up batch using the same retry rules as graph_request. Each item
+    counts against its own workload's rate limiter.
+
+    Args:
+        requests: Batch items with "method" and a version-relative "url"
+                  (e.g. "/users/{id}"), plus optional "headers" and "body"
+        timeout: Request timeout in seconds for each $batch call
+
+    Returns:
+        One response per request, in input order, each with "status",
+        "headers" and "body" as returned by Graph. A request the $batch
+        response leaves out gets a 502 item with a MissingBatchResponse error.
+    """
+    if len(requests) > BATCH_MAX_REQUESTS:
+        raise ValueError(f"A $batch call accepts at most {BATCH_MAX_REQUESTS} requests")
+
+    responses: list[dict | None] = [None] * len(requests)
+    pending = list(range(len(requests)))
+    attempt = 0
+
+    while pending:
+        for i in pending:
+            await rate_limiter.acquire(requests[i]["url"])
+
+        result = await graph_request(
+            method="POST",
+            endpoint="/$batch",
+            json={"requests": [{"id": str(i), **requests[i]} for i in pending]},
+            timeout=timeout,
         )
-        response.raise_for_status()
-        return response.json()
+
+        retry_ids, delays = [], []
+        returned = set()
+        for item in result.get("responses", []):
+            i = int(item["id"])
+            returned.add(i)
+            delay = None
+            if item.get("status") in RETRYABLE_STATUS_CODES:
+                delay = retry_policy.next_delay(
+                    requests[i]["method"],
+                    requests[i]["url"],
+                    attempt,
+                    response=httpx.Response(item["status"], headers=item.get("headers") or {}),
+                )
+            if delay is None:
+                responses[i] = item
+            else:
+                RETRIES.labels(endpoint_key(requests[i]["url"]), item["status"]).inc()
+                retry_ids.append(i)
+                delays.append(delay)
+        for i in pending:
+            if i not in returned:
+                responses[i] = {
+                    "id": str(i),
+                    "status": 502,
+                    "headers": {},
+                    "body": {
+                        "error": {
+                            "code": "MissingBatchResponse",
+                            "message": "The $batch response had no item for this request",
+                        }
+                    },
+                }
+
+        pending = retry_ids
+        if pending:
+            await asyncio.sleep(max(delays))
+            attempt += 1
+
+    return responses
@@ -0,0 +1,221 @@
+"""
+Benchmark HTTP/1.1 vs HTTP/2 for concurrent Graph-style requests.
+
+Starts a local TLS stand-in for graph.microsoft.com that speaks both HTTP/2
+and HTTP/1.1 (chosen via ALPN), then fires bursts of 1, 10 and 100
+concurrent GET requests through the same client factory graph_request uses.
+Each new connection pays a simulated handshake delay, so the numbers show
+what multiplexing saves when a burst of tool calls arrives on a cold pool.
+
+Usage:
+    uv run --extra http2 python benchmarks/http2_concurrency.py
+    uv run --extra http2 python benchmarks/http2_concurrency.py --latency-ms 50 --handshake-ms 80
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import ssl
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import h11
+import h2.config
+import h2.connection
+import h2.events
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from auth import _build_http_client  # noqa: E402
+
+BODY = json.dumps(
+    {
+        "@odata.context": "https://graph.microsoft.com/v1.0/$metadata#users/$entity",
+        "id": "00000000-0000-0000-0000-000000000000",
+        "displayName": "Benchmark User",
+        "userPrincipalName": "bench@example.com",
+    }
+).encode()
+
+
+class StandInServer:
+    """Minimal Graph stand-in serving a fixed JSON body over h2 or HTTP/1.1."""
+
+    def __init__(self, latency: float, handshake: float, enable_h2: bool):
+        self.latency = latency
+        self.handshake = handshake
+        self.enable_h2 = enable_h2
+        self.connections = 0
+        self.server: asyncio.base_events.Server | None = None
+        self.port = 0
+
+    async def start(self) -> None:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        with tempfile.TemporaryDirectory() as tmp:
+            cert_path, key_path = _write_self_signed_cert(Path(tmp))
+            context.load_cert_chain(cert_path, key_path)
+        context.set_alpn_protocols(["h2", "http/1.1"] if self.enable_h2 else ["http/1.1"])
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0, ssl=context)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        # Stand-in for the extra round trips of TCP + TLS setup to a remote host
+        await asyncio.sleep(self.handshake)
+        try:
+            if writer.get_extra_info("ssl_object").selected_alpn_protocol() == "h2":
+                await self._serve_h2(reader, writer)
+            else:
+                await self._serve_h11(reader, writer)
+        except (ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_h2(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        pending: set[asyncio.Task] = set()
+
+        async def respond(stream_id: int) -> None:
+            await asyncio.sleep(self.latency)
+            conn.send_headers(
+                stream_id,
+                [
+                    (":status", "200"),
+                    ("content-type", "application/json"),
+                    ("content-length", str(len(BODY))),
+                ],
+            )
+            conn.send_data(stream_id, BODY, end_stream=True)
+            writer.write(conn.data_to_send())
+
+        while data := await reader.read(65535):
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    task = asyncio.create_task(respond(event.stream_id))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            writer.write(conn.data_to_send())
+            await writer.drain()
+
+    async def _serve_h11(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = h11.Connection(h11.SERVER)
+        while True:
+            event = conn.next_event()
+            if event is h11.NEED_DATA:
+                conn.receive_data(await reader.read(65535))
+            elif isinstance(event, h11.EndOfMessage):
+                await asyncio.sleep(self.latency)
+                headers = [("content-type", "application/json"), ("content-length", str(len(BODY)))]
+                writer.write(conn.send(h11.Response(status_code=200, headers=headers)))
+                writer.write(conn.send(h11.Data(data=BODY)))
+                writer.write(conn.send(h11.EndOfMessage()))
+                await writer.drain()
+                conn.start_next_cycle()
+            elif isinstance(event, h11.ConnectionClosed) or event is h11.PAUSED:
+                return
+
+
+def _write_self_signed_cert(directory: Path) -> tuple[Path, Path]:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = directory / "cert.pem"
+    key_path = directory / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return cert_path, key_path
+
+
+async def run_burst(server: StandInServer, http2: bool, concurrency: int) -> dict:
+    """Fire one burst of concurrent requests on a cold client."""
+    url = f"https://127.0.0.1:{server.port}/v1.0/users/bench@example.com"
+    connections_before = server.connections
+    latencies: list[float] = []
+    versions: set[str] = set()
+
+    async with _build_http_client(http2=http2, verify=False) as client:
+
+        async def one() -> None:
+            start = time.perf_counter()
+            response = await client.get(url)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            versions.add(response.http_version)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "protocol": "/".join(sorted(versions)),
+        "concurrency": concurrency,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "wall_ms": wall * 1000,
+        "connections": server.connections - connections_before,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated Graph processing time")
+    parser.add_argument("--handshake-ms", type=float, default=50.0, help="Simulated connection setup time")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--rounds", type=int, default=3, help="Bursts per configuration; the median burst is reported")
+    parser.add_argument("--no-server-h2", action="store_true", help="Disable h2 on the server to exercise the HTTP/1.1 fallback")
+    args = parser.parse_args()
+
+    server = StandInServer(args.latency_ms / 1000, args.handshake_ms / 1000, enable_h2=not args.no_server_h2)
+    await server.start()
+
+    header = f"{'client':<10} {'negotiated':<12} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'wall ms':>9} {'conns':>6}"
+    print(header)
+    print("-" * len(header))
+    try:
+        for http2 in (False, True):
+            for concurrency in args.concurrency:
+                bursts = [await run_burst(server, http2, concurrency) for _ in range(args.rounds)]
+                r = sorted(bursts, key=lambda b: b["wall_ms"])[len(bursts) // 2]
+                print(
+                    f"{'http2' if http2 else 'http1.1':<10} {r['protocol']:<12} {r['concurrency']:>5} "
+                    f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['max_ms']:>9.1f} {r['wall_ms']:>9.1f} {r['connections']:>6}"
+                )
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
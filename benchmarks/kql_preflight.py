@@ -0,0 +1,136 @@
+"""
+Benchmark the KQL preflight check on a corpus of typical hunting queries.
+
+For each query, shows the findings and estimated scan cost, then runs the
+query against the local Graph stand-in (benchmarks/mock_graph.py) as written
+and as rewritten by HUNT_PREFLIGHT=rewrite, and compares rows downloaded and
+wall time. Also reports the analyzer's own overhead per query.
+
+The stand-in ignores where clauses and returns --hunt-rows rows unless the
+query has a take or aggregates, so the measured savings come from the take
+guard alone; the Timestamp bound only shows in the estimated cost.
+
+Usage:
+    uv run python benchmarks/kql_preflight.py
+    uv run python benchmarks/kql_preflight.py --hunt-rows 50000 --latency-ms 100
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from load_test import _free_port, _start_mock  # noqa: E402
+from mock_graph import add_arguments  # noqa: E402
+
+from formatting import HUNT_OUTPUT_MAX_ROWS  # noqa: E402
+from kql import analyze_query  # noqa: E402
+
+CORPUS = [
+    'DeviceProcessEvents | where ProcessCommandLine contains "mimikatz"',
+    'DeviceProcessEvents | where FileName =~ "powershell.exe" and ProcessCommandLine has "-enc"',
+    "DeviceNetworkEvents | where RemotePort == 4444",
+    'DeviceNetworkEvents | where Timestamp > ago(1d) | where RemoteUrl endswith ".onion"',
+    'DeviceFileEvents | where FolderPath contains "\\\\Temp\\\\" and FileName endswith ".exe"',
+    'DeviceRegistryEvents | where RegistryKey has @"CurrentVersion\\Run"',
+    'EmailEvents | where Timestamp > ago(7d) | where SenderFromDomain == "contoso-billing.example"',
+    "DeviceLogonEvents | where Timestamp > ago(3d) | where LogonType == 'RemoteInteractive' | take 100",
+    "AlertInfo | where Timestamp > ago(7d) | summarize count() by Severity",
+    "DeviceInfo | summarize arg_max(Timestamp, *) by DeviceId",
+    "IdentityLogonEvents | where ActionType == 'LogonFailed' | summarize Failures = count() by AccountUpn",
+    'let suspicious = dynamic(["rundll32.exe", "regsvr32.exe"]);\n'
+    "DeviceProcessEvents | where FileName in~ (suspicious)",
+    'search "evil.example"',
+]
+
+
+def _short(query: str, width: int = 58) -> str:
+    text = " ".join(query.split())
+    return text if len(text) <= width else text[: width - 1] + "…"
+
+
+def analyzer_overhead(repeats: int) -> float:
+    """Average microseconds to analyze one corpus query."""
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for query in CORPUS:
+            analyze_query(query, 30, HUNT_OUTPUT_MAX_ROWS)
+    return (time.perf_counter() - started) / (repeats * len(CORPUS)) * 1e6
+
+
+async def timed(server, query: str) -> tuple[int, float]:
+    started = time.perf_counter()
+    result = await server._run_hunting_query(query, "P30D")
+    return len(result), time.perf_counter() - started
+
+
+async def main(args: argparse.Namespace) -> None:
+    import defender_hunting as server
+    from auth import close_http_client
+
+    header = f"{'query':<58} {'findings':<38} {'est. cost':>9} {'rows':>13} {'ms':>15}"
+    print(header)
+    print("-" * len(header))
+    totals = [0, 0, 0.0, 0.0]
+    try:
+        await server._run_hunting_query("DeviceInfo | take 1", "P1D")  # warm up the token and connection
+        for query in CORPUS:
+            analysis = analyze_query(query, 30, HUNT_OUTPUT_MAX_ROWS)
+            findings = ",".join(finding.code for finding in analysis.findings) or "-"
+            rows_before, seconds_before = await timed(server, query)
+            if analysis.rewritten != query:
+                rows_after, seconds_after = await timed(server, analysis.rewritten)
+            else:
+                rows_after, seconds_after = rows_before, seconds_before
+            totals[0] += rows_before
+            totals[1] += rows_after
+            totals[2] += seconds_before
+            totals[3] += seconds_after
+            print(
+                f"{_short(query):<58} {findings:<38} {analysis.cost:>9,.0f} "
+                f"{rows_before:>6}→{rows_after:<6} {seconds_before * 1000:>7.0f}→{seconds_after * 1000:<7.0f}"
+            )
+    finally:
+        await close_http_client()
+
+    print("-" * len(header))
+    print(f"Rows downloaded: {totals[0]} as written, {totals[1]} rewritten")
+    print(
+        f"Wall time: {totals[2]:.2f}s as written, {totals[3]:.2f}s rewritten "
+        f"({1 - totals[3] / totals[2]:.0%} saved)"
+    )
+    print(f"Analyzer overhead: {analyzer_overhead(args.repeats):.0f} µs per query")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=200, help="Corpus passes when timing the analyzer")
+    add_arguments(parser)
+    parser.set_defaults(hunt_rows=20000)
+    args = parser.parse_args()
+
+    port = _free_port()
+    mock = _start_mock(args, port)
+
+    # Configure the server before it is imported; never send real credentials to the stand-in
+    os.environ.update(
+        {
+            "GRAPH_BASE_URL": f"http://127.0.0.1:{port}/v1.0",
+            "GRAPH_LOGIN_URL": f"http://127.0.0.1:{port}",
+            "AZURE_TENANT_ID": "00000000-0000-0000-0000-000000000000",
+            "AZURE_CLIENT_ID": "preflight-benchmark",
+            "AZURE_CLIENT_SECRET": "preflight-benchmark",
+            "GRAPH_USER_MIRROR": "0",
+            "GRAPH_HUNTING_RATE": "100000",
+            "GRAPH_HUNTING_BURST": "100000",
+        }
+    )
+    try:
+        asyncio.run(main(args))
+    finally:
+        mock.terminate()
+        mock.wait()
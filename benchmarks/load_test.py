@@ -0,0 +1,188 @@
+"""
+Load test the MCP tools against the local Graph stand-in.
+
+Starts benchmarks/mock_graph.py in a subprocess, points the server at it via
+GRAPH_BASE_URL / GRAPH_LOGIN_URL and calls the tool functions directly at
+each concurrency level. Caches and the user mirror are bypassed so every call
+reaches the stand-in, and the client-side rate limits are lifted unless
+--client-rate-limits is given (at the real 0.75 hunts/s the hunt numbers
+would only measure the limiter). Reports p50/p95/p99 latency, throughput,
+errors and the process's peak RSS so far.
+
+Usage:
+    uv run python benchmarks/load_test.py
+    uv run python benchmarks/load_test.py --tools hunt --concurrency 1 8 32 --requests 200 --hunt-rows 5000
+    uv run python benchmarks/load_test.py --throttle-ratio 0.05 --latency-ms 80
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mock_graph import add_arguments  # noqa: E402
+
+TOOLS = ("hunt", "get_user", "list_users")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Mock Graph server did not start on port {port}")
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _start_mock(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable,
+        str(Path(__file__).with_name("mock_graph.py")),
+        "--port", str(port),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--throttle-ratio", str(args.throttle_ratio),
+        "--retry-after", str(args.retry_after),
+        "--users", str(args.users),
+        "--page-size", str(args.page_size),
+        "--hunt-rows", str(args.hunt_rows),
+        "--seed", str(args.seed),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        _wait_for_port(port)
+    except RuntimeError:
+        process.terminate()
+        raise
+    return process
+
+
+def _calls(server, tool: str, args: argparse.Namespace):
+    """Return a factory producing the i-th call of a tool; inputs vary so calls aren't deduplicated."""
+    if tool == "hunt":
+        return lambda i: server.hunt(
+            f"DeviceProcessEvents | take {args.hunt_rows} | extend Run = {i}", bypass_cache=True, fetch_all=True
+        )
+    if tool == "get_user":
+        return lambda i: server.get_user(f"user{i % args.users}@contoso.example", live=True)
+    return lambda i: server.list_users(
+        filter=f"startswith(displayName, 'User {i}')", max_results=args.list_results, live=True
+    )
+
+
+async def run_level(call, concurrency: int, requests: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            output = await call(i)
+            latencies.append(time.perf_counter() - started)
+            if output.startswith(("Error", "API Error")):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "p50": cuts[49] * 1000,
+        "p95": cuts[94] * 1000,
+        "p99": cuts[98] * 1000,
+        "throughput": len(latencies) / elapsed,
+        "errors": errors,
+        "rss": _peak_rss_mb(),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    import defender_hunting as server
+    from auth import close_http_client
+
+    header = (
+        f"{'tool':<11} {'conc':>5} {'reqs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'req/s':>8} {'errors':>7} {'peak RSS MB':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    try:
+        for tool in args.tools:
+            call = _calls(server, tool, args)
+            await call(0)  # warm up the token and connection pool
+            for concurrency in args.concurrency:
+                stats = await run_level(call, concurrency, args.requests)
+                rss = f"{stats['rss']:.0f}" if stats["rss"] is not None else "n/a"
+                print(
+                    f"{tool:<11} {concurrency:>5} {args.requests:>5} {stats['p50']:>9.1f} {stats['p95']:>9.1f} "
+                    f"{stats['p99']:>9.1f} {stats['throughput']:>8.1f} {stats['errors']:>7} {rss:>12}"
+                )
+    finally:
+        await close_http_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tools", nargs="+", choices=TOOLS, default=list(TOOLS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=100, help="Calls per tool and concurrency level")
+    parser.add_argument("--list-results", type=int, default=500, help="Users each list_users call pages through")
+    parser.add_argument(
+        "--client-rate-limits", action="store_true", help="Keep the server's Graph rate limits instead of lifting them"
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    port = _free_port()
+    mock = _start_mock(args, port)
+
+    # Configure the server before it is imported; never send real credentials to the stand-in
+    os.environ.update(
+        {
+            "GRAPH_BASE_URL": f"http://127.0.0.1:{port}/v1.0",
+            "GRAPH_LOGIN_URL": f"http://127.0.0.1:{port}",
+            "AZURE_TENANT_ID": "00000000-0000-0000-0000-000000000000",
+            "AZURE_CLIENT_ID": "load-test",
+            "AZURE_CLIENT_SECRET": "load-test",
+            "GRAPH_USER_MIRROR": "0",
+        }
+    )
+    if not args.client_rate_limits:
+        for name in ("GRAPH_HUNTING_RATE", "GRAPH_HUNTING_BURST", "GRAPH_USERS_RATE", "GRAPH_USERS_BURST"):
+            os.environ[name] = "100000"
+    try:
+        asyncio.run(main(args))
+    finally:
+        mock.terminate()
+        mock.wait()
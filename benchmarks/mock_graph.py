@@ -0,0 +1,300 @@
+"""
+Local stand-in for login.microsoftonline.com and graph.microsoft.com.
+
+Serves just enough of both APIs for the server's tools to run end to end
+without a tenant:
+- POST /{tenant}/oauth2/v2.0/token          client credentials tokens
+- GET  /v1.0/users/{id}                      a user, with an ETag; 404 for ids starting with "missing"
+- GET  /v1.0/users                           paged with $top and @odata.nextLink, optional @odata.count
+- GET  /v1.0/users/delta                     paged, ending with an @odata.deltaLink
+- POST /v1.0/$batch                          JSON batches of the requests above
+- POST /v1.0/security/runHuntingQuery        synthetic process events; "take N" or
+                                             "top N" in the query sets the row count, a
+                                             final "| count" returns it, summarize, count
+                                             and distinct cap it at 50, and the body is
+                                             streamed in chunks
+
+Filters, $search and $orderby are accepted but ignored. Latency, throttling
+(429 with Retry-After) and payload sizes are configurable.
+
+Usage:
+    uv run python benchmarks/mock_graph.py --port 8765 --latency-ms 40 --throttle-ratio 0.05
+
+Then run the server against it:
+    GRAPH_BASE_URL=http://127.0.0.1:8765/v1.0 GRAPH_LOGIN_URL=http://127.0.0.1:8765 \\
+    AZURE_TENANT_ID=t AZURE_CLIENT_ID=c AZURE_CLIENT_SECRET=s uv run python defender_hunting.py
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import secrets
+from dataclasses import dataclass
+from urllib.parse import urlencode
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+ROWS_PER_CHUNK = 500
+AGGREGATE_ROWS = 50
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 20.0
+    jitter_ms: float = 10.0
+    throttle_ratio: float = 0.0
+    retry_after: int = 1
+    users: int = 5000
+    page_size: int = 100
+    hunt_rows: int = 1000
+    seed: int = 7
+
+
+def _user(index: int) -> dict:
+    return {
+        "@odata.etag": f'W/"{index:08d}"',
+        "id": f"00000000-0000-0000-0000-{index:012d}",
+        "displayName": f"User {index}",
+        "userPrincipalName": f"user{index}@contoso.example",
+        "mail": f"user{index}@contoso.example",
+        "jobTitle": ["Analyst", "Engineer", "Manager", None][index % 4],
+        "department": ["Security", "IT", "Finance", "Sales"][index % 4],
+        "officeLocation": f"Building {index % 7}",
+        "mobilePhone": None,
+        "businessPhones": [f"+1 555 {index % 10000:04d}"],
+        "accountEnabled": index % 17 != 0,
+        "createdDateTime": f"2024-{index % 12 + 1:02d}-01T08:00:00Z",
+    }
+
+
+_HUNT_SCHEMA = [
+    {"Name": "Timestamp", "Type": "DateTime"},
+    {"Name": "DeviceId", "Type": "String"},
+    {"Name": "DeviceName", "Type": "String"},
+    {"Name": "ActionType", "Type": "String"},
+    {"Name": "FileName", "Type": "String"},
+    {"Name": "FolderPath", "Type": "String"},
+    {"Name": "SHA256", "Type": "String"},
+    {"Name": "ProcessCommandLine", "Type": "String"},
+    {"Name": "AccountName", "Type": "String"},
+    {"Name": "ProcessId", "Type": "Int64"},
+    {"Name": "ReportId", "Type": "Int64"},
+    {"Name": "AdditionalFields", "Type": "Dynamic"},
+]
+
+
+def _hunt_row(rng: random.Random, index: int) -> dict:
+    name = rng.choice(["powershell.exe", "cmd.exe", "rundll32.exe", "chrome.exe", "svchost.exe"])
+    device = rng.randrange(200)
+    return {
+        "Timestamp": f"2026-10-{index % 28 + 1:02d}T{index % 24:02d}:{index % 60:02d}:00.000Z",
+        "DeviceId": f"{device:040x}",
+        "DeviceName": f"wks-{device:04d}.contoso.example",
+        "ActionType": "ProcessCreated",
+        "FileName": name,
+        "FolderPath": f"C:\\\\Windows\\\\System32\\\\{name}",
+        "SHA256": f"{rng.getrandbits(256):064x}",
+        "ProcessCommandLine": f"{name} -NoProfile -EncodedCommand {rng.getrandbits(400):0100x}",
+        "AccountName": rng.choice(["alice", "bob", "system", "svc-backup"]),
+        "ProcessId": rng.randrange(100, 65000),
+        "ReportId": index,
+        "AdditionalFields": None,
+    }
+
+
+class MockGraph:
+    """Request handlers sharing one configuration and random generator."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.requests = 0
+        self.throttled = 0
+
+    async def _delay(self) -> None:
+        latency = self.config.latency_ms + self.rng.uniform(0, self.config.jitter_ms)
+        await asyncio.sleep(latency / 1000)
+
+    def _throttle(self) -> Response | None:
+        self.requests += 1
+        if self.config.throttle_ratio and self.rng.random() < self.config.throttle_ratio:
+            self.throttled += 1
+            return JSONResponse(
+                {"error": {"code": "TooManyRequests", "message": "Too many requests"}},
+                status_code=429,
+                headers={"Retry-After": str(self.config.retry_after)},
+            )
+        return None
+
+    def _base(self, request: Request) -> str:
+        return f"{request.url.scheme}://{request.url.netloc}/v1.0"
+
+    async def token(self, request: Request) -> Response:
+        await self._delay()
+        return JSONResponse(
+            {"token_type": "Bearer", "expires_in": 3599, "access_token": secrets.token_urlsafe(32)}
+        )
+
+    def _get_user(self, user_id: str) -> tuple[int, dict]:
+        if user_id.startswith("missing"):
+            return 404, {"error": {"code": "Request_ResourceNotFound", "message": f"User '{user_id}' not found"}}
+        match = re.search(r"(\d+)", user_id)
+        index = int(match.group(1)) % max(self.config.users, 1) if match else 0
+        return 200, _user(index)
+
+    def _list_users(self, base: str, params: dict, delta: bool = False) -> dict:
+        top = min(int(params.get("$top", self.config.page_size)), 999)
+        skip = int(params.get("$skiptoken", 0))
+        users = [_user(i) for i in range(skip, min(skip + top, self.config.users))]
+        page = {"value": users}
+        if skip == 0 and params.get("$count") == "true":
+            page["@odata.count"] = self.config.users
+        path = "/users/delta" if delta else "/users"
+        if skip + top < self.config.users:
+            page["@odata.nextLink"] = f"{base}{path}?" + urlencode({"$top": top, "$skiptoken": skip + top})
+        elif delta:
+            page["@odata.deltaLink"] = f"{base}/users/delta?" + urlencode({"$deltatoken": secrets.token_hex(8)})
+        return page
+
+    async def user(self, request: Request) -> Response:
+        await self._delay()
+        throttled = self._throttle()
+        if throttled is not None:
+            return throttled
+        status, body = self._get_user(request.path_params["user_id"])
+        etag = body.get("@odata.etag")
+        if status == 200 and etag and request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(body, status_code=status, headers={"ETag": etag} if etag else None)
+
+    async def users(self, request: Request) -> Response:
+        await self._delay()
+        throttled = self._throttle()
+        if throttled is not None:
+            return throttled
+        return JSONResponse(self._list_users(self._base(request), dict(request.query_params)))
+
+    async def users_delta(self, request: Request) -> Response:
+        await self._delay()
+        throttled = self._throttle()
+        if throttled is not None:
+            return throttled
+        params = dict(request.query_params)
+        if "$deltatoken" in params:
+            return JSONResponse({"value": [], "@odata.deltaLink": str(request.url)})
+        return JSONResponse(self._list_users(self._base(request), params, delta=True))
+
+    async def batch(self, request: Request) -> Response:
+        await self._delay()
+        throttled = self._throttle()
+        if throttled is not None:
+            return throttled
+        payload = await request.json()
+        responses = []
+        for item in payload.get("requests", []):
+            path = item["url"].split("?")[0].strip("/")
+            if self.config.throttle_ratio and self.rng.random() < self.config.throttle_ratio:
+                self.throttled += 1
+                responses.append(
+                    {
+                        "id": item["id"],
+                        "status": 429,
+                        "headers": {"Retry-After": str(self.config.retry_after)},
+                        "body": {"error": {"code": "TooManyRequests", "message": "Too many requests"}},
+                    }
+                )
+            elif path.startswith("users/"):
+                status, body = self._get_user(path.split("/", 1)[1])
+                responses.append({"id": item["id"], "status": status, "body": body})
+            else:
+                responses.append(
+                    {"id": item["id"], "status": 400, "body": {"error": {"code": "BadRequest", "message": "Unsupported"}}}
+                )
+        return JSONResponse({"responses": responses})
+
+    async def hunt(self, request: Request) -> Response:
+        await self._delay()
+        throttled = self._throttle()
+        if throttled is not None:
+            return throttled
+        query = (await request.json()).get("Query", "")
+        limits = [int(n) for n in re.findall(r"\b(?:take|limit|top)\s+(\d+)", query)]
+        rows = min(limits, default=self.config.hunt_rows)
+        if re.search(r"\|\s*count\s*$", query):
+            return JSONResponse({"schema": [{"Name": "Count", "Type": "Int64"}], "results": [{"Count": rows}]})
+        if re.search(r"\|\s*(?:summarize|count|distinct)\b", query):
+            rows = min(rows, AGGREGATE_ROWS)
+        rng = random.Random(hash(query))
+
+        async def body():
+            yield b'{"schema":' + json.dumps(_HUNT_SCHEMA).encode() + b',"results":['
+            for start in range(0, rows, ROWS_PER_CHUNK):
+                chunk = [json.dumps(_hunt_row(rng, i)) for i in range(start, min(start + ROWS_PER_CHUNK, rows))]
+                yield ("," if start else "").encode() + ",".join(chunk).encode()
+                await asyncio.sleep(0)
+            yield b"]}"
+
+        return StreamingResponse(body(), media_type="application/json")
+
+    async def stats(self, request: Request) -> Response:
+        return JSONResponse({"requests": self.requests, "throttled": self.throttled})
+
+
+def build_app(config: MockConfig) -> Starlette:
+    graph = MockGraph(config)
+    return Starlette(
+        routes=[
+            Route("/{tenant}/oauth2/v2.0/token", graph.token, methods=["POST"]),
+            Route("/v1.0/users", graph.users, methods=["GET"]),
+            Route("/v1.0/users/delta", graph.users_delta, methods=["GET"]),
+            Route("/v1.0/users/{user_id}", graph.user, methods=["GET"]),
+            Route("/v1.0/$batch", graph.batch, methods=["POST"]),
+            Route("/v1.0/security/runHuntingQuery", graph.hunt, methods=["POST"]),
+            Route("/_stats", graph.stats, methods=["GET"]),
+        ]
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=MockConfig.latency_ms, help="Base response latency")
+    parser.add_argument("--jitter-ms", type=float, default=MockConfig.jitter_ms, help="Random extra latency")
+    parser.add_argument(
+        "--throttle-ratio", type=float, default=MockConfig.throttle_ratio, help="Share of requests answered with 429"
+    )
+    parser.add_argument("--retry-after", type=int, default=MockConfig.retry_after, help="Retry-After seconds on 429")
+    parser.add_argument("--users", type=int, default=MockConfig.users, help="Users in the directory")
+    parser.add_argument("--page-size", type=int, default=MockConfig.page_size, help="Default users per page")
+    parser.add_argument("--hunt-rows", type=int, default=MockConfig.hunt_rows, help="Rows per hunt without take N")
+    parser.add_argument("--seed", type=int, default=MockConfig.seed)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_ratio=args.throttle_ratio,
+        retry_after=args.retry_after,
+        users=args.users,
+        page_size=args.page_size,
+        hunt_rows=args.hunt_rows,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(build_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
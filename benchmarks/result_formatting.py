@@ -0,0 +1,191 @@
+"""
+Benchmark the size of hunt output: str(row) per line vs the compact formatter.
+
+Builds realistic Advanced Hunting fixtures (process events with long command
+lines, network events with mostly empty columns, a summarize result) and
+compares the characters needed to show them, with an approximate token count
+at 4 characters per token. The budgeted rows show how many rows the formatter
+fits into the default HUNT_OUTPUT_MAX_CHARS.
+
+Usage:
+    uv run python benchmarks/result_formatting.py
+    uv run python benchmarks/result_formatting.py --rows 100 --max-chars 8000
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from columnar import ColumnarResult  # noqa: E402
+from formatting import HUNT_OUTPUT_MAX_CHARS, format_table  # noqa: E402
+
+CHARS_PER_TOKEN = 4
+
+DEVICES = [f"wks-{i:04d}.contoso.local" for i in range(40)]
+ACCOUNTS = ["alice", "bob", "svc-backup", "system", "carol", "dave"]
+PROCESSES = [
+    ("powershell.exe", r"C:\Windows\System32\WindowsPowerShell\v1.0"),
+    ("cmd.exe", r"C:\Windows\System32"),
+    ("rundll32.exe", r"C:\Windows\System32"),
+    ("chrome.exe", r"C:\Program Files\Google\Chrome\Application"),
+    ("svchost.exe", r"C:\Windows\System32"),
+]
+
+
+def _timestamp(rng: random.Random) -> str:
+    moment = datetime(2026, 10, 1, tzinfo=timezone.utc) + timedelta(seconds=rng.randrange(30 * 86400))
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def process_events(rows: int, rng: random.Random) -> tuple[list[dict], list[dict]]:
+    schema = [
+        ("Timestamp", "DateTime"),
+        ("DeviceId", "String"),
+        ("DeviceName", "String"),
+        ("ActionType", "String"),
+        ("FileName", "String"),
+        ("FolderPath", "String"),
+        ("SHA256", "String"),
+        ("ProcessCommandLine", "String"),
+        ("AccountDomain", "String"),
+        ("AccountName", "String"),
+        ("InitiatingProcessFileName", "String"),
+        ("InitiatingProcessCommandLine", "String"),
+        ("ProcessId", "Int64"),
+        ("ReportId", "Int64"),
+        ("AdditionalFields", "Dynamic"),
+    ]
+    data = []
+    for _ in range(rows):
+        name, folder = rng.choice(PROCESSES)
+        parent, _ = rng.choice(PROCESSES)
+        device = rng.choice(DEVICES)
+        data.append(
+            {
+                "Timestamp": _timestamp(rng),
+                "DeviceId": f"{abs(hash(device)):040x}"[:40],
+                "DeviceName": device,
+                "ActionType": "ProcessCreated",
+                "FileName": name,
+                "FolderPath": f"{folder}\\{name}",
+                "SHA256": f"{rng.getrandbits(256):064x}",
+                "ProcessCommandLine": f'{name} -NoProfile -ExecutionPolicy Bypass -EncodedCommand {rng.getrandbits(1200):0300x}',
+                "AccountDomain": "contoso",
+                "AccountName": rng.choice(ACCOUNTS),
+                "InitiatingProcessFileName": parent,
+                "InitiatingProcessCommandLine": f'"{parent}" --type=renderer --field-trial-handle={rng.getrandbits(64)}',
+                "ProcessId": rng.randrange(100, 65000),
+                "ReportId": rng.randrange(1, 10**6),
+                "AdditionalFields": None,
+            }
+        )
+    return [{"Name": n, "Type": t} for n, t in schema], data
+
+
+def network_events(rows: int, rng: random.Random) -> tuple[list[dict], list[dict]]:
+    schema = [
+        ("Timestamp", "DateTime"),
+        ("DeviceName", "String"),
+        ("ActionType", "String"),
+        ("RemoteIP", "String"),
+        ("RemotePort", "Int32"),
+        ("RemoteUrl", "String"),
+        ("LocalIP", "String"),
+        ("LocalPort", "Int32"),
+        ("Protocol", "String"),
+        ("LocalIPType", "String"),
+        ("RemoteIPType", "String"),
+        ("InitiatingProcessFileName", "String"),
+        ("InitiatingProcessAccountSid", "String"),
+        ("InitiatingProcessAccountUpn", "String"),
+        ("InitiatingProcessAccountObjectId", "String"),
+    ]
+    data = []
+    for _ in range(rows):
+        data.append(
+            {
+                "Timestamp": _timestamp(rng),
+                "DeviceName": rng.choice(DEVICES),
+                "ActionType": rng.choice(["ConnectionSuccess", "ConnectionFailed"]),
+                "RemoteIP": f"52.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}",
+                "RemotePort": rng.choice([443, 80, 445, 3389]),
+                "RemoteUrl": rng.choice(["", "login.microsoftonline.com", "example.org"]),
+                "LocalIP": f"10.0.{rng.randrange(256)}.{rng.randrange(256)}",
+                "LocalPort": rng.randrange(49152, 65535),
+                "Protocol": "Tcp",
+                "LocalIPType": "Private",
+                "RemoteIPType": "Public",
+                "InitiatingProcessFileName": rng.choice(PROCESSES)[0],
+                "InitiatingProcessAccountSid": None,
+                "InitiatingProcessAccountUpn": None,
+                "InitiatingProcessAccountObjectId": None,
+            }
+        )
+    return [{"Name": n, "Type": t} for n, t in schema], data
+
+
+def summarize_counts(rows: int, rng: random.Random) -> tuple[list[dict], list[dict]]:
+    schema = [{"Name": "DeviceName", "Type": "String"}, {"Name": "FileName", "Type": "String"}, {"Name": "count_", "Type": "Int64"}]
+    data = [
+        {"DeviceName": rng.choice(DEVICES), "FileName": rng.choice(PROCESSES)[0], "count_": rng.randrange(1, 5000)}
+        for _ in range(rows)
+    ]
+    return schema, data
+
+
+FIXTURES = {
+    "DeviceProcessEvents": process_events,
+    "DeviceNetworkEvents": network_events,
+    "summarize count() by": summarize_counts,
+}
+
+
+def _row_lines(data: list[dict]) -> str:
+    """The previous output format: one Python dict repr per row."""
+    return "\n".join(str(row) for row in data)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100, help="Rows shown per fixture (default: 100)")
+    parser.add_argument("--max-chars", type=int, default=HUNT_OUTPUT_MAX_CHARS, help="Budget for the budgeted run")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    header = f"{'fixture':<22} {'format':<20} {'rows':>5} {'cols':>5} {'chars':>9} {'~tokens':>8} {'vs dict':>8} {'ms':>6}"
+    print(header)
+    print("-" * len(header))
+
+    for name, build in FIXTURES.items():
+        schema, data = build(args.rows, rng)
+        result = ColumnarResult.from_rows(data, schema)
+        baseline = len(_row_lines(data))
+        runs = [
+            ("str(row)", None),
+            ("tsv, no budget", dict(style="tsv", max_chars=10**9)),
+            ("markdown, no budget", dict(style="markdown", max_chars=10**9)),
+            (f"tsv, {args.max_chars} chars", dict(style="tsv", max_chars=args.max_chars)),
+        ]
+        for label, options in runs:
+            started = time.perf_counter()
+            if options is None:
+                text, rows, cols = _row_lines(data), len(data), len(schema)
+            else:
+                table = format_table(result, stop=args.rows, **options)
+                text, rows, cols = table.text, table.rows, len(table.columns)
+            elapsed = (time.perf_counter() - started) * 1000
+            print(
+                f"{name:<22} {label:<20} {rows:>5} {cols:>5} {len(text):>9} "
+                f"{len(text) // CHARS_PER_TOKEN:>8} {len(text) / baseline:>7.0%} {elapsed:>6.1f}"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+In-memory caches for Graph results.
+
+LRUCache bounds entries by count and optionally by estimated size, expires
+them after a TTL and lets several keys (e.g. a user's UPN and object ID)
+resolve to the same entry. Expired entries are kept until evicted so callers
+can revalidate them with an ETag instead of refetching.
+
+SingleFlight covers the gap before a result is cached: identical calls made
+while one is already in flight wait for it instead of starting their own.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any
+
+USER_CACHE_SIZE = int(os.environ.get("GRAPH_USER_CACHE_SIZE", "1000"))
+USER_CACHE_TTL = float(os.environ.get("GRAPH_USER_CACHE_TTL", "300"))
+
+HUNT_CACHE_SIZE = int(os.environ.get("HUNT_CACHE_SIZE", "100"))
+HUNT_CACHE_TTL = float(os.environ.get("HUNT_CACHE_TTL", "300"))
+HUNT_CACHE_MAX_BYTES = int(os.environ.get("HUNT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    size: int = 1
+    etag: str | None = None
+    aliases: set = field(default_factory=set)
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+
+class LRUCache:
+    """LRU cache with per-entry TTL, an optional size budget and key aliases."""
+
+    def __init__(self, max_entries: int, ttl: float, max_bytes: int | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._aliases: dict[Hashable, Hashable] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _resolve(self, key: Hashable) -> Hashable:
+        return self._aliases.get(key, key)
+
+    def get(self, key: Hashable) -> Any | None:
+        """Return a fresh cached value, counting the lookup as a hit or miss."""
+        key = self._resolve(key)
+        entry = self._entries.get(key)
+        if entry is None or not entry.is_fresh(time.monotonic()):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def get_stale(self, key: Hashable) -> CacheEntry | None:
+        """Return the entry for a key even if it has expired, without counting it."""
+        return self._entries.get(self._resolve(key))
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        size: int = 1,
+        etag: str | None = None,
+        aliases: Iterable[Hashable] = (),
+        ttl: float | None = None,
+    ) -> None:
+        """Store a value under key, also reachable through any of the aliases."""
+        key = self._resolve(key)
+        self.pop(key)
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        entry = CacheEntry(value, time.monotonic() + (self.ttl if ttl is None else ttl), size, etag)
+        self._entries[key] = entry
+        self.total_bytes += size
+        for alias in aliases:
+            self.alias(alias, key)
+        self._evict()
+
+    def alias(self, alias: Hashable, key: Hashable) -> None:
+        """Make alias resolve to the entry stored under key."""
+        key = self._resolve(key)
+        entry = self._entries.get(key)
+        if entry is None or alias == key:
+            return
+        previous = self._aliases.get(alias)
+        if previous is not None and previous in self._entries:
+            self._entries[previous].aliases.discard(alias)
+        self._aliases[alias] = key
+        entry.aliases.add(alias)
+
+    def touch(self, key: Hashable, ttl: float | None = None) -> None:
+        """Renew an entry's TTL, e.g. after a successful ETag revalidation."""
+        key = self._resolve(key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._entries.move_to_end(key)
+            self.revalidations += 1
+
+    def pop(self, key: Hashable) -> Any | None:
+        key = self._resolve(key)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.total_bytes -= entry.size
+        for alias in entry.aliases:
+            self._aliases.pop(alias, None)
+        return entry.value
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._aliases.clear()
+        self.total_bytes = 0
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            self.pop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "revalidations": self.revalidations,
+        }
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution."""
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self.started = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run call(), or wait for the call already in flight under key.
+
+        Every waiter receives the same result object (or exception), so
+        results must be treated as read-only. A cancelled waiter leaves the
+        call running for the others, but when the last one is cancelled the
+        call is cancelled too rather than finishing with no one to use it.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(call())
+            task.add_done_callback(partial(self._forget, key))
+            self._calls[key] = task
+            self.started += 1
+        else:
+            self.shared += 1
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shield the shared call so one cancelled waiter doesn't fail the rest
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                # Later calls start afresh instead of joining the cancelled one
+                if self._calls.get(key) is task:
+                    del self._calls[key]
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def cancel_all(self) -> None:
+        for task in list(self._calls.values()):
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "started": self.started, "shared": self.shared}
@@ -0,0 +1,247 @@
+"""
+Compact columnar representation of Advanced Hunting results.
+
+runHuntingQuery returns rows as JSON objects, which repeats every column name
+and every repeated string value once per row. ColumnarResult stores one
+sequence per column instead:
+- numeric columns without nulls become typed arrays
+- string columns with repeated values (ActionType, DeviceName, ...) are
+  dictionary-encoded: each distinct value is stored once plus an array of codes
+- everything else is kept as a plain list
+
+Rows are rebuilt as dicts on demand, only for the rows being displayed.
+"""
+
+import sys
+from array import array
+from collections.abc import Callable, Iterable, Iterator, Sequence
+
+# Advanced Hunting schema types stored in typed arrays when they have no nulls
+_NUMERIC_TYPECODES = {
+    "Int32": "q",
+    "Int64": "q",
+    "Long": "q",
+    "Double": "d",
+    "Real": "d",
+}
+
+# Schema types whose values are JSON strings and may be dictionary-encoded
+_STRING_TYPES = {"String", "Guid", "DateTime", "TimeSpan"}
+
+# Keep dictionary encoding only while distinct values are at most this share of rows
+DICTIONARY_MAX_RATIO = 0.5
+
+
+class DictColumn:
+    """Dictionary-encoded column: distinct values plus one code per row."""
+
+    __slots__ = ("codes", "values")
+
+    def __init__(self, codes: array, values: list):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: int):
+        return self.values[self.codes[index]]
+
+    def __iter__(self) -> Iterator:
+        values = self.values
+        return (values[code] for code in self.codes)
+
+    def take(self, indices: Iterable[int]) -> "DictColumn":
+        codes = self.codes
+        return DictColumn(array(codes.typecode, (codes[i] for i in indices)), self.values)
+
+
+Column = list | array | DictColumn
+
+
+def _take(column: Column, indices: Sequence[int]) -> Column:
+    if isinstance(column, DictColumn):
+        return column.take(indices)
+    if isinstance(column, array):
+        return array(column.typecode, (column[i] for i in indices))
+    return [column[i] for i in indices]
+
+
+def _nbytes(column: Column) -> int:
+    if isinstance(column, DictColumn):
+        return column.codes.itemsize * len(column.codes) + sum(sys.getsizeof(v) for v in column.values)
+    if isinstance(column, array):
+        return column.itemsize * len(column)
+    return sys.getsizeof(column) + sum(sys.getsizeof(v) for v in column if v is not None)
+
+
+class ColumnBuilder:
+    """Accumulates one column's values, dictionary-encoding strings as they arrive."""
+
+    __slots__ = ("type", "codes", "lookup", "values", "plain")
+
+    def __init__(self, type: str | None, backfill: int = 0):
+        self.type = type
+        self.plain: list | None = None
+        self.codes = array("I")
+        self.lookup: dict = {}
+        self.values: list = []
+        if type not in _STRING_TYPES:
+            self.plain = [None] * backfill
+        else:
+            for _ in range(backfill):
+                self.append(None)
+
+    def append(self, value) -> None:
+        if self.plain is not None:
+            self.plain.append(value)
+            return
+        try:
+            code = self.lookup[value]
+        except KeyError:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        except TypeError:
+            # Unhashable value (e.g. a dynamic object) in a string column
+            self.plain = list(self.finish_codes())
+            self.plain.append(value)
+            return
+        self.codes.append(code)
+
+    def finish_codes(self) -> Iterator:
+        values = self.values
+        return (values[code] for code in self.codes)
+
+    def finish(self) -> Column:
+        if self.plain is None:
+            if len(self.values) <= max(1, len(self.codes) * DICTIONARY_MAX_RATIO):
+                return DictColumn(self.codes, self.values)
+            return list(self.finish_codes())
+
+        typecode = _NUMERIC_TYPECODES.get(self.type)
+        if typecode is not None and None not in self.plain:
+            try:
+                return array(typecode, self.plain)
+            except (TypeError, OverflowError):
+                pass
+        return self.plain
+
+
+class ColumnarBuilder:
+    """Builds a ColumnarResult one row at a time, e.g. while a response streams in."""
+
+    def __init__(self, schema: list[dict] | None = None):
+        self.schema = list(schema or [])
+        self.length = 0
+        self._columns: dict[str, ColumnBuilder] = {
+            column["Name"]: ColumnBuilder(column.get("Type")) for column in self.schema
+        }
+
+    def set_schema(self, schema: list[dict]) -> None:
+        """Apply a schema that arrived after the builder was created."""
+        for column in schema:
+            name = column["Name"]
+            if name not in self._columns:
+                self._columns[name] = ColumnBuilder(column.get("Type"), backfill=self.length)
+            elif self.length == 0:
+                self._columns[name] = ColumnBuilder(column.get("Type"))
+        known = {column["Name"] for column in self.schema}
+        self.schema.extend(column for column in schema if column["Name"] not in known)
+
+    def append(self, row: dict) -> None:
+        for name, builder in self._columns.items():
+            builder.append(row.get(name))
+        # In row order, so columns without a schema keep the order Graph sent them in
+        for name in [name for name in row if name not in self._columns]:
+            builder = ColumnBuilder(None, backfill=self.length)
+            builder.append(row[name])
+            self._columns[name] = builder
+            self.schema.append({"Name": name, "Type": None})
+        self.length += 1
+
+    def finish(self) -> "ColumnarResult":
+        return ColumnarResult(
+            self.schema,
+            {name: builder.finish() for name, builder in self._columns.items()},
+            self.length,
+        )
+
+
+class ColumnarResult:
+    """Hunting result stored as one compact sequence per column."""
+
+    def __init__(self, schema: list[dict], columns: dict[str, Column], length: int):
+        self.schema = schema
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict], schema: list[dict] | None = None) -> "ColumnarResult":
+        builder = ColumnarBuilder(schema)
+        for row in rows:
+            builder.append(row)
+        return builder.finish()
+
+    @classmethod
+    def concat(cls, results: Sequence["ColumnarResult"]) -> "ColumnarResult":
+        """Combine results with compatible schemas into one, in order."""
+        builder = ColumnarBuilder()
+        for result in results:
+            builder.set_schema(result.schema)
+            for row in result.rows():
+                builder.append(row)
+        return builder.finish()
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def column_names(self) -> list[str]:
+        return list(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint in bytes."""
+        return sum(_nbytes(column) for column in self.columns.values())
+
+    def column(self, name: str) -> Column:
+        return self.columns[name]
+
+    def row(self, index: int, columns: Sequence[str] | None = None) -> dict:
+        names = self.column_names if columns is None else columns
+        return {
+            name: self.columns[name][index] if name in self.columns else None
+            for name in names
+        }
+
+    def rows(self, start: int = 0, stop: int | None = None, columns: Sequence[str] | None = None) -> Iterator[dict]:
+        stop = self.length if stop is None else min(stop, self.length)
+        for index in range(max(start, 0), stop):
+            yield self.row(index, columns)
+
+    def take(self, indices: Sequence[int]) -> "ColumnarResult":
+        """New result containing only the given rows, in the given order."""
+        return ColumnarResult(
+            self.schema,
+            {name: _take(column, indices) for name, column in self.columns.items()},
+            len(indices),
+        )
+
+    def sort(self, column: str, descending: bool = False, key: Callable | None = None) -> "ColumnarResult":
+        """New result ordered by one column (by key(value) if given), with nulls last."""
+        values = self.columns[column]
+        if key is not None:
+            values = [None if value is None else key(value) for value in values]
+        present = [i for i in range(self.length) if values[i] is not None]
+        missing = [i for i in range(self.length) if values[i] is None]
+        present.sort(key=values.__getitem__, reverse=descending)
+        return self.take(present + missing)
+
+    def select(self, columns: Sequence[str]) -> "ColumnarResult":
+        """New result containing only the given columns."""
+        wanted = [name for name in columns if name in self.columns]
+        return ColumnarResult(
+            [column for column in self.schema if column["Name"] in wanted],
+            {name: self.columns[name] for name in wanted},
+            self.length,
+        )
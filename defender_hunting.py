@@ -2,22 +2,264 @@
 MCP Server for Microsoft Defender Advanced Hunting.
 """
 
+import asyncio
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
 import httpx
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+
+from auth import (
+    BATCH_MAX_REQUESTS,
+    close_http_client,
+    graph_batch,
+    graph_pages,
+    graph_request,
+    graph_stream,
+    inflight_requests,
+    is_configured,
+)
+from caching import (
+    HUNT_CACHE_MAX_BYTES,
+    HUNT_CACHE_SIZE,
+    HUNT_CACHE_TTL,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL,
+    LRUCache,
+    SingleFlight,
+)
+from columnar import ColumnarBuilder, ColumnarResult
+from exporters import open_writer
+from formatting import HUNT_OUTPUT_MAX_CHARS, HUNT_OUTPUT_MAX_ROWS, format_table
+from jobs import CANCELLED, FAILED, SUCCEEDED, Job, JobManager
+from kql import (
+    AGGREGATING_OPERATORS,
+    QueryAnalysis,
+    count_query,
+    limit_rows,
+    normalize_query,
+    pipeline_operators,
+    preflight,
+)
+from metrics import MetricsExporter, instrument_tool
+from quota import HuntingQuota
+from refine import RefineError, refine_result
+from result_store import ResultStore
+from throttling import parse_retry_after
+from tracing import configure_tracing, shutdown_tracing, span
+from user_directory import MIRROR_ENABLED, UnsupportedQuery, UserDirectoryMirror
+
+# Local copy of the user directory, enabled with GRAPH_USER_MIRROR=1
+user_mirror = UserDirectoryMirror() if MIRROR_ENABLED else None
+
+# Recently fetched users, keyed by (lowercased ID or UPN, selected properties)
+user_cache = LRUCache(max_entries=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Complete hunting results, addressable by handle
+result_store = ResultStore()
+
+# Handles of recent hunting results, keyed by (normalized KQL, timespan)
+hunt_cache = LRUCache(max_entries=HUNT_CACHE_SIZE, ttl=HUNT_CACHE_TTL, max_bytes=HUNT_CACHE_MAX_BYTES)
+
+# Hunts running right now, keyed like hunt_cache, so identical concurrent hunts share one query
+hunt_flights = SingleFlight()
+
+# Background hunts started with hunt_async
+hunt_jobs = JobManager()
+
+# Longest a single job_result call waits for a job to finish
+JOB_MAX_WAIT = 300
+
+# Cost of recent hunts in Advanced Hunting's quota window, and the policy for new ones
+hunting_quota = HuntingQuota()
+
+# Prometheus endpoint and/or file dump, enabled with GRAPH_METRICS_PORT / GRAPH_METRICS_FILE
+metrics_exporter = MetricsExporter()
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Keep the pooled Graph HTTP client alive for the lifetime of the server."""
+    if user_mirror is not None and is_configured():
+        user_mirror.sync_in_background()
+    configure_tracing()
+    await metrics_exporter.start()
+    try:
+        yield
+    finally:
+        if user_mirror is not None:
+            user_mirror.close()
+        await hunt_jobs.close()
+        result_store.close()
+        await metrics_exporter.close()
+        await close_http_client()
+        shutdown_tracing()
+
+
+mcp = FastMCP("microsoft-security", lifespan=lifespan)
+
+
+async def _stream_hunting_query(
+    query: str,
+    timespan: str,
+    set_schema: Callable[[list[dict]], None],
+    add_row: Callable[[dict], None],
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    """
+    Run an Advanced Hunting query, passing the schema and each row to the callbacks as they arrive.
+
+    The query first passes hunting_quota's policy, which may defer it or raise
+    QuotaExceeded, and its cost is recorded once the last row has arrived; a
+    query that fails or is cancelled is not charged. progress, if given, is
+    called with the number of rows received every 1000 rows.
+
+    Returns:
+        The number of rows received
+    """
+    query_key = normalize_query(query)
+    rows = 0
+    stats = None
+    responses: list[httpx.Response] = []
+    # Covers the whole streamed body; the Graph request span ends once the response headers arrive
+    with span("hunt.query", {"hunt.timespan": timespan, "hunt.query_chars": len(query)}) as current:
+        reserved = await hunting_quota.admit(query_key)
+        try:
+            async for key, value in graph_stream(
+                method="POST",
+                endpoint="/security/runHuntingQuery",
+                json={
+                    "Query": query,
+                    "Timespan": timespan,
+                },
+                on_response=responses.append,
+            ):
+                if key == "results":
+                    add_row(value)
+                    rows += 1
+                    if progress is not None and rows % 1000 == 0:
+                        progress(rows)
+                elif key == "schema":
+                    set_schema(value)
+                elif key.lower() == "stats":
+                    stats = value
+        except BaseException as e:
+            hunting_quota.release(reserved)
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
+                hunting_quota.throttled(parse_retry_after(e.response.headers.get("Retry-After")))
+            raise
+        # Time of the successful attempt alone, without rate-limit queueing or retry backoff
+        wall_seconds = responses[0].elapsed.total_seconds()
+        usage = hunting_quota.record(query_key, reserved, query, wall_seconds, rows, stats)
+        current.set_attributes({"hunt.rows": rows, "hunt.cost_seconds": usage.cost, "hunt.cost_source": usage.source})
+    if progress is not None:
+        progress(rows)
+    return rows
+
+
+async def _run_hunting_query(
+    query: str,
+    timespan: str,
+    progress: Callable[[int], None] | None = None,
+) -> ColumnarResult:
+    """
+    Run an Advanced Hunting query, building the columnar result while the response streams in.
+
+    Rows are parsed and appended one at a time, so the raw body and a full
+    list of row dicts are never held in memory together.
+    """
+    builder = ColumnarBuilder()
+    await _stream_hunting_query(query, timespan, builder.set_schema, builder.append, progress)
+    return builder.finish()
+
+
+async def _run_and_store(
+    query: str,
+    timespan: str,
+    cache_key: tuple[str, str],
+    progress: Callable[[int], None] | None = None,
+    limit: int | None = None,
+) -> tuple[str, ColumnarResult]:
+    """
+    Run a hunt, store its result and cache its handle.
+
+    limit is the row cap the server added to the query, if any; a result that
+    reaches it is stored as limited, since more rows may match.
+    """
+    result = await _run_hunting_query(query, timespan, progress)
+    handle = result_store.put(result, query, limited=limit is not None and len(result) >= limit)
+    hunt_cache.set(cache_key, handle, size=result.nbytes)
+    return handle, result
+
+
+async def _count_rows(query: str, timespan: str) -> int | str:
+    """Count a query's result rows with "| count"; returns the error text if the count fails."""
+    try:
+        result = await _run_hunting_query(count_query(query), timespan)
+        return int(result.column(result.column_names[0])[0]) if len(result) else 0
+    except httpx.HTTPStatusError as e:
+        return f"API Error {e.response.status_code}"
+    except Exception as e:
+        return str(e)
+
+
+def _result_table(result: ColumnarResult, format: str, max_chars: int) -> list[str]:
+    """Render the first rows of a result as a compact table, followed by what was left out."""
+    table = format_table(result, style=format.lower(), max_chars=max_chars)
+    lines = [table.text]
+    if table.rows < len(result):
+        lines.append(f"\n... and {len(result) - table.rows} more rows")
+    lines.extend(table.notes())
+    return lines
 
-from auth import is_configured, graph_request
 
-mcp = FastMCP("microsoft-security")
+def _preflight_notes(analysis: QueryAnalysis | None, query: str) -> list[str]:
+    """Describe preflight findings, and the rewrites if query is the rewritten one, for a tool response."""
+    if analysis is None or not (analysis.findings or analysis.rewrites):
+        return []
+    lines = [f"\nPreflight check (estimated scan cost {analysis.cost:,.0f}):"]
+    lines.extend(f"- {finding.severity}: {finding.message}" for finding in analysis.findings)
+    if query != analysis.query:
+        lines.append(f"Query rewritten: {'; '.join(analysis.rewrites)}")
+    return lines
 
 
 @mcp.tool()
-async def hunt(query: str, days: int = 30) -> str:
+@instrument_tool
+async def hunt(
+    query: str,
+    days: int = 30,
+    bypass_cache: bool = False,
+    format: str = "tsv",
+    max_chars: int = HUNT_OUTPUT_MAX_CHARS,
+    fetch_all: bool = False,
+    count_total: bool = False,
+) -> str:
     """
     Run a KQL query against Microsoft Defender Advanced Hunting.
 
+    The first rows are shown as a compact table that fits in max_chars. Only
+    as many rows as can be shown (HUNT_OUTPUT_MAX_ROWS) are requested: a take
+    is appended to the query, or its own take, limit or top is tightened. The
+    fetched rows are kept under a result handle for fetch_rows. Identical
+    queries (ignoring whitespace and comments) over the same timespan are
+    answered from a short-lived cache, and identical hunts started while one
+    is still running wait for its result instead of querying again. Queries
+    are checked for costly patterns first (no Timestamp filter, no row limit,
+    contains on large tables) and, depending on HUNT_PREFLIGHT, the findings
+    are reported, fixed by rewriting the query, or the query is rejected.
+
     Args:
         query: KQL query to execute (e.g., "DeviceProcessEvents | limit 10")
         days: Number of days to look back (default: 30, max: 30)
+        bypass_cache: If True, always run the query instead of using a cached result
+        format: Table layout, "tsv" (default) or "markdown"
+        max_chars: Character budget for the table (about 4 characters per token)
+        fetch_all: If True, download every matching row instead of only those that can be shown
+        count_total: If True, also count all matching rows with a second query run in parallel
 
     Returns:
         Query results as formatted text
@@ -26,33 +268,555 @@ async def hunt(query: str, days: int = 30) -> str:
         return "Error: Missing Azure credentials. Set AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET."
 
     try:
-        result = await graph_request(
-            method="POST",
-            endpoint="/security/runHuntingQuery",
-            json={
-                "Query": query,
-                "Timespan": f"P{min(days, 30)}D",
-            },
+        days = min(days, 30)
+        timespan = f"P{days}D"
+        limit = None if fetch_all else HUNT_OUTPUT_MAX_ROWS
+        # The take is applied after preflight so the count below runs the same (rewritten) query
+        rewritten, analysis = preflight(query, days, bounded=limit is not None)
+        sent = rewritten if limit is None else limit_rows(rewritten, limit)
+        cache_key = (normalize_query(sent), timespan)
+        handle = None if bypass_cache else hunt_cache.get(cache_key)
+        result = result_store.get(handle) if handle else None
+        cached = result is not None
+
+        # The count runs alongside the limited query
+        counting = asyncio.create_task(_count_rows(rewritten, timespan)) if count_total and sent != rewritten else None
+        try:
+            if result is None:
+                capped_at = limit if sent != rewritten else None
+                handle, result = await hunt_flights.do(
+                    cache_key, partial(_run_and_store, sent, timespan, cache_key, limit=capped_at)
+                )
+            total = await counting if counting is not None else None
+        finally:
+            if counting is not None:
+                counting.cancel()
+
+        if not len(result):
+            return "\n".join(["No results found.", *_preflight_notes(analysis, rewritten)])
+
+        more = sent != rewritten and len(result) >= limit
+        if not more:
+            output = [f"Found {len(result)} results:\n"]
+        elif isinstance(total, int):
+            output = [f"Found {total} results, showing the first {len(result)}:\n"]
+        elif total is not None:
+            output = [f"Found at least {len(result)} results (could not count the total: {total}):\n"]
+        else:
+            output = [f"Found at least {len(result)} results; only the rows that can be shown were fetched:\n"]
+        output.extend(_result_table(result, format, max_chars))
+        if more:
+            output.append(f"\nResult handle: {handle} (use fetch_rows to page through the fetched rows)")
+            hint = "fetch_all=True to download every row"
+            if not isinstance(total, int):
+                hint = f"count_total=True for the exact total, or {hint}"
+            output.append(f"(Pass {hint}.)")
+        else:
+            output.append(f"\nResult handle: {handle} (use fetch_rows to page through all rows)")
+
+        if cached:
+            output.append("(Cached result; pass bypass_cache=True to re-run the query.)")
+        output.extend(_preflight_notes(analysis, rewritten))
+
+        return "\n".join(output)
+
+    except httpx.HTTPStatusError as e:
+        return f"API Error {e.response.status_code}: {e.response.text}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@mcp.tool()
+@instrument_tool
+async def hunt_async(query: str, days: int = 30, bypass_cache: bool = False) -> str:
+    """
+    Start a KQL hunting query in the background and return a job ID immediately.
+
+    Use this for queries that may take longer than a minute. Poll with
+    job_status and fetch the rows with job_result. Progress notifications
+    are only sent while job_result waits (wait_seconds > 0); between calls,
+    job_status shows the rows received so far.
+
+    Args:
+        query: KQL query to execute
+        days: Number of days to look back (default: 30, max: 30)
+        bypass_cache: If True, always run the query instead of using a cached result
+
+    Returns:
+        The job ID to pass to job_status, job_result or cancel_job
+    """
+    if not is_configured():
+        return "Error: Missing Azure credentials. Set AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET."
+
+    days = min(days, 30)
+    timespan = f"P{days}D"
+    try:
+        sent, analysis = preflight(query, days, limit=HUNT_OUTPUT_MAX_ROWS)
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    # In rewrite mode an unbounded query gets a take guard; a result that fills it is cut short
+    guarded = analysis is not None and sent != query and f"added | take {HUNT_OUTPUT_MAX_ROWS}" in analysis.rewrites
+    query = sent
+    cache_key = (normalize_query(query), timespan)
+
+    async def run(job: Job) -> str:
+        handle = None if bypass_cache else hunt_cache.get(cache_key)
+        if handle and handle in result_store:
+            return handle
+        handle, _ = await hunt_flights.do(
+            cache_key,
+            partial(
+                _run_and_store,
+                query,
+                timespan,
+                cache_key,
+                progress=job.report,
+                limit=HUNT_OUTPUT_MAX_ROWS if guarded else None,
+            ),
         )
+        return handle
+
+    job = hunt_jobs.submit(query, run)
+    output = [
+        f"Started job {job.id}.",
+        f"Check progress with job_status(\"{job.id}\") and get the rows with job_result(\"{job.id}\").",
+    ]
+    output.extend(_preflight_notes(analysis, query))
+    return "\n".join(output)
+
+
+def _job_error(error: BaseException) -> str:
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"API Error {error.response.status_code}: {error.response.text}"
+    return f"Error: {str(error)}"
+
+
+def _job_summary(job: Job) -> str:
+    description = " ".join(job.description.split())
+    if len(description) > 80:
+        description = description[:79] + "…"
+    summary = f"{job.id}: {job.status}, {job.elapsed:.0f}s, {job.progress} rows received"
+    if job.status == SUCCEEDED:
+        summary += f", result handle {job.result}"
+    elif job.status == FAILED:
+        summary += f" ({_job_error(job.error)})"
+    return f"{summary}\n  {description}"
+
 
-        rows = result.get("results", [])
-        if not rows:
-            return "No results found."
+@mcp.tool()
+@instrument_tool
+async def job_status(job_id: str | None = None) -> str:
+    """
+    Show the status of background hunting jobs.
+
+    Args:
+        job_id: Job to show. If not provided, lists all known jobs.
+
+    Returns:
+        Status, elapsed time and rows received so far for each job
+    """
+    if job_id:
+        job = hunt_jobs.get(job_id)
+        if job is None:
+            return f"Unknown or expired job: {job_id}"
+        return _job_summary(job)
+
+    jobs = hunt_jobs.list()
+    if not jobs:
+        return "No background jobs."
+    return "\n".join(_job_summary(job) for job in jobs)
+
+
+@mcp.tool()
+@instrument_tool
+async def job_result(
+    job_id: str,
+    ctx: Context,
+    wait_seconds: float = 0,
+    format: str = "tsv",
+    max_chars: int = HUNT_OUTPUT_MAX_CHARS,
+) -> str:
+    """
+    Get the result of a background hunting job.
+
+    Args:
+        job_id: Job ID returned by hunt_async
+        wait_seconds: Wait up to this long (max 300) for the job to finish,
+            sending progress notifications meanwhile. The job can't notify
+            between calls, so without a wait no progress is sent.
+        format: Table layout, "tsv" (default) or "markdown"
+        max_chars: Character budget for the table (about 4 characters per token)
+
+    Returns:
+        The first rows and result handle, the error, or the current status if still running
+    """
+    job = hunt_jobs.get(job_id)
+    if job is None:
+        return f"Unknown or expired job: {job_id}"
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(max(wait_seconds, 0), JOB_MAX_WAIT)
+    while not job.done and loop.time() < deadline:
+        await ctx.report_progress(job.progress)
+        await hunt_jobs.wait(job, min(2.0, deadline - loop.time()))
+
+    if job.status == FAILED:
+        return _job_error(job.error)
+    if job.status == CANCELLED:
+        return f"Job {job.id} was cancelled."
+    if not job.done:
+        return f"Job still {job.status}: {job.progress} rows received after {job.elapsed:.0f}s. Try again later."
+
+    await ctx.report_progress(job.progress, job.progress)
+    handle = job.result
+    result = result_store.get(handle)
+    if result is None:
+        return f"The result of job {job.id} has expired. Start the hunt again."
+    if not len(result):
+        return "No results found."
+
+    limited = result_store.info(handle).limited
+    if limited:
+        output = [f"Found at least {len(result)} results; only the rows that can be shown were fetched:\n"]
+    else:
+        output = [f"Found {len(result)} results:\n"]
+    try:
+        output.extend(_result_table(result, format, max_chars))
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    if limited:
+        output.append(f"\nResult handle: {handle} (use fetch_rows to page through the fetched rows)")
+        output.append("(Add your own take or summarize, or run hunt with fetch_all=True, to get every row.)")
+    else:
+        output.append(f"\nResult handle: {handle} (use fetch_rows to page through all rows)")
+    return "\n".join(output)
+
+
+@mcp.tool()
+@instrument_tool
+async def cancel_job(job_id: str) -> str:
+    """
+    Cancel a queued or running background hunting job.
+
+    Args:
+        job_id: Job ID returned by hunt_async
+
+    Returns:
+        Whether the job was cancelled
+    """
+    job = hunt_jobs.get(job_id)
+    if job is None:
+        return f"Unknown or expired job: {job_id}"
+    if not hunt_jobs.cancel(job_id):
+        return f"Job {job_id} already {job.status}."
+    return f"Cancelled job {job_id}."
+
+
+def _time_slices(days: int, slices: int) -> list[str]:
+    """Split the last N days into consecutive ISO 8601 intervals, oldest first."""
+    end = datetime.now(timezone.utc).replace(microsecond=0)
+    start = end - timedelta(days=days)
+    step = (end - start) / slices
+    bounds = [start + step * i for i in range(slices)] + [end]
+    return [
+        f"{lower.strftime('%Y-%m-%dT%H:%M:%SZ')}/{upper.strftime('%Y-%m-%dT%H:%M:%SZ')}"
+        for lower, upper in zip(bounds, bounds[1:])
+    ]
+
+
+@mcp.tool()
+@instrument_tool
+async def hunt_partitioned(
+    query: str,
+    days: int = 30,
+    slices: int = 6,
+    max_concurrency: int = 4,
+    order_by_timestamp: str | None = None,
+    format: str = "tsv",
+    max_chars: int = HUNT_OUTPUT_MAX_CHARS,
+) -> str:
+    """
+    Run a KQL query over a long time range as several smaller, concurrent queries.
 
-        output = [f"Found {len(rows)} results:\n"]
-        for row in rows[:100]:
-            output.append(str(row))
+    The lookback period is split into equal time windows that are queried in
+    parallel, which keeps each query under Advanced Hunting's row and timeout
+    limits. Results are merged under a single result handle. If some windows
+    fail, the rows from the others are still returned.
 
-        if len(rows) > 100:
-            output.append(f"\n... and {len(rows) - 100} more rows")
+    Only row-level queries merge cleanly; aggregations (summarize, count, top,
+    ...) are computed per window. The query goes through the same preflight
+    check as hunt, without the take guard.
 
+    Args:
+        query: KQL query to execute (e.g., "DeviceProcessEvents | where FileName == 'powershell.exe'")
+        days: Number of days to look back (default: 30, max: 30)
+        slices: Number of time windows to split the range into (default: 6, max: 30)
+        max_concurrency: Maximum number of windows queried at once (default: 4)
+        order_by_timestamp: "asc" or "desc" to sort merged rows by Timestamp;
+            otherwise windows are concatenated oldest first
+        format: Table layout, "tsv" (default) or "markdown"
+        max_chars: Character budget for the table (about 4 characters per token)
+
+    Returns:
+        Per-window status, the first rows of the merged result and its handle
+    """
+    if not is_configured():
+        return "Error: Missing Azure credentials. Set AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET."
+
+    try:
+        days = min(days, 30)
+        sent, analysis = preflight(query, days)
+        notes = _preflight_notes(analysis, sent)
+        windows = _time_slices(days, max(1, min(slices, 30)))
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run_window(timespan: str) -> ColumnarResult:
+            async with semaphore:
+                return await _run_hunting_query(sent, timespan)
+
+        outcomes = await asyncio.gather(*(run_window(w) for w in windows), return_exceptions=True)
+
+        status_lines = []
+        parts = []
+        for window, outcome in zip(windows, outcomes):
+            if isinstance(outcome, httpx.HTTPStatusError):
+                status_lines.append(f"  {window}: failed (API Error {outcome.response.status_code})")
+            elif isinstance(outcome, BaseException):
+                status_lines.append(f"  {window}: failed ({outcome})")
+            else:
+                status_lines.append(f"  {window}: {len(outcome)} rows")
+                parts.append(outcome)
+
+        if not parts:
+            return "\n".join(["All time windows failed:", *status_lines, *notes])
+
+        result = ColumnarResult.concat(parts)
+        if order_by_timestamp and "Timestamp" in result.columns:
+            result = result.sort("Timestamp", descending=order_by_timestamp.lower() == "desc")
+        handle = result_store.put(result, sent)
+
+        output = [f"Queried {len(windows)} time windows ({len(parts)} succeeded):"]
+        output.extend(status_lines)
+
+        if AGGREGATING_OPERATORS.intersection(pipeline_operators(query)):
+            output.append("Note: the query aggregates or limits rows, so results are per time window.")
+
+        if not len(result):
+            output.append("\nNo results found.")
+            output.extend(notes)
+            return "\n".join(output)
+
+        output.append(f"\nFound {len(result)} results:\n")
+        output.extend(_result_table(result, format, max_chars))
+        output.append(f"\nResult handle: {handle} (use fetch_rows to page through all rows)")
+        output.extend(notes)
         return "\n".join(output)
 
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@mcp.tool()
+@instrument_tool
+async def fetch_rows(
+    handle: str,
+    offset: int = 0,
+    limit: int = 100,
+    columns: list[str] | None = None,
+    format: str = "tsv",
+    max_chars: int = HUNT_OUTPUT_MAX_CHARS,
+) -> str:
+    """
+    Page through a stored hunting result without re-running the query.
+
+    Args:
+        handle: Result handle returned by hunt
+        offset: Index of the first row to return (0-based)
+        limit: Maximum number of rows to return (max 1000)
+        columns: Columns to include. If not provided, returns all columns.
+        format: Table layout, "tsv" (default) or "markdown"
+        max_chars: Character budget for the table (about 4 characters per token);
+            fewer than limit rows are returned if they don't fit
+
+    Returns:
+        The requested rows as formatted text
+    """
+    result = result_store.get(handle)
+    if result is None:
+        return f"Unknown or expired result handle: {handle}. Re-run the hunt to get a new one."
+
+    offset = max(offset, 0)
+    if offset >= len(result):
+        return f"No rows at offset {offset}; the result has {len(result)} rows."
+
+    try:
+        table = format_table(
+            result,
+            start=offset,
+            stop=offset + min(max(limit, 1), 1000),
+            style=format.lower(),
+            max_chars=max_chars,
+            columns=columns or None,
+        )
+    except ValueError as e:
+        return f"Error: {str(e)}"
+
+    if not table.rows:
+        return f"Row {offset + 1} doesn't fit in {max_chars} characters; increase max_chars or select fewer columns."
+
+    end = offset + table.rows
+    output = [f"Rows {offset + 1}-{end} of {len(result)}:\n", table.text]
+    output.extend(table.notes())
+
+    if end < len(result):
+        output.append(f"\n... {len(result) - end} more rows (next offset: {end})")
+
+    return "\n".join(output)
+
+
+@mcp.tool()
+@instrument_tool
+async def refine(
+    handle: str,
+    expression: str,
+    format: str = "tsv",
+    max_chars: int = HUNT_OUTPUT_MAX_CHARS,
+) -> str:
+    """
+    Filter, reshape or aggregate a stored hunting result locally, without querying Graph.
+
+    The expression is a KQL-style pipeline applied to the rows behind the
+    handle, e.g. 'where FileName =~ "powershell.exe" | summarize count() by DeviceName'.
+    Supports where, project, project-away, sort/order by, top, take/limit,
+    summarize (count, dcount, sum, avg, min, max ... by), count and distinct.
+    The refined rows are stored under a new handle. If hunt only fetched the
+    rows it could show, the refinement covers just those and says so.
+
+    Args:
+        handle: Result handle returned by hunt, hunt_partitioned or refine
+        expression: Pipeline to apply (a leading "|" is optional)
+        format: Table layout, "tsv" (default) or "markdown"
+        max_chars: Character budget for the table (about 4 characters per token)
+
+    Returns:
+        The first rows of the refined result and its new handle
+    """
+    result = result_store.get(handle)
+    if result is None:
+        return f"Unknown or expired result handle: {handle}. Re-run the hunt to get a new one."
+
+    try:
+        refined = refine_result(result, expression)
+    except RefineError as e:
+        return f"Error: {str(e)}"
+
+    info = result_store.info(handle)
+    new_handle = result_store.put(
+        refined, f"{info.query}\n| {expression.strip().lstrip('|').strip()}", limited=info.limited
+    )
+
+    output = [f"Refined {len(result)} rows to {len(refined)} rows:\n"]
+    if info.limited:
+        output.append(
+            f"Warning: {handle} holds only the first {len(result)} matching rows, which is all hunt fetched, "
+            "so counts and aggregates here cover those rows only. Re-run hunt with fetch_all=True "
+            "to refine the complete result.\n"
+        )
+    if len(refined):
+        try:
+            output.extend(_result_table(refined, format, max_chars))
+        except ValueError as e:
+            return f"Error: {str(e)}"
+    else:
+        output.append("No rows match.")
+    output.append(f"\nResult handle: {new_handle} (use fetch_rows or refine on it)")
+    return "\n".join(output)
+
+
+@mcp.tool()
+@instrument_tool
+async def export_hunt(
+    query: str | None = None,
+    days: int = 30,
+    format: str = "ndjson",
+    filename: str | None = None,
+    handle: str | None = None,
+) -> str:
+    """
+    Export a full hunting result to a local file for offline analysis.
+
+    Rows are streamed from Graph straight to disk, so results with hundreds
+    of thousands of rows can be exported without loading them into memory.
+    Either runs a new query, which goes through the same preflight check
+    (without the take guard) and hunting quota as hunt, or exports a result
+    stored by an earlier hunt. A stored result that hunt cut short to the
+    rows it could show is not exported; export the query instead.
+
+    Args:
+        query: KQL query to run and export
+        days: Number of days to look back (default: 30, max: 30)
+        format: "ndjson" (default), "csv" or "parquet" (requires pyarrow)
+        filename: Output file name inside the export directory (default: timestamped name)
+        handle: Result handle from hunt to export instead of running a query
+
+    Returns:
+        Path, row count, schema and size of the exported file
+    """
+    if not query and not handle:
+        return "Error: Provide either a query or a result handle to export."
+
+    if handle:
+        info = result_store.info(handle)
+        if info is not None and info.limited:
+            return (
+                f"Error: {handle} holds only the first {info.row_count} rows, which is all hunt fetched to show. "
+                "Pass the query instead of the handle to export every row, or re-run hunt with fetch_all=True."
+            )
+
+    notes = []
+    try:
+        if not handle:
+            days = min(days, 30)
+            query, analysis = preflight(query, days)
+            notes = _preflight_notes(analysis, query)
+        writer = open_writer(format.lower(), filename)
+    except ValueError as e:
+        return f"Error: {str(e)}"
+
+    try:
+        if handle:
+            result = result_store.get(handle)
+            if result is None:
+                writer.abort()
+                return f"Unknown or expired result handle: {handle}. Re-run the hunt to get a new one."
+            writer.set_schema(result.schema)
+            for row in result.rows():
+                writer.write(row)
+        else:
+            if not is_configured():
+                writer.abort()
+                return "Error: Missing Azure credentials. Set AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET."
+            await _stream_hunting_query(query, f"P{days}D", writer.set_schema, writer.write)
+        writer.close()
+
     except httpx.HTTPStatusError as e:
+        writer.abort()
         return f"API Error {e.response.status_code}: {e.response.text}"
     except Exception as e:
+        writer.abort()
         return f"Error: {str(e)}"
 
+    schema = ", ".join(f"{column['Name']} ({column.get('Type') or 'unknown'})" for column in writer.schema)
+    return "\n".join(
+        [
+            f"Exported {writer.rows} rows to {writer.path}",
+            f"Format: {format.lower()}",
+            f"Size: {writer.path.stat().st_size} bytes",
+            f"Schema: {schema or 'n/a'}",
+            *notes,
+        ]
+    )
+
 
 # Default user properties to retrieve
 DEFAULT_USER_SELECT = [
@@ -71,8 +835,76 @@ DEFAULT_USER_SELECT = [
 ]
 
 
+def _format_user_properties(user: dict) -> list[str]:
+    """Format a user object as "key: value" lines, skipping empty values."""
+    return [
+        f"{key}: {value}"
+        for key, value in user.items()
+        if value is not None and not key.startswith("@odata.")
+    ]
+
+
+def _format_user_entry(user: dict) -> str:
+    """Format a user as an indented block for list output."""
+    return "\n".join(
+        f"  {key}: {value}"
+        for key, value in user.items()
+        if value is not None and not key.startswith("@")
+    )
+
+
+def _ready_mirror() -> UserDirectoryMirror | None:
+    """Return the user mirror if it can serve reads, refreshing it in the background when stale."""
+    if user_mirror is None or not user_mirror.is_ready:
+        return None
+    user_mirror.refresh_if_stale()
+    return user_mirror
+
+
+def _mirror_note(mirror: UserDirectoryMirror) -> str:
+    age = int(time.time() - (mirror.synced_at or 0))
+    return f"(From local directory mirror synced {age}s ago; pass live=True for a live read.)"
+
+
+def _user_cache_key(user_id: str, properties: list[str]) -> tuple[str, frozenset[str]]:
+    return user_id.lower(), frozenset(p.lower() for p in properties)
+
+
+async def _fetch_user(user_id: str, properties: list[str]) -> dict:
+    """
+    Fetch a user from Graph and cache it under the requested ID, object ID and UPN.
+
+    If an expired cache entry carries an ETag, the request is made conditional
+    and a 304 response renews the cached copy instead of downloading it again.
+    """
+    cache_key = _user_cache_key(user_id, properties)
+    stale = user_cache.get_stale(cache_key)
+    headers = {"If-None-Match": stale.etag} if stale is not None and stale.etag else None
+
+    try:
+        result = await graph_request(
+            method="GET",
+            endpoint=f"/users/{user_id}?$select={','.join(properties)}",
+            headers=headers,
+        )
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 304 and stale is not None:
+            user_cache.touch(cache_key)
+            return stale.value
+        raise
+
+    aliases = [
+        _user_cache_key(result[key], properties)
+        for key in ("id", "userPrincipalName")
+        if result.get(key)
+    ]
+    user_cache.set(cache_key, result, etag=result.get("@odata.etag"), aliases=aliases)
+    return result
+
+
 @mcp.tool()
-async def get_user(user_id: str, select: list[str] | None = None) -> str:
+@instrument_tool
+async def get_user(user_id: str, select: list[str] | None = None, live: bool = False) -> str:
     """
     Get user information from Microsoft Entra ID (Azure AD).
 
@@ -80,6 +912,7 @@ async def get_user(user_id: str, select: list[str] | None = None) -> str:
         user_id: User identifier - can be UPN (user@domain.com) or object ID (GUID)
         select: List of properties to retrieve. If not provided, returns default properties.
                 Examples: ["displayName", "mail"] or ["id", "signInActivity"]
+        live: If True, always query Graph instead of the local directory mirror or cache
 
     Returns:
         User profile information for the requested properties.
@@ -88,19 +921,23 @@ async def get_user(user_id: str, select: list[str] | None = None) -> str:
         return "Error: Missing Azure credentials. Set AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET."
 
     try:
-        properties = select if select else DEFAULT_USER_SELECT
-        select_param = ",".join(properties)
+        mirror = None if live else _ready_mirror()
+        if mirror is not None and (select is None or mirror.covers(select)):
+            # The mirror stores more than the defaults; answer with the same properties as Graph
+            user = mirror.get_user(user_id, select or DEFAULT_USER_SELECT)
+            if user is not None:
+                lines = ["User Profile:", "-" * 40]
+                lines.extend(_format_user_properties(user))
+                lines.append(_mirror_note(mirror))
+                return "\n".join(lines)
 
-        result = await graph_request(
-            method="GET",
-            endpoint=f"/users/{user_id}?$select={select_param}",
-        )
+        properties = select if select else DEFAULT_USER_SELECT
+        result = None if live else user_cache.get(_user_cache_key(user_id, properties))
+        if result is None:
+            result = await _fetch_user(user_id, properties)
 
-        # Format output
         lines = ["User Profile:", "-" * 40]
-        for key, value in result.items():
-            if value is not None and key != "@odata.context":
-                lines.append(f"{key}: {value}")
+        lines.extend(_format_user_properties(result))
 
         return "\n".join(lines)
 
@@ -113,6 +950,79 @@ async def get_user(user_id: str, select: list[str] | None = None) -> str:
 
 
 @mcp.tool()
+@instrument_tool
+async def batch_get_users(user_ids: list[str], select: list[str] | None = None) -> str:
+    """
+    Get information for many users from Microsoft Entra ID in as few calls as possible.
+
+    Lookups are packed 20 at a time into Graph $batch requests which are sent
+    concurrently. Use this instead of repeated get_user calls when profiling
+    users found in a hunt result.
+
+    Args:
+        user_ids: User identifiers - UPNs (user@domain.com) or object IDs (GUIDs)
+        select: List of properties to retrieve. If not provided, returns default properties.
+
+    Returns:
+        User profiles in the same order as user_ids, with a note for users that were not found.
+    """
+    if not is_configured():
+        return "Error: Missing Azure credentials. Set AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET."
+
+    if not user_ids:
+        return "No user IDs provided."
+
+    try:
+        properties = select if select else DEFAULT_USER_SELECT
+        select_param = ",".join(properties)
+
+        requests = [
+            {"method": "GET", "url": f"/users/{user_id}?$select={select_param}"}
+            for user_id in user_ids
+        ]
+        batches = await asyncio.gather(
+            *(
+                graph_batch(requests[i : i + BATCH_MAX_REQUESTS])
+                for i in range(0, len(requests), BATCH_MAX_REQUESTS)
+            )
+        )
+        responses = [response for batch in batches for response in batch]
+
+        found = sum(1 for response in responses if response["status"] == 200)
+        lines = [f"Retrieved {found} of {len(user_ids)} users", "-" * 40]
+
+        for user_id, response in zip(user_ids, responses):
+            status = response["status"]
+            if status == 200:
+                lines.extend(_format_user_properties(response["body"]))
+            elif status == 404:
+                lines.append(f"User not found: {user_id}")
+            else:
+                lines.append(f"API Error {status} for {user_id}: {response.get('body')}")
+            lines.append("-" * 40)
+
+        return "\n".join(lines)
+
+    except httpx.HTTPStatusError as e:
+        return f"API Error {e.response.status_code}: {e.response.text}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+# Default properties returned by list_users
+LIST_USER_SELECT = [
+    "id",
+    "displayName",
+    "userPrincipalName",
+    "mail",
+    "jobTitle",
+    "department",
+    "accountEnabled",
+]
+
+
+@mcp.tool()
+@instrument_tool
 async def list_users(
     filter: str | None = None,
     select: list[str] | None = None,
@@ -120,6 +1030,9 @@ async def list_users(
     top: int | None = None,
     search: str | None = None,
     count: bool = False,
+    max_results: int | None = None,
+    prefetch: int = 1,
+    live: bool = False,
 ) -> str:
     """
     List and search users in Microsoft Entra ID with OData query support.
@@ -133,11 +1046,16 @@ async def list_users(
             - "createdDateTime ge 2024-01-01T00:00:00Z"
         select: List of properties to return. Default: displayName, userPrincipalName, id, mail
         orderby: Property to sort by. Examples: "displayName", "createdDateTime desc"
-        top: Maximum number of users to return (max 999, default 100)
+        top: Maximum number of users to return (max 999, default 100). When
+            max_results is set, this is the page size requested from Graph.
         search: Search expression (requires quotes). Examples:
             - '"displayName:John"'
             - '"mail:john@"'
         count: If True, include total count of matching users
+        max_results: Follow Graph paging until this many users have been returned.
+            Use this to enumerate more than 999 users.
+        prefetch: Number of pages to fetch ahead while results are formatted (default 1)
+        live: If True, always query Graph instead of the local directory mirror
 
     Returns:
         List of users matching the query criteria.
@@ -146,13 +1064,40 @@ async def list_users(
         return "Error: Missing Azure credentials. Set AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET."
 
     try:
+        limit = max_results if max_results is not None else (top or 100)
+
+        mirror = None if live else _ready_mirror()
+        if mirror is not None and mirror.covers(select or LIST_USER_SELECT):
+            try:
+                users, total = mirror.list_users(
+                    filter=filter,
+                    select=select or LIST_USER_SELECT,
+                    orderby=orderby,
+                    search=search,
+                    limit=limit,
+                )
+            except UnsupportedQuery:
+                pass
+            else:
+                if not users:
+                    return "No users found matching the criteria."
+                lines = []
+                if count:
+                    lines.append(f"Total count: {total}")
+                lines.append(f"Returned: {len(users)} users\n")
+                lines.append("-" * 60)
+                for user in users:
+                    lines.append(_format_user_entry(user))
+                    lines.append("-" * 60)
+                if total > len(users):
+                    lines.append("More users are available; increase max_results to retrieve them.")
+                lines.append(_mirror_note(mirror))
+                return "\n".join(lines)
+
         # Build query parameters
         params = []
 
-        if select:
-            params.append(f"$select={','.join(select)}")
-        else:
-            params.append("$select=id,displayName,userPrincipalName,mail,jobTitle,department,accountEnabled")
+        params.append(f"$select={','.join(select or LIST_USER_SELECT)}")
 
         if filter:
             params.append(f"$filter={filter}")
@@ -160,10 +1105,8 @@ async def list_users(
         if orderby:
             params.append(f"$orderby={orderby}")
 
-        if top:
-            params.append(f"$top={min(top, 999)}")
-        else:
-            params.append("$top=100")
+        page_size = min(top or limit, 999)
+        params.append(f"$top={page_size}")
 
         if search:
             params.append(f"$search={search}")
@@ -179,32 +1122,44 @@ async def list_users(
         if search or count:
             headers["ConsistencyLevel"] = "eventual"
 
-        result = await graph_request(
-            method="GET",
-            endpoint=endpoint,
-            headers=headers,
-        )
+        users_lines = []
+        returned = 0
+        total_count = None
+        more_available = False
+
+        # A single page never needs the next one fetched ahead of time
+        pages = graph_pages(endpoint, headers=headers, prefetch=prefetch if limit > page_size else 0)
+        try:
+            async for page in pages:
+                if total_count is None:
+                    total_count = page.get("@odata.count")
 
-        users = result.get("value", [])
-        total_count = result.get("@odata.count")
+                users = page.get("value", [])
+                taken = users[: limit - returned]
+                for user in taken:
+                    users_lines.append(_format_user_entry(user))
+                    users_lines.append("-" * 60)
+                returned += len(taken)
 
-        if not users:
+                if returned >= limit:
+                    more_available = len(users) > len(taken) or "@odata.nextLink" in page
+                    break
+        finally:
+            await pages.aclose()
+
+        if not returned:
             return "No users found matching the criteria."
 
         # Format output
         lines = []
         if total_count is not None:
             lines.append(f"Total count: {total_count}")
-        lines.append(f"Returned: {len(users)} users\n")
+        lines.append(f"Returned: {returned} users\n")
         lines.append("-" * 60)
+        lines.extend(users_lines)
 
-        for user in users:
-            user_info = []
-            for key, value in user.items():
-                if value is not None and not key.startswith("@"):
-                    user_info.append(f"  {key}: {value}")
-            lines.append("\n".join(user_info))
-            lines.append("-" * 60)
+        if more_available:
+            lines.append("More users are available; increase max_results to retrieve them.")
 
         return "\n".join(lines)
 
@@ -214,5 +1169,122 @@ async def list_users(
         return f"Error: {str(e)}"
 
 
+@mcp.tool()
+@instrument_tool
+async def sync_user_directory() -> str:
+    """
+    Synchronise the local Entra ID user mirror with Microsoft Graph.
+
+    The first run downloads every user (resuming if a previous run was
+    interrupted); later runs only fetch changes since the last sync.
+    Requires GRAPH_USER_MIRROR=1.
+
+    Returns:
+        Summary of the changes applied and the size of the mirror.
+    """
+    if not is_configured():
+        return "Error: Missing Azure credentials. Set AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET."
+
+    if user_mirror is None:
+        return "Error: The user directory mirror is disabled. Set GRAPH_USER_MIRROR=1 to enable it."
+
+    try:
+        summary = await user_mirror.sync()
+        kind = "Full" if summary["full"] else "Delta"
+        return (
+            f"{kind} sync complete: {summary['pages']} pages, {summary['upserts']} users added or updated, "
+            f"{summary['deletes']} removed. Mirror now holds {user_mirror.user_count} users."
+        )
+
+    except httpx.HTTPStatusError as e:
+        return f"API Error {e.response.status_code}: {e.response.text}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@mcp.tool()
+@instrument_tool
+async def hunting_quota_status() -> str:
+    """
+    Show how much of the Advanced Hunting resource quota recent hunts have used.
+
+    Advanced Hunting limits the resources a tenant's queries may use within a
+    rolling window; exceeding it blocks all hunting until the window passes.
+    A query's cost is the CPU time Graph reports for it, or its wall time when
+    the response has no statistics.
+
+    Returns:
+        Usage in the current window against the configured budget, the policy
+        applied to new queries and the most expensive recent queries
+    """
+    stats = hunting_quota.status()
+    sources = ", ".join(f"{count} by {source}" for source, count in sorted(stats["sources"].items()))
+    lines = [
+        f"Advanced Hunting usage in the last {stats['window'] / 60:.0f} minutes:",
+        "-" * 40,
+        f"Queries: {stats['queries']}" + (f" (cost measured {sources})" if sources else ""),
+    ]
+    used = f"Cost: {stats['used']:.1f}s"
+    if stats["budget"]:
+        used += (
+            f" of a {stats['budget']:.0f}s budget ({stats['used'] / stats['budget']:.0%}); "
+            f"new queries are held back above {stats['threshold']:.0%}"
+        )
+    else:
+        used += " (no budget set; set HUNT_QUOTA_BUDGET to enforce one)"
+    lines.append(used)
+    if stats["reserved"]:
+        lines.append(f"Estimated cost of queries still running: {stats['reserved']:.1f}s")
+    lines.append(
+        f"Policy: {stats['policy']} ({stats['refused']} refused, {stats['deferred']} deferred since start)"
+    )
+    if stats["locked_for"]:
+        lines.append(f"Graph is throttling hunting queries for about {stats['locked_for']:.0f}s more.")
+
+    if stats["heaviest"]:
+        lines.append("\nMost expensive queries in the window:")
+        for usage in stats["heaviest"]:
+            query = " ".join(usage.query.split())
+            if len(query) > 80:
+                query = query[:79] + "…"
+            lines.append(f"  {usage.cost:.1f}s ({usage.source}), {usage.rows} rows: {query}")
+    return "\n".join(lines)
+
+
+@mcp.tool()
+@instrument_tool
+async def cache_stats() -> str:
+    """
+    Show hit and miss counters for the server's in-memory caches.
+
+    Returns:
+        One line per cache with its size, hits, misses, evictions and revalidations,
+        plus how many concurrent identical calls were collapsed.
+    """
+    lines = ["Cache statistics:", "-" * 40]
+    for name, cache in (("get_user", user_cache), ("hunt", hunt_cache)):
+        stats = cache.stats()
+        size = f" ({stats['bytes']} bytes)" if cache.max_bytes is not None else ""
+        lines.append(
+            f"{name}: {stats['entries']} entries{size}, {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate), {stats['evictions']} evictions, "
+            f"{stats['revalidations']} revalidations"
+        )
+
+    stats = result_store.stats()
+    lines.append(
+        f"result store: {stats['handles']} handles ({stats['in_memory']} in memory), "
+        f"{stats['memory_bytes']} bytes in memory, {stats['disk_bytes']} bytes on disk"
+    )
+
+    for name, flights in (("Graph GET", inflight_requests), ("hunt", hunt_flights)):
+        stats = flights.stats()
+        lines.append(
+            f"{name} in-flight dedup: {stats['started']} calls made, {stats['shared']} joined an identical call "
+            f"in flight, {stats['in_flight']} running"
+        )
+    return "\n".join(lines)
+
+
 if __name__ == "__main__":
     mcp.run()
@@ -0,0 +1,190 @@
+"""
+Streaming writers for exporting hunting results to local files.
+
+Rows are written as they arrive, so exporting hundreds of thousands of rows
+never holds the full result in memory. Supported formats:
+- ndjson: one JSON object per line
+- csv: header row from the result schema; dynamic values are JSON-encoded
+- parquet: written in row groups; needs the optional pyarrow package
+  (install the "parquet" extra). DateTime columns are kept as ISO 8601 strings.
+"""
+
+import csv
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+EXPORT_DIR = Path(os.environ.get("HUNT_EXPORT_DIR", Path(__file__).parent / "exports"))
+
+# Rows buffered per Parquet row group
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get("HUNT_EXPORT_ROW_GROUP_SIZE", "50000"))
+
+FORMATS = {"ndjson": ".ndjson", "csv": ".csv", "parquet": ".parquet"}
+
+
+def _cell(value):
+    """Flatten dynamic (object/array) values to JSON text for tabular formats."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return value
+
+
+class ResultWriter:
+    """Base class for streaming result writers."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.rows = 0
+        self.schema: list[dict] = []
+
+    def set_schema(self, schema: list[dict]) -> None:
+        self.schema = schema
+
+    @property
+    def columns(self) -> list[str]:
+        return [column["Name"] for column in self.schema]
+
+    def write(self, row: dict) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def abort(self) -> None:
+        """Close and remove a partially written file."""
+        try:
+            self.close()
+        finally:
+            self.path.unlink(missing_ok=True)
+
+
+class NdjsonWriter(ResultWriter):
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, row: dict) -> None:
+        self._file.write(json.dumps(row, default=str))
+        self._file.write("\n")
+        self.rows += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CsvWriter(ResultWriter):
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = None
+        self._header: list[str] = []
+
+    def write(self, row: dict) -> None:
+        if self._writer is None:
+            self._header = self.columns or list(row)
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self._header)
+        self._writer.writerow([_cell(row.get(name)) for name in self._header])
+        self.rows += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter(ResultWriter):
+    # Advanced Hunting schema types with a direct Arrow equivalent; others are written as strings
+    _ARROW_TYPES = {
+        "Int32": "int32",
+        "Int64": "int64",
+        "Long": "int64",
+        "Double": "float64",
+        "Real": "float64",
+        "Boolean": "bool_",
+    }
+
+    def __init__(self, path: Path):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ValueError("Parquet export requires pyarrow. Install the 'parquet' extra.") from e
+        super().__init__(path)
+        self._writer = None
+        self._arrow_schema = None
+        self._buffer: dict[str, list] = {}
+
+    def write(self, row: dict) -> None:
+        if self._arrow_schema is None:
+            self._arrow_schema = self._build_schema(row)
+            self._buffer = {name: [] for name in self._arrow_schema.names}
+        for name, values in self._buffer.items():
+            values.append(_cell(row.get(name)))
+        self.rows += 1
+        if self.rows % PARQUET_ROW_GROUP_SIZE == 0:
+            self._flush()
+
+    def _build_schema(self, first_row: dict):
+        import pyarrow as pa
+
+        types = {column["Name"]: column.get("Type") for column in self.schema}
+        names = self.columns or list(first_row)
+        return pa.schema(
+            [(name, getattr(pa, self._ARROW_TYPES.get(types.get(name), "string"))()) for name in names]
+        )
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._buffer or not next(iter(self._buffer.values())):
+            return
+        arrays = []
+        for field in self._arrow_schema:
+            values = self._buffer[field.name]
+            if pa.types.is_string(field.type):
+                values = [None if v is None else str(v) for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, self._arrow_schema)
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._arrow_schema))
+        self._buffer = {name: [] for name in self._buffer}
+
+    def close(self) -> None:
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+        elif not self.path.exists():
+            # No rows: still produce a valid, empty file with the known columns
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = self._arrow_schema or pa.schema([(name, pa.string()) for name in self.columns])
+            pq.write_table(schema.empty_table(), self.path)
+
+
+_WRITERS = {"ndjson": NdjsonWriter, "csv": CsvWriter, "parquet": ParquetWriter}
+
+
+def export_path(format: str, filename: str | None = None) -> Path:
+    """
+    Resolve the output file for an export inside EXPORT_DIR.
+
+    Only the final path component of filename is used, so exports can't be
+    written outside the export directory; without one (e.g. "/" or "..") a
+    timestamped name is generated.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported export format: {format}. Use one of: {', '.join(FORMATS)}")
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    name = Path(filename).name if filename else ""
+    if name.strip("."):
+        if not name.endswith(FORMATS[format]):
+            name += FORMATS[format]
+    else:
+        name = f"hunt-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{FORMATS[format]}"
+    return EXPORT_DIR / name
+
+
+def open_writer(format: str, filename: str | None = None) -> ResultWriter:
+    """Create a streaming writer for the given format."""
+    return _WRITERS[format](export_path(format, filename))
@@ -0,0 +1,209 @@
+"""
+Compact text rendering of hunting results for the model's context window.
+
+Printing each row as a dict repeats every column name on every line. The
+formatter instead renders a table with the header written once (TSV or
+markdown), truncates long cells, hides columns that are empty in the rows
+shown, and fits the table into a character budget by choosing how many rows
+and columns to show:
+1. rows are added until the budget is reached
+2. if fewer than MIN_ROWS fit, long cells are truncated harder
+3. if that is still not enough, the widest columns are left out
+
+As a rule of thumb one token is about four characters of table text.
+"""
+
+import json
+import os
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+from columnar import ColumnarResult
+from metrics import FORMAT_DURATION
+from tracing import span
+
+# Character budget for the table part of a tool response
+HUNT_OUTPUT_MAX_CHARS = int(os.environ.get("HUNT_OUTPUT_MAX_CHARS", "24000"))
+
+# Longest cell shown before truncation
+HUNT_CELL_MAX_CHARS = int(os.environ.get("HUNT_CELL_MAX_CHARS", "120"))
+
+# Most rows rendered in one response, however small they are
+HUNT_OUTPUT_MAX_ROWS = int(os.environ.get("HUNT_OUTPUT_MAX_ROWS", "500"))
+
+# Cells are never truncated below this many characters when fitting the budget
+MIN_CELL_CHARS = 24
+
+# Rows the formatter tries to show before it starts shrinking cells or dropping columns
+MIN_ROWS = 10
+
+STYLES = ("tsv", "markdown")
+
+_ELLIPSIS = "…"
+
+
+@dataclass
+class Table:
+    text: str
+    rows: int
+    columns: list[str]
+    empty_columns: list[str] = field(default_factory=list)
+    hidden_columns: list[str] = field(default_factory=list)
+    cell_chars: int = HUNT_CELL_MAX_CHARS
+    truncated_cells: int = 0
+
+    def notes(self) -> list[str]:
+        """Explain what was left out, for appending below the table."""
+        notes = []
+        if self.hidden_columns:
+            notes.append(
+                f"Columns omitted to fit the output budget: {', '.join(self.hidden_columns)} "
+                "(use fetch_rows with columns=[...] to see them)"
+            )
+        if self.empty_columns:
+            notes.append(f"Empty columns not shown: {', '.join(self.empty_columns)}")
+        if self.truncated_cells:
+            notes.append(f"{self.truncated_cells} cells truncated to {self.cell_chars} characters")
+        return notes
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"), default=str)
+    return str(value)
+
+
+def _escape(text: str, style: str) -> str:
+    if style == "markdown":
+        return text.replace("|", "\\|").replace("\r", " ").replace("\n", " ")
+    return text.replace("\t", "\\t").replace("\r", "\\r").replace("\n", "\\n")
+
+
+class _Cells:
+    """Rendered, escaped cell text for the candidate rows, computed on demand."""
+
+    def __init__(self, result: ColumnarResult, indices: range, style: str):
+        self.result = result
+        self.indices = indices
+        self.style = style
+        self._cache: dict[str, list[str]] = {}
+
+    def column(self, name: str) -> list[str]:
+        cells = self._cache.get(name)
+        if cells is None:
+            values = self.result.columns[name]
+            cells = self._cache[name] = [_escape(_text(values[i]), self.style) for i in self.indices]
+        return cells
+
+
+def _clip(text: str, width: int) -> tuple[str, bool]:
+    if len(text) <= width:
+        return text, False
+    return text[: width - 1] + _ELLIPSIS, True
+
+
+def _line(cells: Sequence[str], style: str) -> str:
+    if style == "markdown":
+        return "| " + " | ".join(cells) + " |"
+    return "\t".join(cells)
+
+
+def _header(columns: Sequence[str], style: str) -> list[str]:
+    lines = [_line(columns, style)]
+    if style == "markdown":
+        lines.append(_line(["---"] * len(columns), style))
+    return lines
+
+
+def _render(cells: _Cells, columns: list[str], width: int, max_chars: int) -> tuple[list[str], int, int]:
+    """Render as many rows as fit in max_chars. Returns (lines, rows, truncated cells)."""
+    lines = _header(columns, cells.style)
+    used = sum(len(line) + 1 for line in lines)
+    rendered = [cells.column(name) for name in columns]
+    rows = truncated = 0
+    for i in range(len(cells.indices)):
+        clipped = [_clip(column[i], width) for column in rendered]
+        line = _line([text for text, _ in clipped], cells.style)
+        if used + len(line) + 1 > max_chars:
+            break
+        lines.append(line)
+        used += len(line) + 1
+        rows += 1
+        truncated += sum(cut for _, cut in clipped)
+    return lines, rows, truncated
+
+
+def format_table(
+    result: ColumnarResult,
+    start: int = 0,
+    stop: int | None = None,
+    style: str = "tsv",
+    max_chars: int = HUNT_OUTPUT_MAX_CHARS,
+    max_cell: int = HUNT_CELL_MAX_CHARS,
+    columns: Sequence[str] | None = None,
+) -> Table:
+    """
+    Render rows start..stop of a result as a compact table within max_chars.
+
+    Args:
+        result: Result to render
+        start: Index of the first candidate row
+        stop: Index after the last candidate row (default: start + HUNT_OUTPUT_MAX_ROWS)
+        style: "tsv" or "markdown"
+        max_chars: Character budget for the whole table, header included
+        max_cell: Longest cell shown before truncation
+        columns: Columns to consider (default: all)
+
+    Returns:
+        The rendered Table. Table.rows may be smaller than stop - start when
+        the budget runs out.
+    """
+    if style not in STYLES:
+        raise ValueError(f"Unsupported output format: {style}. Use one of: {', '.join(STYLES)}")
+
+    with span("format", {"format.style": style, "format.max_chars": max_chars}) as current:
+        start = max(start, 0)
+        started = time.perf_counter()
+        stop = min(start + HUNT_OUTPUT_MAX_ROWS if stop is None else stop, len(result))
+        indices = range(start, max(stop, start))
+        cells = _Cells(result, indices, style)
+
+        names = [name for name in (columns or result.column_names) if name in result.columns]
+        shown = [name for name in names if any(cells.column(name))] or names[:1]
+        empty = [name for name in names if name not in shown]
+        hidden: list[str] = []
+
+        width = max(max_cell, 2)
+        wanted = min(len(indices), MIN_ROWS)
+        while True:
+            lines, rows, truncated = _render(cells, shown, width, max_chars)
+            if rows >= wanted or (width <= MIN_CELL_CHARS and len(shown) <= 1):
+                break
+            if width > MIN_CELL_CHARS:
+                width = max(MIN_CELL_CHARS, width // 2)
+                continue
+            # Leave out the column that takes the most room in the rows we want to show
+            widest = max(
+                shown,
+                key=lambda name: sum(min(len(text), width) for text in cells.column(name)[:wanted]),
+            )
+            shown.remove(widest)
+            hidden.append(widest)
+
+        hidden.sort(key=names.index)
+        FORMAT_DURATION.labels(style).observe(time.perf_counter() - started)
+        current.set_attributes({"format.rows": rows, "format.hidden_columns": len(hidden)})
+        return Table(
+            text="\n".join(lines),
+            rows=rows,
+            columns=shown,
+            empty_columns=empty,
+            hidden_columns=hidden,
+            cell_chars=width,
+            truncated_cells=truncated,
+        )
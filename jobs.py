@@ -0,0 +1,144 @@
+"""
+Background jobs for long-running tool calls.
+
+A slow Advanced Hunting query can outlive the client's tool-call timeout, and
+the result is lost with the call. JobManager runs such work as background
+tasks instead: the tool returns a job ID at once and later calls poll for the
+status and fetch the result. At most JOB_MAX_CONCURRENCY jobs run at the same
+time; the rest wait in FIFO order. Finished jobs are forgotten after
+JOB_RETENTION seconds, or sooner once more than JOB_MAX_JOBS are kept.
+"""
+
+import asyncio
+import os
+import secrets
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+JOB_MAX_CONCURRENCY = int(os.environ.get("HUNT_JOB_CONCURRENCY", "2"))
+JOB_RETENTION = float(os.environ.get("HUNT_JOB_RETENTION", "3600"))
+JOB_MAX_JOBS = int(os.environ.get("HUNT_JOB_MAX_JOBS", "100"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class Job:
+    id: str
+    description: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    progress: int = 0
+    result: Any = None
+    error: BaseException | None = None
+    task: asyncio.Task | None = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED, CANCELLED)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def report(self, progress: int) -> None:
+        """Record progress, e.g. rows received so far."""
+        self.progress = progress
+
+
+class JobManager:
+    """Runs submitted coroutines as background jobs with bounded concurrency."""
+
+    def __init__(
+        self,
+        max_concurrency: int = JOB_MAX_CONCURRENCY,
+        retention: float = JOB_RETENTION,
+        max_jobs: int = JOB_MAX_JOBS,
+    ):
+        self.retention = retention
+        self.max_jobs = max_jobs
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+
+    def submit(self, description: str, work: Callable[[Job], Awaitable[Any]]) -> Job:
+        """Start work(job) in the background and return the job right away."""
+        self._prune()
+        job = Job(id=f"j-{secrets.token_hex(4)}", description=description)
+        job.task = asyncio.create_task(self._run(job, work))
+        self._jobs[job.id] = job
+        return job
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Any]]) -> None:
+        try:
+            async with self._semaphore:
+                job.status = RUNNING
+                job.started_at = time.time()
+                job.result = await work(job)
+            job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Job | None:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        self._prune()
+        return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it had already finished."""
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        job.task.cancel()
+        return True
+
+    async def wait(self, job: Job, timeout: float) -> bool:
+        """Wait up to timeout seconds for a job to finish. Returns whether it did."""
+        if not job.done:
+            await asyncio.wait({job.task}, timeout=max(timeout, 0))
+        return job.done
+
+    def _prune(self) -> None:
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.done]
+        for job in finished:
+            if now - job.finished_at > self.retention:
+                del self._jobs[job.id]
+        # Drop the oldest finished jobs beyond the job limit; running jobs are kept
+        for job in finished:
+            if len(self._jobs) <= self.max_jobs:
+                break
+            self._jobs.pop(job.id, None)
+
+    async def close(self) -> None:
+        """Cancel all unfinished jobs and wait for them to stop."""
+        tasks = [job.task for job in self._jobs.values() if not job.done]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._jobs.clear()
+
+    def stats(self) -> dict:
+        counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED)}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
@@ -0,0 +1,126 @@
+"""
+Incremental parsing of large JSON responses.
+
+runHuntingQuery returns {"schema": [...], "results": [...]} where results can
+hold hundreds of thousands of rows. Instead of buffering the whole body and
+materializing it with response.json(), iter_object_items parses the body as
+it arrives and yields the elements of one array member one at a time, so
+memory is bounded by the chunk size plus a single element.
+"""
+
+import codecs
+import json
+import re
+from collections.abc import AsyncIterable, AsyncIterator
+from typing import Any
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Characters that may continue a JSON number
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+_DECODER = json.JSONDecoder()
+
+
+class _StreamBuffer:
+    """Decoded text from a byte stream, read on demand."""
+
+    def __init__(self, chunks: AsyncIterable[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    async def fill(self) -> bool:
+        """Append the next chunk, returning False at the end of the stream."""
+        if self.eof:
+            return False
+        # Drop what has already been parsed so the buffer stays small
+        self.text = self.text[self.pos :]
+        self.pos = 0
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self.text += self._decoder.decode(b"", final=True)
+            self.eof = True
+            return False
+        self.text += self._decoder.decode(chunk)
+        return True
+
+    async def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not await self.fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    async def expect(self, char: str) -> None:
+        found = await self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of JSON stream, found {found!r}")
+        self.pos += 1
+
+    async def value(self) -> Any:
+        """Parse one complete JSON value, reading more input as needed."""
+        await self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not await self.fill():
+                    raise
+                continue
+            # A number that ends the buffer may continue in the next chunk, even
+            # if what is left of it ("7." or "1e") didn't parse as part of it yet
+            tail = _NUMBER_TAIL.match(self.text, end).end()
+            if tail == len(self.text) and isinstance(value, (int, float)) and not isinstance(value, bool):
+                if await self.fill():
+                    continue
+            self.pos = end
+            return value
+
+
+async def iter_object_items(chunks: AsyncIterable[bytes], stream_key: str) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Incrementally parse a top-level JSON object from a byte stream.
+
+    Args:
+        chunks: Raw body chunks, e.g. httpx.Response.aiter_bytes()
+        stream_key: Member whose array value is yielded element by element
+
+    Yields:
+        (key, value) for each top-level member, except that each element of
+        the stream_key array is yielded separately as (stream_key, element)
+    """
+    buffer = _StreamBuffer(chunks)
+    await buffer.expect("{")
+    if await buffer.peek() == "}":
+        return
+
+    while True:
+        key = await buffer.value()
+        await buffer.expect(":")
+
+        if key == stream_key and await buffer.peek() == "[":
+            buffer.pos += 1
+            if await buffer.peek() == "]":
+                buffer.pos += 1
+            else:
+                while True:
+                    yield key, await buffer.value()
+                    separator = await buffer.peek()
+                    buffer.pos += 1
+                    if separator == "]":
+                        break
+                    if separator != ",":
+                        raise ValueError(f"Expected ',' or ']' in JSON array, found {separator!r}")
+        else:
+            yield key, await buffer.value()
+
+        separator = await buffer.peek()
+        buffer.pos += 1
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or '}}' in JSON object, found {separator!r}")
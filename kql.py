@@ -0,0 +1,425 @@
+"""
+Lightweight KQL lexer and preflight analyzer.
+
+Splits a Kusto query into tokens while respecting string literals and
+comments. Used to build whitespace- and comment-insensitive cache keys for
+hunting queries and to inspect which tabular operators a query uses.
+
+analyze_query checks a hunting query before it is sent: it estimates its
+scan cost from the tables and lookback it touches, flags patterns that waste
+quota (no Timestamp filter, no row limit, contains on large tables, search
+over all tables), and can rewrite it with an explicit time bound and a
+| take guard. HUNT_PREFLIGHT selects what hunt does with the result: "warn"
+(default) reports findings, "rewrite" also applies the rewrites, "reject"
+refuses queries with errors, "off" skips the check.
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+
+PREFLIGHT_MODE = os.environ.get("HUNT_PREFLIGHT", "warn").lower()
+PREFLIGHT_MODES = ("off", "warn", "rewrite", "reject")
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*)
+  | (?P<string>
+        [hH]?(?:
+            @'[^']*'
+          | @"[^"]*"
+          | '(?:[^'\\\n]|\\.)*'
+          | "(?:[^"\\\n]|\\.)*"
+          | ```[\s\S]*?```
+        )
+    )
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?[A-Za-z]*)
+  | (?P<ident>[A-Za-z_$][\w$]*(?:-[A-Za-z_$][\w$]*)*)
+  | (?P<op>==|!=|<>|<=|>=|=~|!~|=>|\.\.|[-+*/%<>=!|.,;:()\[\]{}])
+  | (?P<other>.)
+    """,
+    re.VERBOSE,
+)
+
+
+# Operators whose output depends on seeing all input rows at once
+AGGREGATING_OPERATORS = {
+    "summarize",
+    "count",
+    "top",
+    "top-nested",
+    "distinct",
+    "make-series",
+    "evaluate",
+    "sort",
+    "order",
+    "take",
+    "limit",
+    "sample",
+    "sample-distinct",
+}
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str  # "string", "number", "ident", "op" or "other"
+    text: str
+    start: int
+    end: int
+
+
+def tokenize(query: str) -> list[Token]:
+    """Split a KQL query into tokens, dropping whitespace and comments."""
+    return [
+        Token(match.lastgroup, match.group(), match.start(), match.end())
+        for match in _TOKEN_PATTERN.finditer(query)
+        if match.lastgroup not in ("ws", "comment")
+    ]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a query for use as a cache key.
+
+    Comments are removed and tokens are joined with single spaces, so queries
+    that differ only in layout normalize to the same string. String literals
+    and identifier case are preserved since KQL is case-sensitive.
+    """
+    return " ".join(token.text for token in tokenize(query))
+
+
+def pipeline_operators(query: str) -> list[str]:
+    """
+    Names of the tabular operators applied after each top-level pipe.
+
+    "T | where x > 1 | summarize count() by y" -> ["where", "summarize"]
+    """
+    operators = []
+    depth = 0
+    tokens = tokenize(query)
+    for i, token in enumerate(tokens):
+        if token.text in ("(", "[", "{"):
+            depth += 1
+        elif token.text in (")", "]", "}"):
+            depth -= 1
+        elif token.text == "|" and depth == 0 and i + 1 < len(tokens):
+            operators.append(tokens[i + 1].text.lower())
+    return operators
+
+
+def _last_operator(tokens: list[Token]) -> int | None:
+    """Index of the token naming the query's last top-level tabular operator."""
+    depth = 0
+    last = None
+    for i, token in enumerate(tokens):
+        if token.text in ("(", "[", "{"):
+            depth += 1
+        elif token.text in (")", "]", "}"):
+            depth -= 1
+        elif token.text == "|" and depth == 0 and i + 1 < len(tokens):
+            last = i + 1
+        elif token.text == ";" and depth == 0:
+            last = None
+    return last
+
+
+def _strip_end(query: str) -> str:
+    return query.rstrip().rstrip(";").rstrip()
+
+
+def limit_rows(query: str, limit: int) -> str:
+    """
+    Make a query return at most limit rows.
+
+    A final take, limit or top with a larger literal row count is tightened
+    to limit, one with a smaller count is left alone, and anything else gets
+    "| take limit" appended.
+
+    "T | take 1000"           -> "T | take 500"
+    "T | top 1000 by X"       -> "T | top 500 by X"
+    "T | where X > 1"         -> "T | where X > 1\n| take 500"
+    """
+    tokens = tokenize(query)
+    last = _last_operator(tokens)
+    if last is not None and last + 1 < len(tokens) and tokens[last].text.lower() in ("take", "limit", "top"):
+        count = tokens[last + 1]
+        if count.kind == "number" and count.text.isdigit():
+            if int(count.text) <= limit:
+                return query
+            return f"{query[: count.start]}{limit}{query[count.end :]}"
+    return f"{_strip_end(query)}\n| take {limit}"
+
+
+def count_query(query: str) -> str:
+    """The query with "| count" appended, returning its number of result rows."""
+    return f"{_strip_end(query)}\n| count"
+
+
+# Operators after which a query returns a bounded number of rows
+BOUNDING_OPERATORS = {
+    "summarize",
+    "count",
+    "top",
+    "top-nested",
+    "top-hitters",
+    "distinct",
+    "make-series",
+    "take",
+    "limit",
+    "sample",
+    "sample-distinct",
+}
+
+# Approximate relative daily volume of Advanced Hunting tables in a typical
+# tenant (for UNTIMED_TABLES, their size); only the proportions matter. A day
+# of DeviceInfo is 1.
+TABLE_WEIGHTS = {
+    "DeviceNetworkEvents": 60,
+    "DeviceImageLoadEvents": 50,
+    "DeviceProcessEvents": 40,
+    "DeviceFileEvents": 40,
+    "DeviceEvents": 40,
+    "DeviceRegistryEvents": 30,
+    "DeviceLogonEvents": 10,
+    "DeviceFileCertificateInfo": 10,
+    "DeviceNetworkInfo": 2,
+    "DeviceInfo": 1,
+    "DeviceTvmSoftwareInventory": 5,
+    "DeviceTvmSoftwareVulnerabilities": 10,
+    "CloudAppEvents": 30,
+    "IdentityQueryEvents": 15,
+    "IdentityLogonEvents": 10,
+    "IdentityDirectoryEvents": 5,
+    "IdentityInfo": 1,
+    "AADSignInEventsBeta": 15,
+    "AADSpnSignInEventsBeta": 10,
+    "EmailEvents": 10,
+    "EmailUrlInfo": 8,
+    "EmailAttachmentInfo": 4,
+    "EmailPostDeliveryEvents": 1,
+    "UrlClickEvents": 2,
+    "AlertInfo": 0.1,
+    "AlertEvidence": 0.5,
+    "BehaviorInfo": 0.1,
+    "BehaviorEntities": 0.2,
+}
+
+# Snapshot tables without a Timestamp column: a time filter can't apply, and
+# their cost doesn't grow with the lookback
+UNTIMED_TABLES = {"DeviceTvmSoftwareInventory", "DeviceTvmSoftwareVulnerabilities"}
+
+# Tables at least this heavy are too large for full-text operators like contains
+LARGE_TABLE_WEIGHT = 10
+
+# Substring operators that cannot use the term index, unlike has/has_cs
+_SUBSTRING_OPERATORS = {"contains", "contains_cs", "notcontains", "notcontains_cs", "endswith", "endswith_cs"}
+
+_TIME_COLUMNS = {"Timestamp", "TimeGenerated"}
+
+_UNIT_DAYS = {"d": 1.0, "h": 1 / 24, "m": 1 / 1440, "s": 1 / 86400, "ms": 1 / 86400000}
+
+
+@dataclass(frozen=True)
+class Finding:
+    severity: str  # "warning" or "error"
+    code: str
+    message: str
+
+
+@dataclass
+class QueryAnalysis:
+    query: str
+    tables: list[str]
+    lookback_days: float
+    time_filter: bool
+    bounded: bool
+    cost: float
+    findings: list[Finding] = field(default_factory=list)
+    rewrites: list[str] = field(default_factory=list)
+    rewritten: str = ""
+
+    @property
+    def errors(self) -> list[Finding]:
+        return [finding for finding in self.findings if finding.severity == "error"]
+
+
+def _days(literal: str) -> float | None:
+    """Length of a KQL timespan literal such as 7d or 12h, in days."""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)(d|h|m|s|ms)?", literal)
+    if not match:
+        return None
+    return float(match.group(1)) * _UNIT_DAYS[match.group(2) or "d"]
+
+
+def _final_statement(tokens: list[Token]) -> int:
+    """Index of the first token of the query's last statement, after any let statements."""
+    depth = 0
+    start = 0
+    for i, token in enumerate(tokens):
+        if token.text in ("(", "[", "{"):
+            depth += 1
+        elif token.text in (")", "]", "}"):
+            depth -= 1
+        elif token.text == ";" and depth == 0 and i + 1 < len(tokens):
+            start = i + 1
+    return start
+
+
+def _time_filter_days(tokens: list[Token]) -> tuple[bool, float | None]:
+    """
+    Whether the query filters on a time column, and the lookback if written as ago(N).
+
+    Recognises "Timestamp > ago(7d)", "Timestamp >= ago(12h)" and
+    "Timestamp between (ago(3d) .. now())".
+    """
+    found = False
+    lookback = None
+    for i, token in enumerate(tokens):
+        if token.text not in _TIME_COLUMNS or i + 1 >= len(tokens):
+            continue
+        if tokens[i + 1].text not in (">", ">=", "between"):
+            continue
+        found = True
+        window = tokens[i + 2 : i + 8]
+        for j, candidate in enumerate(window[:-2]):
+            if candidate.text == "ago" and window[j + 1].text == "(":
+                days = _days(window[j + 2].text)
+                if days is not None:
+                    lookback = days if lookback is None else min(lookback, days)
+                break
+    return found, lookback
+
+
+def analyze_query(query: str, days: float = 30, limit: int | None = None, bounded: bool = False) -> QueryAnalysis:
+    """
+    Estimate a hunting query's cost and flag patterns that waste quota.
+
+    Args:
+        query: KQL query
+        days: Lookback the query will run with (the hunt's Timespan)
+        limit: Row limit to add as "| take N" when the query has none
+        bounded: Whether the caller limits the rows itself, so the query counts as bounded
+
+    Returns:
+        The analysis; rewritten is the query with an explicit Timestamp bound
+        after its source table when it lacks one, and the take guard when the
+        query returns unbounded rows and limit is given.
+    """
+    tokens = tokenize(query)
+    operators = pipeline_operators(query)
+    findings = []
+
+    names = {token.text for token in tokens if token.kind == "ident"}
+    tables = [name for name in TABLE_WEIGHTS if name in names]
+    scans_everything = (bool(tokens) and tokens[0].text.lower() == "search") or any(
+        token.text.lower() in ("search", "union")
+        and i + 1 < len(tokens)
+        and tokens[i + 1].text == "*"
+        for i, token in enumerate(tokens)
+    )
+    time_filter, filter_days = _time_filter_days(tokens)
+    if scans_everything:
+        findings.append(
+            Finding(
+                "warning" if time_filter else "error",
+                "all-tables",
+                "search or union * scans every table; name the tables to query instead.",
+            )
+        )
+
+    lookback = min(days, filter_days) if filter_days is not None else days
+    bounded = bounded or bool(BOUNDING_OPERATORS.intersection(operators))
+    large = [table for table in tables if TABLE_WEIGHTS[table] >= LARGE_TABLE_WEIGHT]
+    substring = sorted({token.text for token in tokens if token.text.lower() in _SUBSTRING_OPERATORS})
+
+    scanned = list(TABLE_WEIGHTS) if scans_everything else tables
+    timed_weight = sum(TABLE_WEIGHTS[table] for table in scanned if table not in UNTIMED_TABLES)
+    untimed_weight = sum(TABLE_WEIGHTS[table] for table in scanned if table in UNTIMED_TABLES)
+    cost = (timed_weight * lookback + untimed_weight) * (2 if substring and large else 1)
+
+    timed_large = [table for table in large if table not in UNTIMED_TABLES]
+    if not time_filter and (not tables or any(table not in UNTIMED_TABLES for table in tables)):
+        findings.append(
+            Finding(
+                "error" if timed_large and not bounded else "warning",
+                "no-time-filter",
+                f"No Timestamp filter: scans all {days:g} days"
+                + (f" of {', '.join(timed_large)}" if timed_large else "")
+                + ". Add | where Timestamp > ago(Nd) right after the table.",
+            )
+        )
+    if not bounded:
+        findings.append(
+            Finding(
+                "warning",
+                "unbounded",
+                "No take, limit, top or summarize: every matching row is downloaded "
+                "(up to Advanced Hunting's 100,000-row cap).",
+            )
+        )
+    if substring and large:
+        findings.append(
+            Finding(
+                "warning",
+                "substring-scan",
+                f"{', '.join(substring)} on {', '.join(large)} cannot use the term index; "
+                "use has (whole terms) or has_cs where possible.",
+            )
+        )
+
+    # The take goes at the end first so the source table's offsets stay valid for the time bound
+    rewritten = query
+    rewrites = []
+    if limit is not None and not bounded and not scans_everything:
+        rewritten = limit_rows(rewritten, limit)
+        rewrites.append(f"added | take {limit}")
+    start = _final_statement(tokens)
+    if (
+        not time_filter
+        and start < len(tokens)
+        and tokens[start].text in TABLE_WEIGHTS
+        and tokens[start].text not in UNTIMED_TABLES
+    ):
+        source = tokens[start]
+        bound = f"{days:g}d"
+        rewritten = f"{rewritten[: source.end]}\n| where Timestamp > ago({bound}){rewritten[source.end :]}"
+        rewrites.insert(0, f"added | where Timestamp > ago({bound}) after {source.text}")
+
+    return QueryAnalysis(
+        query=query,
+        tables=tables,
+        lookback_days=lookback,
+        time_filter=time_filter,
+        bounded=bounded,
+        cost=cost,
+        findings=findings,
+        rewrites=rewrites,
+        rewritten=rewritten,
+    )
+
+
+class PreflightError(ValueError):
+    """A hunting query was rejected by the preflight check."""
+
+
+def preflight(
+    query: str, days: float, limit: int | None = None, bounded: bool = False, mode: str = PREFLIGHT_MODE
+) -> tuple[str, QueryAnalysis | None]:
+    """
+    Run the preflight check on a hunt according to mode (see HUNT_PREFLIGHT).
+
+    limit and bounded are passed on to analyze_query. Returns the query to
+    send, rewritten in "rewrite" mode, and the analysis (None in "off" mode).
+
+    Raises PreflightError in "reject" mode when the analysis found errors.
+    """
+    if mode not in PREFLIGHT_MODES:
+        raise ValueError(f"Unsupported preflight mode: {mode}. Use one of: {', '.join(PREFLIGHT_MODES)}")
+    if mode == "off":
+        return query, None
+    analysis = analyze_query(query, days, limit if mode == "rewrite" else None, bounded)
+    if mode == "reject" and analysis.errors:
+        reasons = "\n".join(f"- {finding.message}" for finding in analysis.errors)
+        raise PreflightError(f"Query rejected by preflight check:\n{reasons}")
+    return (analysis.rewritten if mode == "rewrite" else query), analysis
@@ -0,0 +1,322 @@
+"""
+Prometheus metrics for tool calls and Graph requests.
+
+A small self-contained implementation of counters, gauges and histograms
+rendered in the Prometheus text exposition format (version 0.0.4), so no
+client library is needed. What is recorded:
+- tool calls: duration, outcome and calls in flight (instrument_tool)
+- Graph requests: responses by status, retries, transport errors and
+  requests in flight, per endpoint
+- request phases via httpx's trace extension: connection setup, time to
+  first byte and body download, plus token fetch and JSON parse time
+- result formatting time
+- Advanced Hunting quota usage and queries refused or deferred
+
+Metrics are served at http://127.0.0.1:GRAPH_METRICS_PORT/metrics when that
+variable is set, and/or written to GRAPH_METRICS_FILE every
+GRAPH_METRICS_INTERVAL seconds and at shutdown.
+"""
+
+import asyncio
+import functools
+import logging
+import math
+import os
+import time
+from collections.abc import Callable, Iterable, Sequence
+from pathlib import Path
+
+from tracing import span
+
+METRICS_PORT = int(os.environ.get("GRAPH_METRICS_PORT", "0")) or None
+METRICS_FILE = os.environ.get("GRAPH_METRICS_FILE")
+METRICS_INTERVAL = float(os.environ.get("GRAPH_METRICS_INTERVAL", "15"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+logger = logging.getLogger(__name__)
+
+# Every metric registers itself here on creation
+REGISTRY: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values: str, **kwargs: str):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}", *self._samples()]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in self._children.items():
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(child.value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets)) + (math.inf,)
+
+    def _new_child(self) -> _Histogram:
+        return _Histogram(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(child.bounds, child.counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(child.sum)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+TOOL_DURATION = Histogram("mcp_tool_duration_seconds", "Time spent in an MCP tool call", ["tool", "outcome"])
+TOOL_IN_FLIGHT = Gauge("mcp_tool_calls_in_flight", "MCP tool calls currently running", ["tool"])
+TOKEN_FETCH = Histogram("graph_token_fetch_seconds", "Time to obtain an access token from Entra ID")
+HTTP_PHASE = Histogram(
+    "graph_http_phase_seconds",
+    "Graph request phases: connect (TCP and TLS setup), ttfb (request sent to response headers), download (body)",
+    ["endpoint", "phase"],
+)
+JSON_PARSE = Histogram("graph_json_parse_seconds", "Time to parse a Graph JSON response body", ["endpoint"])
+FORMAT_DURATION = Histogram("result_format_seconds", "Time to render results as text for a tool response", ["style"])
+RESPONSES = Counter("graph_responses_total", "Graph responses by status code", ["endpoint", "method", "status"])
+RETRIES = Counter("graph_retries_total", "Graph request attempts that were retried", ["endpoint", "reason"])
+TRANSPORT_ERRORS = Counter("graph_transport_errors_total", "Graph requests that failed below HTTP", ["endpoint"])
+HUNTING_QUOTA_USED = Gauge(
+    "hunting_quota_used_seconds", "Cost of Advanced Hunting queries in the current quota window (as of the last update)"
+)
+HUNTING_QUOTA_HELD = Counter("hunting_quota_held_total", "Hunting queries held back by the quota policy", ["decision"])
+REQUESTS_IN_FLIGHT = Gauge("graph_requests_in_flight", "Graph requests currently being sent or awaited", ["endpoint"])
+
+
+class HttpTrace:
+    """httpx "trace" extension callback that times connection and response phases."""
+
+    __slots__ = ("endpoint", "_started")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self._started: dict[str, float] = {}
+
+    async def __call__(self, event: str, info: dict) -> None:
+        step, _, stage = event.rpartition(".")
+        step = step.rpartition(".")[2]
+        now = time.perf_counter()
+        started = self._started
+
+        if stage == "started":
+            if step == "send_request_headers" and "connect_tcp" in started:
+                # A new connection was opened for this request: TCP connect plus TLS handshake
+                HTTP_PHASE.labels(self.endpoint, "connect").observe(now - started.pop("connect_tcp"))
+            elif step == "response_closed" and "receive_response_body" in started:
+                # Streamed bodies closed by the reader only report their own end when garbage collected
+                HTTP_PHASE.labels(self.endpoint, "download").observe(now - started.pop("receive_response_body"))
+            if step in ("connect_tcp", "send_request_headers", "receive_response_body"):
+                started[step] = now
+        elif stage == "complete":
+            if step == "receive_response_headers" and "send_request_headers" in started:
+                HTTP_PHASE.labels(self.endpoint, "ttfb").observe(now - started.pop("send_request_headers"))
+            elif step == "receive_response_body" and "receive_response_body" in started:
+                HTTP_PHASE.labels(self.endpoint, "download").observe(now - started.pop("receive_response_body"))
+
+
+def _outcome(output) -> str:
+    if isinstance(output, str) and output.startswith(("Error", "API Error")):
+        return "error"
+    return "ok"
+
+
+def instrument_tool(func: Callable) -> Callable:
+    """Record duration, outcome and concurrency of an async MCP tool, and trace each call in a span."""
+    name = func.__name__
+    in_flight = TOOL_IN_FLIGHT.labels(name)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outcome = "exception"
+        in_flight.inc()
+        try:
+            with span(f"tool {name}", {"mcp.tool.name": name}) as current:
+                output = await func(*args, **kwargs)
+                outcome = _outcome(output)
+                if outcome == "error":
+                    current.record_error(output.splitlines()[0][:200])
+            return output
+        finally:
+            in_flight.dec()
+            TOOL_DURATION.labels(name, outcome).observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def write_file(path: str | Path) -> None:
+    """Write the current metrics to a file, replacing it atomically."""
+    path = Path(path)
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_text(render(), encoding="utf-8")
+    temporary.replace(path)
+
+
+class MetricsExporter:
+    """Serves /metrics over HTTP and/or dumps metrics to a file periodically."""
+
+    def __init__(
+        self, port: int | None = METRICS_PORT, path: str | None = METRICS_FILE, interval: float = METRICS_INTERVAL
+    ):
+        self.port = port
+        self.path = path
+        self.interval = interval
+        self._server: asyncio.Server | None = None
+        self._writer: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self.port:
+            self._server = await asyncio.start_server(self._handle, "127.0.0.1", self.port)
+        if self.path:
+            self._writer = asyncio.create_task(self._write_periodically())
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", render().encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", b"Not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                write_file(self.path)
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", self.path, e)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+            try:
+                write_file(self.path)
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", self.path, e)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
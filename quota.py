@@ -0,0 +1,256 @@
+"""
+Advanced Hunting resource quota tracking.
+
+Besides the per-minute call limit, Advanced Hunting caps the CPU a tenant's
+queries may use in a 15-minute window; going over it rejects further queries
+until the window has passed. HuntingQuota keeps the cost of recent queries in
+a rolling window, estimates the cost of the next one and, depending on
+HUNT_QUOTA_POLICY, refuses or defers queries that would take usage past
+HUNT_QUOTA_THRESHOLD of HUNT_QUOTA_BUDGET.
+
+A query's cost is the CPU time from the response's statistics when Graph
+reports them, else its execution time, else the wall time from sending the
+request to receiving the last row, for the successful attempt only: time spent
+queued by the rate limiter or backing off between retries is not counted.
+Graph v1.0 currently returns only schema and results, so in practice the cost
+is wall time, and the budget should be calibrated in those units.
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+from metrics import HUNTING_QUOTA_HELD, HUNTING_QUOTA_USED
+
+QUOTA_WINDOW = float(os.environ.get("HUNT_QUOTA_WINDOW", "900"))
+# Cost allowed per window in seconds; 0 means unknown, so usage is only reported
+QUOTA_BUDGET = float(os.environ.get("HUNT_QUOTA_BUDGET", "0"))
+QUOTA_THRESHOLD = float(os.environ.get("HUNT_QUOTA_THRESHOLD", "0.8"))
+# "off" (report only), "refuse" or "defer"
+QUOTA_POLICY = os.environ.get("HUNT_QUOTA_POLICY", "off").lower()
+QUOTA_MAX_DEFER = float(os.environ.get("HUNT_QUOTA_MAX_DEFER", "60"))
+
+POLICIES = ("off", "refuse", "defer")
+
+# Queries whose last cost is remembered for estimates
+_MAX_REMEMBERED = 256
+
+# [d.]hh:mm:ss[.fffffff], as used by Kusto for CPU times
+_TIMESPAN = re.compile(r"^(?:(\d+)\.)?(\d+):(\d+):(\d+(?:\.\d+)?)$")
+
+
+class QuotaExceeded(Exception):
+    """A hunting query was refused to stay within the resource quota."""
+
+
+def _seconds(value) -> float | None:
+    """Parse a duration given as seconds or as a Kusto timespan."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _TIMESPAN.match(value.strip())
+        if match:
+            days, hours, minutes, seconds = match.groups()
+            return int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def parse_stats(stats: dict) -> tuple[float | None, float | None]:
+    """
+    Extract (CPU seconds, execution seconds) from a hunting response's statistics.
+
+    Follows the shape of the Defender API's Stats member:
+    {"ExecutionTime": 0.53, "resource_usage": {"cpu": {"total cpu": "00:00:01.25"}}}
+    """
+    if not isinstance(stats, dict):
+        return None, None
+    lowered = {key.lower(): value for key, value in stats.items()}
+    execution = _seconds(lowered.get("executiontime"))
+    usage = lowered.get("resource_usage") or lowered.get("resourceusage") or {}
+    cpu = usage.get("cpu") if isinstance(usage, dict) else None
+    if isinstance(cpu, dict):
+        cpu = cpu.get("total cpu", cpu.get("totalCpu"))
+    return _seconds(cpu), execution
+
+
+@dataclass
+class QueryUsage:
+    finished_at: float
+    query: str
+    cost: float
+    source: str
+    rows: int
+
+
+class HuntingQuota:
+    """Rolling-window accounting of hunting query cost, with an admission policy."""
+
+    def __init__(
+        self,
+        window: float = QUOTA_WINDOW,
+        budget: float = QUOTA_BUDGET,
+        threshold: float = QUOTA_THRESHOLD,
+        policy: str = QUOTA_POLICY,
+        max_defer: float = QUOTA_MAX_DEFER,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unsupported quota policy: {policy}. Use one of: {', '.join(POLICIES)}")
+        self.window = window
+        self.budget = budget
+        self.threshold = threshold
+        self.policy = policy
+        self.max_defer = max_defer
+        self._usage: deque[QueryUsage] = deque()
+        self._last_cost: OrderedDict[str, float] = OrderedDict()
+        self._reserved = 0.0
+        self._locked_until = 0.0
+        self.refused = 0
+        self.deferred = 0
+
+    @property
+    def limit(self) -> float | None:
+        """Cost at which new queries are held back, if a budget is configured."""
+        return self.budget * self.threshold if self.budget > 0 else None
+
+    def _prune(self, now: float) -> None:
+        while self._usage and self._usage[0].finished_at <= now - self.window:
+            self._usage.popleft()
+
+    def used(self) -> float:
+        self._prune(time.monotonic())
+        return sum(usage.cost for usage in self._usage)
+
+    def estimate(self, key: str) -> float:
+        """Expected cost of a query: its own last cost if seen before, else the window's average."""
+        if key in self._last_cost:
+            return self._last_cost[key]
+        self._prune(time.monotonic())
+        if not self._usage:
+            return 0.0
+        return sum(usage.cost for usage in self._usage) / len(self._usage)
+
+    def _wait_time(self, cost: float, now: float) -> float | None:
+        """Seconds until cost fits under the limit, or None if it never will within the window."""
+        if now < self._locked_until:
+            return self._locked_until - now
+        limit = self.limit
+        if limit is None:
+            return 0.0
+        excess = sum(usage.cost for usage in self._usage) + self._reserved + cost - limit
+        if excess <= 0:
+            return 0.0
+        # Wait for the oldest queries to leave the window until enough cost is freed
+        for usage in self._usage:
+            excess -= usage.cost
+            if excess <= 0:
+                return usage.finished_at + self.window - now
+        return None
+
+    async def admit(self, key: str) -> float:
+        """
+        Wait for or refuse a query according to the policy.
+
+        Returns the cost reserved for the query, to be passed to record or release.
+
+        Raises QuotaExceeded if the query is refused.
+        """
+        cost = self.estimate(key)
+        deadline = time.monotonic() + self.max_defer
+        while self.policy != "off":
+            now = time.monotonic()
+            self._prune(now)
+            wait = self._wait_time(cost, now)
+            if wait == 0:
+                break
+            if self.policy == "refuse" or wait is None or now + wait > deadline:
+                self.refused += 1
+                HUNTING_QUOTA_HELD.labels("refused").inc()
+                raise QuotaExceeded(self._refusal(cost, wait))
+            self.deferred += 1
+            HUNTING_QUOTA_HELD.labels("deferred").inc()
+            await asyncio.sleep(wait)
+        self._reserved += cost
+        return cost
+
+    def _refusal(self, cost: float, wait: float | None) -> str:
+        now = time.monotonic()
+        if now < self._locked_until:
+            return (
+                f"Advanced Hunting quota exceeded; Graph is rejecting queries for another "
+                f"{self._locked_until - now:.0f}s."
+            )
+        used = sum(usage.cost for usage in self._usage) + self._reserved
+        message = (
+            f"Hunting query refused to protect the Advanced Hunting quota: {used:.1f}s used in the "
+            f"last {self.window / 60:.0f} minutes plus an estimated {cost:.1f}s would exceed "
+            f"{self.threshold:.0%} of the {self.budget:.0f}s budget."
+        )
+        if wait is not None:
+            message += f" Try again in {wait:.0f}s."
+        return message
+
+    def release(self, reserved: float) -> None:
+        """Return a reservation for a query that did not run to completion."""
+        self._reserved = max(0.0, self._reserved - reserved)
+
+    def record(
+        self,
+        key: str,
+        reserved: float,
+        query: str,
+        wall_seconds: float,
+        rows: int,
+        stats: dict | None = None,
+    ) -> QueryUsage:
+        """Account for a finished query, using its statistics when the response had them."""
+        self.release(reserved)
+        cpu, execution = parse_stats(stats) if stats else (None, None)
+        if cpu is not None:
+            cost, source = cpu, "cpu"
+        elif execution is not None:
+            cost, source = execution, "execution"
+        else:
+            cost, source = wall_seconds, "wall"
+        usage = QueryUsage(finished_at=time.monotonic(), query=query, cost=cost, source=source, rows=rows)
+        self._usage.append(usage)
+        self._last_cost[key] = cost
+        self._last_cost.move_to_end(key)
+        while len(self._last_cost) > _MAX_REMEMBERED:
+            self._last_cost.popitem(last=False)
+        HUNTING_QUOTA_USED.set(self.used())
+        return usage
+
+    def throttled(self, retry_after: float | None) -> None:
+        """Note that Graph rejected a query for exceeding its quota."""
+        pause = retry_after if retry_after else self.window
+        self._locked_until = max(self._locked_until, time.monotonic() + pause)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        self._prune(now)
+        used = sum(usage.cost for usage in self._usage)
+        HUNTING_QUOTA_USED.set(used)
+        sources = {}
+        for usage in self._usage:
+            sources[usage.source] = sources.get(usage.source, 0) + 1
+        return {
+            "window": self.window,
+            "queries": len(self._usage),
+            "sources": sources,
+            "used": used,
+            "reserved": self._reserved,
+            "budget": self.budget or None,
+            "threshold": self.threshold,
+            "policy": self.policy,
+            "locked_for": max(0.0, self._locked_until - now),
+            "refused": self.refused,
+            "deferred": self.deferred,
+            "heaviest": sorted(self._usage, key=lambda usage: usage.cost, reverse=True)[:3],
+        }
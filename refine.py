@@ -0,0 +1,645 @@
+"""
+Local post-processing of stored hunting results with a small KQL subset.
+
+Refining a result ("only powershell.exe, grouped by DeviceName") would
+otherwise mean another runHuntingQuery round-trip and more quota. refine
+runs a pipeline over a ColumnarResult instead, one operator at a time:
+
+    where FileName =~ "powershell.exe" | summarize count() by DeviceName | sort by count_
+
+Supported operators:
+- where: ==, !=, =~, !~, <, <=, >, >=, contains, has, startswith, endswith
+  (each also negated with !), in, !in, in~, isnull(), isnotnull(), isempty(),
+  isnotempty(), combined with and/or/not and parentheses. Literals are
+  strings, numbers, true/false, null, datetime(...) and ago(...).
+- project, project-away
+- sort by / order by (desc by default, as in KQL), top N by, take / limit
+- summarize count(), dcount(), sum(), avg(), min(), max() [by ...]
+- count, distinct
+
+Filters are evaluated a column at a time: the column is converted once to
+the literal's type (DateTime cells to UTC datetimes, numeric cells to
+numbers) and compared in one pass, producing a row mask; on
+dictionary-encoded columns this happens once per distinct value rather than
+once per row. DateTime columns also sort, min and max by instant rather
+than by their text.
+"""
+
+import ast
+import json
+import operator
+import re
+from array import array
+from collections.abc import Callable, Sequence
+from datetime import datetime, timedelta, timezone
+from itertools import repeat
+
+from columnar import Column, ColumnarResult, DictColumn
+from kql import Token, tokenize
+
+
+class RefineError(ValueError):
+    """The expression is malformed or uses something refine doesn't support."""
+
+
+Mask = list[bool]
+
+_TIMESPAN_UNITS = {"d": "days", "h": "hours", "m": "minutes", "s": "seconds", "ms": "milliseconds"}
+
+_AGGREGATES = {"count", "dcount", "sum", "avg", "min", "max"}
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<>": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# Schema types whose cells compare as numbers
+_NUMBER_TYPES = {"Int32", "Int64", "Long", "Double", "Real", "Decimal"}
+
+_ISO_DATETIME = re.compile(
+    r"(?P<date>\d{4}-\d{2}-\d{2})"
+    r"(?:[T ](?P<time>\d{2}:\d{2}(?::\d{2})?)(?:\.(?P<fraction>\d+))?)?"
+    r"\s*(?P<zone>Z|[+-]\d{2}:?\d{2})?",
+    re.IGNORECASE,
+)
+
+
+def _values(column: Column) -> Sequence:
+    """What a predicate is evaluated over: each distinct value once for dictionary columns."""
+    return column.values if isinstance(column, DictColumn) else column
+
+
+def _expand(column: Column, matches: Mask) -> Mask:
+    """Turn the matches for _values(column) into a row mask."""
+    if isinstance(column, DictColumn):
+        return list(map(matches.__getitem__, column.codes))
+    return matches
+
+
+def _mask(column: Column, predicate: Callable[[object], bool]) -> Mask:
+    """Evaluate a predicate over a whole column."""
+    return _expand(column, [predicate(value) for value in _values(column)])
+
+
+def _as_text(value) -> str:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _as_string(value) -> str | None:
+    if value is None or isinstance(value, str):
+        return value
+    return _as_text(value)
+
+
+def _as_number(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_iso(text: str) -> datetime | None:
+    try:
+        # Python 3.11+ reads Advanced Hunting's format as it is
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    match = _ISO_DATETIME.fullmatch(text.strip())
+    if match is None:
+        return None
+    normalized = f"{match['date']}T{match['time'] or '00:00'}"
+    if match["fraction"]:
+        normalized += "." + match["fraction"][:6].ljust(6, "0")
+    zone = match["zone"]
+    if zone and zone.upper() != "Z":
+        normalized += zone if ":" in zone else f"{zone[:3]}:{zone[3:]}"
+    try:
+        return datetime.fromisoformat(normalized)
+    except ValueError:
+        return None
+
+
+def _as_datetime(value) -> datetime | None:
+    """
+    Parse an ISO 8601 cell as a UTC datetime, or None if it isn't one.
+
+    Advanced Hunting writes between 0 and 7 fractional digits and a Z suffix;
+    values without an offset are taken as UTC.
+    """
+    if isinstance(value, str):
+        value = _parse_iso(value)
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _column_kind(result: ColumnarResult, name: str) -> str | None:
+    """Kind of values a column holds according to the schema: datetime, number, string or None if unknown."""
+    schema_type = next((column.get("Type") for column in result.schema if column["Name"] == name), None)
+    if schema_type == "DateTime":
+        return "datetime"
+    if schema_type in _NUMBER_TYPES or isinstance(result.columns[name], array):
+        return "number"
+    if schema_type in ("String", "Guid"):
+        return "string"
+    return None
+
+
+def _operand(name: str, kind: str | None, literal):
+    """
+    Bring a literal to the type of the column it is compared with.
+
+    Raises RefineError rather than falling back to comparing text, which
+    would order "10" before "9".
+    """
+    if literal is None or isinstance(literal, bool):
+        return literal
+    if kind == "datetime" and not isinstance(literal, datetime):
+        moment = _as_datetime(literal) if isinstance(literal, str) else None
+        if moment is None:
+            raise RefineError(f"Column '{name}' holds datetimes; compare it with datetime(...), not {literal!r}")
+        return moment
+    if kind == "number" and not isinstance(literal, (int, float)):
+        number = _as_number(literal) if isinstance(literal, str) else None
+        if number is None:
+            raise RefineError(f"Column '{name}' holds numbers; compare it with a number, not {literal!r}")
+        return number
+    if kind == "string" and isinstance(literal, (int, float)):
+        return _as_text(literal)
+    return literal
+
+
+def _converter(literal) -> Callable[[object], object] | None:
+    """Function bringing a cell to the literal's type, or None for cells that compare as they are."""
+    if isinstance(literal, datetime):
+        return _as_datetime
+    if isinstance(literal, (int, float)) and not isinstance(literal, bool):
+        return _as_number
+    if isinstance(literal, str):
+        return _as_string
+    return None
+
+
+def _compare(column: Column, op: str, literal) -> Mask:
+    """
+    Row mask of `cell op literal` for a literal already passed through _operand.
+
+    The column is converted to the literal's type once (once per distinct
+    value for dictionary columns) and compared in one pass. Null cells and
+    cells that can't be converted never match.
+    """
+    if literal is None:
+        return _mask(column, (lambda v: v is None) if op == "==" else (lambda v: v is not None))
+    test = _OPERATORS[op]
+    convert = _converter(literal)
+    values = _values(column)
+    if isinstance(values, array) and convert is _as_number:
+        # Typed arrays hold numbers without nulls
+        return list(map(test, values, repeat(literal)))
+    if convert is not None:
+        values = list(map(convert, values))
+    try:
+        matches = [value is not None and test(value, literal) for value in values]
+    except TypeError:
+        # Cells of mixed types against a true/false literal
+        matches = [value is not None and type(value) is type(literal) and test(value, literal) for value in values]
+    return _expand(column, matches)
+
+
+def _string_predicate(op: str, literal) -> Callable[[object], bool]:
+    needle = _as_text(literal).lower()
+    if op == "contains":
+        return lambda v: v is not None and needle in _as_text(v).lower()
+    if op == "startswith":
+        return lambda v: v is not None and _as_text(v).lower().startswith(needle)
+    if op == "endswith":
+        return lambda v: v is not None and _as_text(v).lower().endswith(needle)
+    if op == "=~":
+        return lambda v: v is not None and _as_text(v).lower() == needle
+    # has: whole-term match, as KQL's term index does
+    pattern = re.compile(rf"(?<![0-9A-Za-z]){re.escape(needle)}(?![0-9A-Za-z])")
+    return lambda v: v is not None and bool(pattern.search(_as_text(v).lower()))
+
+
+class _Parser:
+    """Recursive-descent parser over the tokens of one pipeline stage."""
+
+    def __init__(self, tokens: list[Token], source: str):
+        self.tokens = tokens
+        self.source = source
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Token | None:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def at(self, *texts: str) -> bool:
+        token = self.peek()
+        return token is not None and token.text.lower() in texts
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise RefineError("Unexpected end of expression")
+        self.pos += 1
+        return token
+
+    def expect(self, text: str) -> Token:
+        token = self.next()
+        if token.text.lower() != text:
+            raise RefineError(f"Expected '{text}' but found '{token.text}'")
+        return token
+
+    def done(self) -> bool:
+        return self.pos >= len(self.tokens)
+
+    def ensure_done(self) -> None:
+        if not self.done():
+            raise RefineError(f"Unexpected '{self.peek().text}'")
+
+    def name(self) -> str:
+        token = self.next()
+        if token.kind != "ident":
+            raise RefineError(f"Expected a column name but found '{token.text}'")
+        return token.text
+
+    def names(self) -> list[str]:
+        names = [self.name()]
+        while self.at(","):
+            self.next()
+            names.append(self.name())
+        return names
+
+    def integer(self) -> int:
+        token = self.next()
+        if token.kind != "number" or not token.text.isdigit():
+            raise RefineError(f"Expected a row count but found '{token.text}'")
+        return int(token.text)
+
+    def literal(self):
+        token = self.next()
+        if token.kind == "string":
+            text = token.text.lstrip("hH")
+            if text.startswith("@"):
+                return text[2:-1]
+            if text.startswith("```"):
+                return text[3:-3]
+            try:
+                return ast.literal_eval(text)
+            except (SyntaxError, ValueError):
+                raise RefineError(f"Unsupported string literal {token.text}") from None
+        if token.kind == "number":
+            try:
+                return int(token.text)
+            except ValueError:
+                try:
+                    return float(token.text)
+                except ValueError:
+                    raise RefineError(f"Unsupported literal '{token.text}'") from None
+        if token.text.lower() in ("true", "false"):
+            return token.text.lower() == "true"
+        if token.text.lower() == "null":
+            return None
+        if token.text == "-" and self.peek() is not None and self.peek().kind == "number":
+            return -self.literal()
+        if token.text.lower() in ("datetime", "ago"):
+            return self._time_literal(token.text.lower())
+        raise RefineError(f"Expected a value but found '{token.text}'")
+
+    def _time_literal(self, function: str) -> datetime:
+        open_paren = self.expect("(")
+        depth = 1
+        while depth:
+            token = self.next()
+            depth += {"(": 1, ")": -1}.get(token.text, 0)
+        argument = self.source[open_paren.end : token.start].strip()
+
+        if function == "datetime":
+            moment = _as_datetime(argument)
+            if moment is None:
+                raise RefineError(f"Unsupported datetime literal '{argument}'")
+            return moment
+
+        match = re.fullmatch(r"(\d+(?:\.\d+)?)(ms|d|h|m|s)", argument)
+        if not match:
+            raise RefineError(f"Unsupported timespan '{argument}'; use e.g. 7d, 12h, 30m")
+        return datetime.now(timezone.utc) - timedelta(**{_TIMESPAN_UNITS[match[2]]: float(match[1])})
+
+
+class _Condition:
+    """Evaluates a where clause to a row mask."""
+
+    _NULL_FUNCTIONS = {
+        "isnull": lambda v: v is None,
+        "isnotnull": lambda v: v is not None,
+        "isempty": lambda v: v is None or v == "",
+        "isnotempty": lambda v: v is not None and v != "",
+    }
+
+    def __init__(self, parser: _Parser, result: ColumnarResult):
+        self.p = parser
+        self.result = result
+        self.length = len(result)
+
+    def column(self, name: str) -> Column:
+        if name not in self.result.columns:
+            raise RefineError(f"Unknown column '{name}'. Available: {', '.join(self.result.column_names)}")
+        return self.result.columns[name]
+
+    def expression(self) -> Mask:
+        mask = self.conjunction()
+        while self.p.at("or"):
+            self.p.next()
+            mask = list(map(operator.or_, mask, self.conjunction()))
+        return mask
+
+    def conjunction(self) -> Mask:
+        mask = self.term()
+        while self.p.at("and"):
+            self.p.next()
+            mask = list(map(operator.and_, mask, self.term()))
+        return mask
+
+    def term(self) -> Mask:
+        if self.p.at("not"):
+            self.p.next()
+            self.p.expect("(")
+            mask = self.expression()
+            self.p.expect(")")
+            return [not m for m in mask]
+        if self.p.at("("):
+            self.p.next()
+            mask = self.expression()
+            self.p.expect(")")
+            return mask
+        if self.p.at(*self._NULL_FUNCTIONS) and self.p.peek(1) is not None and self.p.peek(1).text == "(":
+            function = self._NULL_FUNCTIONS[self.p.next().text.lower()]
+            self.p.expect("(")
+            column = self.column(self.p.name())
+            self.p.expect(")")
+            return _mask(column, function)
+        return self.comparison()
+
+    def comparison(self) -> Mask:
+        name = self.p.name()
+        column = self.column(name)
+        kind = _column_kind(self.result, name)
+        negate = False
+        if self.p.at("!") and self.p.peek(1) is not None and self.p.peek(1).kind == "ident":
+            self.p.next()
+            negate = True
+        op = self.p.next().text.lower()
+
+        if op == "in":
+            case_insensitive = self.p.at("~")
+            if case_insensitive:
+                self.p.next()
+            values = self._list()
+            if case_insensitive:
+                wanted = {_as_text(v).lower() for v in values}
+                mask = _mask(column, lambda v: v is not None and _as_text(v).lower() in wanted)
+            else:
+                masks = [_compare(column, "==", _operand(name, kind, v)) for v in values]
+                mask = [any(row) for row in zip(*masks)]
+        elif op in _OPERATORS and not negate:
+            mask = _compare(column, op, _operand(name, kind, self.p.literal()))
+        elif op in ("=~", "!~") and not negate:
+            predicate = _string_predicate("=~", self.p.literal())
+            if op == "!~":
+                equal = predicate
+                predicate = lambda v: v is not None and not equal(v)  # noqa: E731
+            mask = _mask(column, predicate)
+        elif op in ("contains", "has", "startswith", "endswith"):
+            mask = _mask(column, _string_predicate(op, self.p.literal()))
+        else:
+            raise RefineError(f"Unsupported operator '{'!' if negate else ''}{op}'")
+
+        return [not m for m in mask] if negate else mask
+
+    def _list(self) -> list:
+        self.p.expect("(")
+        values = [self.p.literal()]
+        while self.p.at(","):
+            self.p.next()
+            values.append(self.p.literal())
+        self.p.expect(")")
+        return values
+
+
+def _where(result: ColumnarResult, p: _Parser) -> ColumnarResult:
+    mask = _Condition(p, result).expression()
+    return result.take([i for i, keep in enumerate(mask) if keep])
+
+
+def _require(result: ColumnarResult, names: Sequence[str]) -> None:
+    missing = [name for name in names if name not in result.columns]
+    if missing:
+        raise RefineError(f"Unknown column '{missing[0]}'. Available: {', '.join(result.column_names)}")
+
+
+def _sort_keys(p: _Parser) -> list[tuple[str, bool]]:
+    keys = []
+    while True:
+        name = p.name()
+        descending = True
+        if p.at("asc", "desc"):
+            descending = p.next().text.lower() == "desc"
+        keys.append((name, descending))
+        if not p.at(","):
+            return keys
+        p.next()
+
+
+def _sort(result: ColumnarResult, keys: list[tuple[str, bool]]) -> ColumnarResult:
+    _require(result, [name for name, _ in keys])
+    # Stable sorts applied from the last key to the first give a multi-key ordering
+    for name, descending in reversed(keys):
+        key = _as_datetime if _column_kind(result, name) == "datetime" else None
+        try:
+            result = result.sort(name, descending=descending, key=key)
+        except TypeError:
+            raise RefineError(f"Column '{name}' mixes values that can't be ordered") from None
+    return result
+
+
+def _aggregate(function: str, values: list, kind: str | None = None):
+    present = [v for v in values if v is not None]
+    if function == "count":
+        return len(values)
+    if function == "dcount":
+        return len({_as_text(v) for v in present})
+    if function in ("sum", "avg"):
+        numbers = [n for n in map(_as_number, present) if n is not None]
+        if not numbers:
+            return None
+        return sum(numbers) if function == "sum" else sum(numbers) / len(numbers)
+    if kind == "datetime":
+        # Compare instants, not text: "...00Z" sorts after "...00.5Z"
+        present = [v for v in present if _as_datetime(v) is not None]
+        if not present:
+            return None
+        return min(present, key=_as_datetime) if function == "min" else max(present, key=_as_datetime)
+    if not present:
+        return None
+    try:
+        return min(present) if function == "min" else max(present)
+    except TypeError:
+        key = lambda v: _as_text(v)  # noqa: E731
+        return min(present, key=key) if function == "min" else max(present, key=key)
+
+
+def _summarize(result: ColumnarResult, p: _Parser) -> ColumnarResult:
+    aggregates: list[tuple[str, str, str | None]] = []  # (output name, function, column)
+    while not p.at("by") and not p.done():
+        output = None
+        if p.peek(1) is not None and p.peek(1).text == "=":
+            output = p.name()
+            p.next()
+        function = p.next().text.lower()
+        if function not in _AGGREGATES:
+            raise RefineError(f"Unsupported aggregation '{function}'. Use one of: {', '.join(sorted(_AGGREGATES))}")
+        p.expect("(")
+        column = None if p.at(")") else p.name()
+        p.expect(")")
+        if column is None and function != "count":
+            raise RefineError(f"{function}() needs a column")
+        aggregates.append((output or (f"{function}_{column}" if column else "count_"), function, column))
+        if not p.at(","):
+            break
+        p.next()
+
+    by: list[str] = []
+    if p.at("by"):
+        p.next()
+        by = p.names()
+    if not aggregates and not by:
+        raise RefineError("summarize needs an aggregation or a by clause")
+    _require(result, by + [column for _, _, column in aggregates if column])
+
+    groups: dict[tuple, list[int]] = {}
+    keys = zip(*(result.columns[name] for name in by)) if by else ((),) * len(result)
+    for index, key in enumerate(keys):
+        hashable = tuple(_as_text(v) if isinstance(v, (dict, list)) else v for v in key)
+        groups.setdefault(hashable, []).append(index)
+    if not by and not groups:
+        groups[()] = []
+
+    types = {column["Name"]: column.get("Type") for column in result.schema}
+    schema = [{"Name": name, "Type": types.get(name)} for name in by]
+    for name, function, column in aggregates:
+        if function in ("count", "dcount"):
+            schema.append({"Name": name, "Type": "Int64"})
+        elif function in ("min", "max"):
+            schema.append({"Name": name, "Type": types.get(column)})
+        else:
+            schema.append({"Name": name, "Type": "Double"})
+
+    rows = []
+    for key, indices in groups.items():
+        first = indices[0] if indices else None
+        row = {name: result.columns[name][first] for name in by}
+        for name, function, column in aggregates:
+            values = indices if column is None else [result.columns[column][i] for i in indices]
+            row[name] = _aggregate(function, values, _column_kind(result, column) if column else None)
+        rows.append(row)
+    return ColumnarResult.from_rows(rows, schema)
+
+
+def _distinct(result: ColumnarResult, names: list[str]) -> ColumnarResult:
+    _require(result, names)
+    seen = set()
+    keep = []
+    for index, key in enumerate(zip(*(result.columns[name] for name in names))):
+        hashable = tuple(_as_text(v) if isinstance(v, (dict, list)) else v for v in key)
+        if hashable not in seen:
+            seen.add(hashable)
+            keep.append(index)
+    return result.select(names).take(keep)
+
+
+def _apply(result: ColumnarResult, stage: list[Token], source: str) -> ColumnarResult:
+    p = _Parser(stage, source)
+    operator = p.next().text.lower()
+
+    if operator in ("where", "filter"):
+        result = _where(result, p)
+    elif operator == "project":
+        names = p.names()
+        _require(result, names)
+        result = result.select(names)
+    elif operator == "project-away":
+        names = p.names()
+        _require(result, names)
+        result = result.select([name for name in result.column_names if name not in names])
+    elif operator in ("sort", "order"):
+        p.expect("by")
+        result = _sort(result, _sort_keys(p))
+    elif operator == "top":
+        count = p.integer()
+        p.expect("by")
+        result = _sort(result, _sort_keys(p))
+        result = result.take(range(min(count, len(result))))
+    elif operator in ("take", "limit"):
+        result = result.take(range(min(p.integer(), len(result))))
+    elif operator == "summarize":
+        result = _summarize(result, p)
+    elif operator == "count":
+        result = ColumnarResult.from_rows([{"Count": len(result)}], [{"Name": "Count", "Type": "Int64"}])
+    elif operator == "distinct":
+        result = _distinct(result, p.names())
+    else:
+        raise RefineError(
+            f"Unsupported operator '{operator}'. Use where, project, project-away, sort, top, take, "
+            "summarize, count or distinct."
+        )
+
+    p.ensure_done()
+    return result
+
+
+def _stages(tokens: list[Token]) -> list[list[Token]]:
+    """Split tokens at top-level pipes."""
+    stages: list[list[Token]] = [[]]
+    depth = 0
+    for token in tokens:
+        if token.text in ("(", "[", "{"):
+            depth += 1
+        elif token.text in (")", "]", "}"):
+            depth -= 1
+        if token.text == "|" and depth == 0:
+            stages.append([])
+        else:
+            stages[-1].append(token)
+    return stages
+
+
+def refine_result(result: ColumnarResult, expression: str) -> ColumnarResult:
+    """
+    Apply a pipeline of KQL-style operators to a result.
+
+    A leading "|" is optional. Raises RefineError if the expression can't be
+    parsed or refers to unknown columns.
+    """
+    stages = _stages(tokenize(expression))
+    if stages and not stages[0]:
+        stages = stages[1:]
+    if not stages or any(not stage for stage in stages):
+        raise RefineError("Empty pipeline stage")
+    for stage in stages:
+        result = _apply(result, stage, expression)
+    return result
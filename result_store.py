@@ -0,0 +1,158 @@
+"""
+Server-side storage for complete hunting result sets.
+
+hunt only shows the first rows of a result; the full set is kept here under a
+short handle so later tool calls can page through it without re-running the
+query. Results stay in memory up to RESULT_STORE_MAX_MEMORY bytes, after which
+the least recently used ones are spilled to disk. Once the disk budget or the
+handle limit is exceeded, the least recently used handles are dropped.
+"""
+
+import os
+import pickle
+import secrets
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from columnar import ColumnarResult
+
+RESULT_STORE_MAX_MEMORY = int(os.environ.get("RESULT_STORE_MAX_MEMORY", str(256 * 1024 * 1024)))
+RESULT_STORE_MAX_DISK = int(os.environ.get("RESULT_STORE_MAX_DISK", str(2 * 1024 * 1024 * 1024)))
+RESULT_STORE_MAX_HANDLES = int(os.environ.get("RESULT_STORE_MAX_HANDLES", "200"))
+RESULT_STORE_DIR = os.environ.get("RESULT_STORE_DIR")
+
+
+@dataclass
+class StoredResult:
+    handle: str
+    query: str
+    row_count: int
+    size: int
+    created_at: float = field(default_factory=time.time)
+    data: ColumnarResult | None = None
+    path: Path | None = None
+    # The server capped the query, so there may be more rows than were stored
+    limited: bool = False
+
+
+class ResultStore:
+    """LRU store of hunting results with a memory budget and disk spill."""
+
+    def __init__(
+        self,
+        max_memory: int = RESULT_STORE_MAX_MEMORY,
+        max_disk: int = RESULT_STORE_MAX_DISK,
+        max_handles: int = RESULT_STORE_MAX_HANDLES,
+        directory: str | None = RESULT_STORE_DIR,
+    ):
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.max_handles = max_handles
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self._directory = Path(directory) if directory else None
+        self._results: OrderedDict[str, StoredResult] = OrderedDict()
+
+    def __contains__(self, handle: str) -> bool:
+        return handle in self._results
+
+    def _spill_dir(self) -> Path:
+        if self._directory is None:
+            self._directory = Path(tempfile.mkdtemp(prefix="hunt-results-"))
+        self._directory.mkdir(parents=True, exist_ok=True)
+        return self._directory
+
+    def put(self, result: ColumnarResult, query: str, limited: bool = False) -> str:
+        """Store a result and return its handle; limited marks one cut short by a row cap."""
+        handle = f"r-{secrets.token_hex(4)}"
+        entry = StoredResult(
+            handle=handle,
+            query=query,
+            row_count=len(result),
+            size=result.nbytes,
+            data=result,
+            limited=limited,
+        )
+        self._results[handle] = entry
+        self.memory_bytes += entry.size
+        self._enforce_limits()
+        return handle
+
+    def info(self, handle: str) -> StoredResult | None:
+        return self._results.get(handle)
+
+    def get(self, handle: str) -> ColumnarResult | None:
+        """Return a stored result, reloading it into memory if it was spilled."""
+        entry = self._results.get(handle)
+        if entry is None:
+            return None
+        self._results.move_to_end(handle)
+
+        if entry.data is None:
+            with open(entry.path, "rb") as f:
+                entry.data = pickle.load(f)
+            entry.path.unlink(missing_ok=True)
+            entry.path = None
+            self.disk_bytes -= entry.size
+            self.memory_bytes += entry.size
+            self._enforce_limits(keep=handle)
+
+        return entry.data
+
+    def discard(self, handle: str) -> None:
+        entry = self._results.pop(handle, None)
+        if entry is None:
+            return
+        if entry.data is not None:
+            self.memory_bytes -= entry.size
+        if entry.path is not None:
+            entry.path.unlink(missing_ok=True)
+            self.disk_bytes -= entry.size
+
+    def _spill(self, entry: StoredResult) -> None:
+        path = self._spill_dir() / f"{entry.handle}.pickle"
+        with open(path, "wb") as f:
+            pickle.dump(entry.data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        entry.data = None
+        entry.path = path
+        self.memory_bytes -= entry.size
+        self.disk_bytes += entry.size
+
+    def _enforce_limits(self, keep: str | None = None) -> None:
+        # Drop least recently used handles beyond the handle limit
+        while len(self._results) > self.max_handles:
+            self.discard(next(iter(self._results)))
+
+        # Spill least recently used in-memory results until under the memory budget
+        for entry in list(self._results.values()):
+            if self.memory_bytes <= self.max_memory:
+                break
+            if entry.data is not None and entry.handle != keep:
+                self._spill(entry)
+
+        # Drop least recently used spilled results until under the disk budget
+        for entry in list(self._results.values()):
+            if self.disk_bytes <= self.max_disk:
+                break
+            if entry.path is not None:
+                self.discard(entry.handle)
+
+    def close(self) -> None:
+        """Forget all results and remove spilled files."""
+        for handle in list(self._results):
+            self.discard(handle)
+        if self._directory is not None and RESULT_STORE_DIR is None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def stats(self) -> dict:
+        return {
+            "handles": len(self._results),
+            "in_memory": sum(1 for e in self._results.values() if e.data is not None),
+            "memory_bytes": self.memory_bytes,
+            "disk_bytes": self.disk_bytes,
+        }
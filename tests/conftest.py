@@ -0,0 +1,129 @@
+"""
+Shared fixtures: the server's tools run against benchmarks/mock_graph.py.
+
+The server reads its configuration when it is imported, so the environment
+is set here, before any test module imports it.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Rows returned by a hunt without take N; enough to still be streaming when cancelled
+HUNT_ROWS = 100_000
+USERS = 200
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+PORT = _free_port()
+
+# Never send real credentials to the stand-in
+os.environ.update(
+    {
+        "GRAPH_BASE_URL": f"http://127.0.0.1:{PORT}/v1.0",
+        "GRAPH_LOGIN_URL": f"http://127.0.0.1:{PORT}",
+        "AZURE_TENANT_ID": "00000000-0000-0000-0000-000000000000",
+        "AZURE_CLIENT_ID": "tests",
+        "AZURE_CLIENT_SECRET": "tests",
+        "GRAPH_USER_MIRROR": "0",
+        "GRAPH_HUNTING_RATE": "100000",
+        "GRAPH_HUNTING_BURST": "100000",
+        "HUNT_PREFLIGHT": "warn",
+        "HUNT_QUOTA_POLICY": "off",
+    }
+)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def mock_graph():
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            str(ROOT / "benchmarks" / "mock_graph.py"),
+            "--port", str(PORT),
+            "--latency-ms", "5",
+            "--jitter-ms", "0",
+            "--users", str(USERS),
+            "--hunt-rows", str(HUNT_ROWS),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", PORT), timeout=0.5):
+                break
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.terminate()
+                raise RuntimeError(f"Mock Graph server did not start on port {PORT}")
+            time.sleep(0.1)
+    yield f"http://127.0.0.1:{PORT}"
+    process.terminate()
+    process.wait()
+
+
+@pytest.fixture
+def run():
+    """
+    Run a coroutine to completion on a new event loop.
+
+    The shared HTTP client belongs to the loop it was created on, so it is
+    closed before the loop ends.
+    """
+    from auth import close_http_client
+
+    def runner(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await close_http_client()
+
+        return asyncio.run(main())
+
+    return runner
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    """The server module with fresh caches, jobs, quota and rate limits, exporting to tmp_path."""
+    import auth
+    import defender_hunting
+    import exporters
+    from caching import LRUCache, SingleFlight
+    from jobs import JobManager
+    from quota import HuntingQuota
+    from result_store import ResultStore
+    from throttling import RateLimiter
+
+    monkeypatch.setattr(auth, "rate_limiter", RateLimiter({}))
+    monkeypatch.setattr(defender_hunting, "hunt_cache", LRUCache(max_entries=100, ttl=300))
+    monkeypatch.setattr(defender_hunting, "hunt_flights", SingleFlight())
+    monkeypatch.setattr(defender_hunting, "hunt_jobs", JobManager())
+    monkeypatch.setattr(defender_hunting, "hunting_quota", HuntingQuota())
+    monkeypatch.setattr(defender_hunting, "result_store", ResultStore())
+    monkeypatch.setattr(exporters, "EXPORT_DIR", tmp_path / "exports")
+    return defender_hunting
+
+
+async def until(predicate, timeout: float = 10.0) -> None:
+    """Wait for predicate() to become true, polling the event loop."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        await asyncio.sleep(0.01)
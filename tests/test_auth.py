@@ -0,0 +1,43 @@
+"""Token handling in Graph requests."""
+
+import itertools
+
+import httpx
+import pytest
+
+import auth
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    """Route the shared client to a handler that rejects revoked tokens with 401."""
+    tokens = itertools.count()
+    state = {"revoked": {"token-0"}, "seen": []}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/oauth2/v2.0/token"):
+            return httpx.Response(200, json={"access_token": f"token-{next(tokens)}", "expires_in": 3599})
+        token = request.headers["Authorization"].removeprefix("Bearer ")
+        state["seen"].append(token)
+        if token in state["revoked"]:
+            return httpx.Response(401, json={"error": {"code": "InvalidAuthenticationToken"}})
+        return httpx.Response(200, json={"value": []})
+
+    monkeypatch.setattr(auth, "_token_cache", {})
+    monkeypatch.setattr(auth, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return state
+
+
+def test_401_refreshes_the_token_once(graph, run):
+    assert run(auth.graph_request("GET", "/users")) == {"value": []}
+    assert graph["seen"] == ["token-0", "token-1"]
+
+
+def test_second_401_is_raised(graph, run):
+    graph["revoked"].add("token-1")
+
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        run(auth.graph_request("GET", "/users"))
+
+    assert error.value.response.status_code == 401
+    assert graph["seen"] == ["token-0", "token-1"]
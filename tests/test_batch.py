@@ -0,0 +1,65 @@
+"""JSON $batch requests and batch_get_users."""
+
+import json
+
+import httpx
+import pytest
+
+import auth
+
+
+@pytest.fixture
+def batch_responses(monkeypatch):
+    """
+    Answer $batch calls with a list of handlers, one per call.
+
+    Each handler gets the batch items and returns the response items.
+    """
+    handlers = []
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/oauth2/v2.0/token"):
+            return httpx.Response(200, json={"access_token": "token", "expires_in": 3599})
+        items = json.loads(request.content)["requests"]
+        calls.append([item["id"] for item in items])
+        return httpx.Response(200, json={"responses": handlers[len(calls) - 1](items)})
+
+    monkeypatch.setattr(auth, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return handlers, calls
+
+
+def _user(item: dict) -> dict:
+    upn = item["url"].split("/")[2].split("?")[0]
+    return {"id": item["id"], "status": 200, "body": {"userPrincipalName": upn, "@odata.etag": 'W/"1"'}}
+
+
+def test_item_left_out_of_the_response_becomes_an_error(server, run, batch_responses):
+    handlers, _ = batch_responses
+    handlers.append(lambda items: [_user(item) for item in items if item["id"] != "1"])
+
+    output = run(server.batch_get_users(["a@contoso.example", "b@contoso.example", "c@contoso.example"]))
+
+    assert output.startswith("Retrieved 2 of 3 users")
+    assert "API Error 502 for b@contoso.example" in output
+    assert "MissingBatchResponse" in output
+    assert "userPrincipalName: c@contoso.example" in output
+
+
+def test_throttled_items_are_resent(server, run, batch_responses):
+    handlers, calls = batch_responses
+    handlers.append(
+        lambda items: [
+            {"id": item["id"], "status": 429, "headers": {"Retry-After": "0"}, "body": {}}
+            if item["id"] == "0"
+            else _user(item)
+            for item in items
+        ]
+    )
+    handlers.append(lambda items: [_user(item) for item in items])
+
+    requests = [{"method": "GET", "url": f"/users/{upn}"} for upn in ("a@x", "b@x")]
+    responses = run(auth.graph_batch(requests))
+
+    assert calls == [["0", "1"], ["0"]]
+    assert [response["body"]["userPrincipalName"] for response in responses] == ["a@x", "b@x"]
@@ -0,0 +1,85 @@
+"""Expiry, aliases and eviction in the LRU cache, and the cached get_user."""
+
+from caching import LRUCache
+
+
+def test_expired_entries_miss_but_stay_available_for_revalidation():
+    cache = LRUCache(max_entries=10, ttl=300)
+    cache.set("alice", {"displayName": "Alice"}, etag='W/"1"', ttl=0)
+
+    assert cache.get("alice") is None
+    assert cache.get_stale("alice").etag == 'W/"1"'
+
+    cache.touch("alice")
+
+    assert cache.get("alice") == {"displayName": "Alice"}
+    assert cache.stats()["revalidations"] == 1
+
+
+def test_aliases_share_one_entry():
+    cache = LRUCache(max_entries=10, ttl=300)
+    cache.set("id-1", "Alice", aliases=["alice@contoso.example"])
+
+    assert cache.get("alice@contoso.example") == "Alice"
+    assert len(cache) == 1
+
+    # Storing through the alias replaces the entry rather than adding one
+    cache.set("alice@contoso.example", "Alice Smith")
+    assert cache.get("id-1") == "Alice Smith"
+
+    cache.pop("id-1")
+    assert cache.get("alice@contoso.example") is None
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = LRUCache(max_entries=2, ttl=300)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.evictions == 1
+
+
+def test_touch_counts_as_use():
+    cache = LRUCache(max_entries=2, ttl=300)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.touch("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+def test_byte_budget_evicts_until_the_new_entry_fits():
+    cache = LRUCache(max_entries=10, ttl=300, max_bytes=100)
+    cache.set("a", "a", size=40)
+    cache.set("b", "b", size=40)
+    cache.set("c", "c", size=40)
+
+    assert cache.get("a") is None
+    assert cache.total_bytes == 80
+
+    # Larger than the whole budget: not stored, and nothing else is evicted for it
+    cache.set("huge", "huge", size=101)
+    assert cache.get("huge") is None
+    assert len(cache) == 2
+
+
+def test_replacing_an_entry_releases_its_bytes():
+    cache = LRUCache(max_entries=10, ttl=300, max_bytes=100)
+    cache.set("a", "a", size=60)
+    cache.set("a", "a", size=30)
+
+    assert cache.total_bytes == 30
+    assert cache.evictions == 0
+
+
+def test_get_user_leaves_out_odata_annotations(server, run):
+    output = run(server.get_user("user5@contoso.example"))
+
+    assert "displayName: User 5" in output
+    assert "@odata" not in output
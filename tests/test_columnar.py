@@ -0,0 +1,88 @@
+"""Building columnar hunt results and reading rows back out of them."""
+
+from array import array
+
+from columnar import ColumnarBuilder, ColumnarResult, DictColumn
+
+SCHEMA = [
+    {"Name": "Timestamp", "Type": "DateTime"},
+    {"Name": "ActionType", "Type": "String"},
+    {"Name": "ReportId", "Type": "Long"},
+    {"Name": "AdditionalFields", "Type": "Dynamic"},
+]
+
+
+def _rows(count: int) -> list[dict]:
+    return [
+        {
+            "Timestamp": f"2026-10-01T00:00:{i % 60:02d}.000Z",
+            "ActionType": ["ProcessCreated", "ConnectionSuccess", None][i % 3],
+            "ReportId": i,
+            "AdditionalFields": {"Index": i} if i % 2 else None,
+        }
+        for i in range(count)
+    ]
+
+
+def test_rows_round_trip():
+    rows = _rows(200)
+
+    assert list(ColumnarResult.from_rows(rows, SCHEMA).rows()) == rows
+
+
+def test_repeated_strings_are_dictionary_encoded():
+    result = ColumnarResult.from_rows(_rows(200), SCHEMA)
+    actions = result.column("ActionType")
+
+    assert isinstance(actions, DictColumn)
+    assert actions.values == ["ProcessCreated", "ConnectionSuccess", None]
+    assert isinstance(result.column("ReportId"), array)
+
+
+def test_mostly_distinct_strings_are_kept_plain():
+    rows = [{"DeviceId": f"device-{i}"} for i in range(10)]
+    result = ColumnarResult.from_rows(rows, [{"Name": "DeviceId", "Type": "String"}])
+
+    assert result.column("DeviceId") == [row["DeviceId"] for row in rows]
+
+
+def test_unhashable_value_in_a_string_column_falls_back_to_a_list():
+    rows = [{"ActionType": "a"}, {"ActionType": "a"}, {"ActionType": {"nested": True}}, {"ActionType": "a"}]
+    result = ColumnarResult.from_rows(rows, [{"Name": "ActionType", "Type": "String"}])
+
+    assert list(result.rows()) == rows
+
+
+def test_numbers_with_nulls_stay_a_list():
+    rows = [{"ReportId": 1}, {"ReportId": None}, {"ReportId": 3}]
+    result = ColumnarResult.from_rows(rows, [{"Name": "ReportId", "Type": "Long"}])
+
+    assert result.column("ReportId") == [1, None, 3]
+
+
+def test_columns_missing_from_the_schema_are_backfilled():
+    builder = ColumnarBuilder()
+    builder.append({"DeviceName": "a"})
+    builder.set_schema([{"Name": "DeviceName", "Type": "String"}, {"Name": "ActionType", "Type": "String"}])
+    builder.append({"DeviceName": "b", "ActionType": "x", "Extra": 1})
+
+    assert list(builder.finish().rows()) == [
+        {"DeviceName": "a", "ActionType": None, "Extra": None},
+        {"DeviceName": "b", "ActionType": "x", "Extra": 1},
+    ]
+
+
+def test_take_sort_and_select_keep_rows_intact():
+    result = ColumnarResult.from_rows(_rows(30), SCHEMA)
+
+    ordered = result.sort("ActionType", descending=True)
+    actions = [row["ActionType"] for row in ordered.rows()]
+
+    assert actions == ["ProcessCreated"] * 10 + ["ConnectionSuccess"] * 10 + [None] * 10
+    assert list(result.take([5, 1]).select(["ReportId"]).rows()) == [{"ReportId": 5}, {"ReportId": 1}]
+
+
+def test_columns_without_a_schema_keep_their_order():
+    rows = [{"Zeta": 1, "Alpha": 2, "Mid": 3}, {"Mid": 4, "New": 5}]
+
+    assert ColumnarResult.from_rows(rows).column_names == ["Zeta", "Alpha", "Mid", "New"]
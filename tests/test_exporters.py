@@ -0,0 +1,108 @@
+"""Writing exported hunt results, and where the files end up."""
+
+import csv
+import json
+
+import pytest
+
+import exporters
+from exporters import export_path, open_writer
+
+SCHEMA = [
+    {"Name": "DeviceName", "Type": "String"},
+    {"Name": "ReportId", "Type": "Long"},
+    {"Name": "AdditionalFields", "Type": "Dynamic"},
+]
+
+ROWS = [
+    {"DeviceName": "host-1", "ReportId": 1, "AdditionalFields": {"Command": "a,b"}},
+    {"DeviceName": 'quote "host"', "ReportId": 2, "AdditionalFields": None},
+    {"ReportId": 3, "AdditionalFields": ["x", 1]},
+]
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporters, "EXPORT_DIR", tmp_path / "exports")
+    return tmp_path / "exports"
+
+
+def _export(format: str, filename: str = "out"):
+    writer = open_writer(format, filename)
+    writer.set_schema(SCHEMA)
+    for row in ROWS:
+        writer.write(row)
+    writer.close()
+    return writer
+
+
+def test_ndjson_writes_one_object_per_line():
+    writer = _export("ndjson")
+
+    lines = writer.path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+    assert writer.rows == 3
+
+
+def test_csv_follows_the_schema_and_encodes_dynamic_values():
+    writer = _export("csv")
+
+    with open(writer.path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        ["DeviceName", "ReportId", "AdditionalFields"],
+        ["host-1", "1", '{"Command": "a,b"}'],
+        ['quote "host"', "2", ""],
+        ["", "3", '["x", 1]'],
+    ]
+
+
+def test_csv_without_a_schema_uses_the_first_row():
+    writer = open_writer("csv", "out")
+    writer.write({"b": 1, "a": 2})
+    writer.close()
+
+    assert writer.path.read_text(encoding="utf-8").splitlines() == ["b,a", "1,2"]
+
+
+def test_abort_removes_the_partial_file():
+    writer = open_writer("ndjson", "partial")
+    writer.write(ROWS[0])
+    writer.abort()
+
+    assert not writer.path.exists()
+
+
+@pytest.mark.parametrize(
+    ("filename", "name"),
+    [
+        ("results", "results.csv"),
+        ("results.csv", "results.csv"),
+        ("../../etc/cron.d/evil", "evil.csv"),
+        ("/tmp/absolute.csv", "absolute.csv"),
+    ],
+)
+def test_exports_stay_in_the_export_directory(export_dir, filename, name):
+    assert export_path("csv", filename) == export_dir / name
+
+
+@pytest.mark.parametrize("filename", [None, "", "/", ".."])
+def test_missing_name_is_generated(export_dir, filename):
+    path = export_path("ndjson", filename)
+
+    assert path.parent == export_dir
+    assert path.name.startswith("hunt-") and path.suffix == ".ndjson"
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match="Unsupported export format"):
+        export_path("xlsx")
+
+
+def test_parquet_keeps_numeric_types():
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    table = pq.read_table(_export("parquet").path)
+
+    assert str(table.schema.field("ReportId").type) == "int64"
+    assert table.column("AdditionalFields").to_pylist() == ['{"Command": "a,b"}', None, '["x", 1]']
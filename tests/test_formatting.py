@@ -0,0 +1,82 @@
+"""Fitting hunt results into the output character budget."""
+
+import pytest
+
+from columnar import ColumnarResult
+from formatting import MIN_CELL_CHARS, MIN_ROWS, format_table
+
+SCHEMA = [
+    {"Name": "DeviceName", "Type": "String"},
+    {"Name": "ProcessCommandLine", "Type": "String"},
+    {"Name": "ReportId", "Type": "Long"},
+    {"Name": "InitiatingProcessParentFileName", "Type": "String"},
+]
+
+
+def _result(rows: int, command_chars: int = 300) -> ColumnarResult:
+    return ColumnarResult.from_rows(
+        (
+            {
+                "DeviceName": f"host-{i}",
+                "ProcessCommandLine": f"powershell.exe -enc {i:04d}".ljust(command_chars, "A"),
+                "ReportId": i,
+            }
+            for i in range(rows)
+        ),
+        SCHEMA,
+    )
+
+
+@pytest.mark.parametrize("style", ["tsv", "markdown"])
+@pytest.mark.parametrize("max_chars", [300, 1000, 4000, 24000])
+def test_table_stays_within_the_budget(style, max_chars):
+    table = format_table(_result(200), style=style, max_chars=max_chars)
+
+    assert len(table.text) < max_chars
+    assert table.rows == len(table.text.splitlines()) - (2 if style == "markdown" else 1)
+
+
+def test_rows_are_added_until_the_budget_runs_out():
+    small = format_table(_result(200, command_chars=20), max_chars=2000)
+    large = format_table(_result(200, command_chars=20), max_chars=4000)
+
+    assert MIN_ROWS < small.rows < large.rows < 200
+    assert small.truncated_cells == 0
+
+
+def test_long_cells_are_shortened_before_rows_are_given_up():
+    table = format_table(_result(200), max_chars=900)
+
+    assert table.rows >= MIN_ROWS
+    assert MIN_CELL_CHARS <= table.cell_chars < 120
+    assert table.truncated_cells == table.rows
+    assert f"{table.rows} cells truncated to {table.cell_chars} characters" in table.notes()
+
+
+def test_widest_column_is_hidden_when_shortening_is_not_enough():
+    table = format_table(_result(200), max_chars=250)
+
+    assert table.hidden_columns == ["ProcessCommandLine"]
+    assert "ProcessCommandLine" not in table.text
+    assert table.rows >= MIN_ROWS
+
+
+def test_empty_columns_are_left_out():
+    table = format_table(_result(5), max_chars=24000)
+
+    assert table.columns == ["DeviceName", "ProcessCommandLine", "ReportId"]
+    assert table.empty_columns == ["InitiatingProcessParentFileName"]
+    assert table.text.splitlines()[0] == "DeviceName\tProcessCommandLine\tReportId"
+
+
+def test_cells_cannot_break_the_table_layout():
+    result = ColumnarResult.from_rows([{"A": "tab\there", "B": "pipe | and\nnewline"}])
+
+    assert format_table(result).text.splitlines()[1] == "tab\\there\tpipe | and\\nnewline"
+    assert format_table(result, style="markdown").text.splitlines()[2] == "| tab\there | pipe \\| and newline |"
+
+
+def test_start_and_stop_select_the_rows():
+    table = format_table(_result(50, command_chars=10), start=20, stop=23, columns=["ReportId"])
+
+    assert table.text.splitlines() == ["ReportId", "20", "21", "22"]
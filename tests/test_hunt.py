@@ -0,0 +1,64 @@
+"""Fetching only the rows hunt can show, and what refine and export do with such a result."""
+
+import re
+
+from formatting import HUNT_OUTPUT_MAX_ROWS
+
+
+def _handle(output: str) -> str:
+    return re.search(r"Result handle: (r-[0-9a-f]+)", output)[1]
+
+
+def test_unbounded_hunt_fetches_only_the_rows_it_can_show(server, run):
+    output = run(server.hunt("DeviceProcessEvents", days=1))
+    info = server.result_store.info(_handle(output))
+
+    assert output.startswith(f"Found at least {HUNT_OUTPUT_MAX_ROWS} results; only the rows that can be shown")
+    assert info.row_count == HUNT_OUTPUT_MAX_ROWS
+    assert info.limited
+
+
+def test_result_within_the_limit_is_complete(server, run):
+    output = run(server.hunt("DeviceProcessEvents | take 20", days=1))
+
+    assert output.startswith("Found 20 results:")
+    assert not server.result_store.info(_handle(output)).limited
+
+
+def test_fetch_all_stores_every_row(server, run):
+    output = run(server.hunt("DeviceProcessEvents | take 2000", days=1, fetch_all=True))
+    info = server.result_store.info(_handle(output))
+
+    assert info.row_count == 2000
+    assert not info.limited
+
+
+def test_refining_a_limited_result_warns(server, run):
+    handle = _handle(run(server.hunt("DeviceProcessEvents", days=1)))
+
+    output = run(server.refine(handle, "summarize count()"))
+
+    assert f"Warning: {handle} holds only the first {HUNT_OUTPUT_MAX_ROWS} matching rows" in output
+    # The refined result inherits the limitation
+    assert server.result_store.info(_handle(output)).limited
+
+
+def test_refining_a_complete_result_does_not_warn(server, run):
+    handle = _handle(run(server.hunt("DeviceProcessEvents | take 20", days=1)))
+
+    assert "Warning" not in run(server.refine(handle, "summarize count()"))
+
+
+def test_exporting_a_limited_result_is_refused(server, run, tmp_path):
+    handle = _handle(run(server.hunt("DeviceProcessEvents", days=1)))
+
+    output = run(server.export_hunt(handle=handle))
+
+    assert output.startswith(f"Error: {handle} holds only the first {HUNT_OUTPUT_MAX_ROWS} rows")
+    assert not (tmp_path / "exports").exists() or not any((tmp_path / "exports").iterdir())
+
+
+def test_exporting_a_complete_result(server, run):
+    handle = _handle(run(server.hunt("DeviceProcessEvents | take 20", days=1)))
+
+    assert run(server.export_hunt(handle=handle, format="csv")).startswith("Exported 20 rows to ")
@@ -0,0 +1,96 @@
+"""Background hunting jobs: results, progress, and cancelling the query rather than just the wait."""
+
+import asyncio
+from functools import partial
+
+from conftest import HUNT_ROWS, until
+
+from formatting import HUNT_OUTPUT_MAX_ROWS
+from jobs import CANCELLED, SUCCEEDED
+from kql import preflight
+
+
+class RecordingContext:
+    """Stands in for the MCP request context, keeping the progress notifications sent."""
+
+    def __init__(self):
+        self.progress = []
+
+    async def report_progress(self, progress, total=None):
+        self.progress.append((progress, total))
+
+
+def test_cancel_job_stops_the_query(server, run):
+    async def scenario():
+        await server.hunt_async("DeviceProcessEvents", days=1)
+        [job] = server.hunt_jobs.list()
+        await until(lambda: job.progress >= 1000)
+        assert await server.cancel_job(job.id) == f"Cancelled job {job.id}."
+        await server.hunt_jobs.wait(job, 5)
+        # The query releases its quota reservation once it has unwound
+        await until(lambda: server.hunting_quota.status()["reserved"] == 0)
+        progress = job.progress
+        await asyncio.sleep(0.3)
+        return job, progress
+
+    job, progress = run(scenario())
+    assert job.status == CANCELLED
+    assert job.progress == progress < HUNT_ROWS
+    assert len(server.hunt_flights) == 0
+    assert len(server.hunt_cache) == 0
+    assert server.result_store.stats()["handles"] == 0
+    assert server.hunting_quota.status()["queries"] == 0
+
+
+def test_cancelling_one_waiter_keeps_a_shared_query_running(server, run):
+    query = "DeviceProcessEvents | take 20000"
+
+    async def scenario():
+        await server.hunt_async(query, days=1)
+        await server.hunt_async(query, days=1)
+        first, second = server.hunt_jobs.list()
+        await until(lambda: first.progress >= 1000)
+        server.hunt_jobs.cancel(first.id)
+        await server.hunt_jobs.wait(second, 30)
+        return first, second
+
+    first, second = run(scenario())
+    assert first.status == CANCELLED
+    assert second.status == SUCCEEDED
+    assert len(server.result_store.get(second.result)) == 20000
+    assert server.hunt_flights.stats()["started"] == 1
+    assert server.hunting_quota.status()["queries"] == 1
+
+
+def test_result_cut_short_by_the_take_guard_says_so(server, run, monkeypatch):
+    monkeypatch.setattr(server, "preflight", partial(preflight, mode="rewrite"))
+    ctx = RecordingContext()
+
+    async def scenario():
+        await server.hunt_async("DeviceProcessEvents", days=1)
+        [job] = server.hunt_jobs.list()
+        return await server.job_result(job.id, ctx, wait_seconds=30)
+
+    output = run(scenario())
+
+    assert output.startswith(f"Found at least {HUNT_OUTPUT_MAX_ROWS} results; only the rows that can be shown")
+    assert "fetch_all=True" in output
+    assert ctx.progress[-1] == (HUNT_OUTPUT_MAX_ROWS, HUNT_OUTPUT_MAX_ROWS)
+
+
+def test_complete_result_is_reported_as_such(server, run, monkeypatch):
+    monkeypatch.setattr(server, "preflight", partial(preflight, mode="rewrite"))
+    ctx = RecordingContext()
+
+    async def scenario():
+        await server.hunt_async("DeviceProcessEvents | take 20", days=1)
+        [job] = server.hunt_jobs.list()
+        await server.hunt_jobs.wait(job, 30)
+        return await server.job_result(job.id, ctx)
+
+    output = run(scenario())
+
+    assert output.startswith("Found 20 results:")
+    assert "page through all rows" in output
+    # Nothing to wait for, so only the final notification
+    assert ctx.progress == [(20, 20)]
@@ -0,0 +1,73 @@
+"""Parsing runHuntingQuery bodies as they stream in, whatever the chunk boundaries."""
+
+import asyncio
+import json
+
+import pytest
+
+from json_stream import iter_object_items
+
+BODY = {
+    "schema": [{"Name": "CommandLine", "Type": "String"}, {"Name": "Score", "Type": "Double"}],
+    "results": [
+        {"CommandLine": 'cmd.exe /c "echo {[,]}"', "Score": -1.5e10},
+        {"CommandLine": "C:\\Windows\\System32\\caf\u00e9.exe \u2713", "Score": 12},
+        {"CommandLine": "tab\tand \"quotes\" and \\u0041", "Score": 0.25},
+        {"CommandLine": None, "Score": True},
+    ],
+    "stats": {"rows": 4},
+}
+
+
+def _parse(data: bytes, sizes) -> list:
+    async def chunks():
+        start = 0
+        for size in sizes:
+            yield data[start : start + size]
+            start += size
+        yield data[start:]
+
+    async def collect():
+        return [item async for item in iter_object_items(chunks(), "results")]
+
+    return asyncio.run(collect())
+
+
+def _expected() -> list:
+    return [
+        ("schema", BODY["schema"]),
+        *(("results", row) for row in BODY["results"]),
+        ("stats", BODY["stats"]),
+    ]
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_every_split_point(ensure_ascii):
+    data = json.dumps(BODY, ensure_ascii=ensure_ascii).encode()
+
+    # Splitting inside escapes, multi-byte characters and numbers must not change the result
+    for split in range(1, len(data)):
+        assert _parse(data, [split]) == _expected(), split
+
+
+def test_one_byte_chunks():
+    data = json.dumps(BODY, indent=2, ensure_ascii=False).encode()
+
+    assert _parse(data, [1] * len(data)) == _expected()
+
+
+def test_number_at_the_end_of_a_chunk_is_not_cut_short():
+    data = b'{"results": [123456, 7.5e3, -2E-2]}'
+
+    for split in range(1, len(data)):
+        assert _parse(data, [split]) == [("results", 123456), ("results", 7.5e3), ("results", -0.02)], split
+
+
+def test_empty_object_and_array():
+    assert _parse(b"{}", [1]) == []
+    assert _parse(b'{"results": [], "schema": []}', [12]) == [("schema", [])]
+
+
+def test_malformed_body_is_an_error():
+    with pytest.raises(ValueError):
+        _parse(b'{"results": [1 2]}', [14])
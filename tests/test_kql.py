@@ -0,0 +1,119 @@
+"""Cache keys, preflight analysis and row-limit rewrites of hunting queries."""
+
+import pytest
+
+from kql import PreflightError, analyze_query, count_query, limit_rows, normalize_query, preflight
+
+
+def _codes(analysis):
+    return [finding.code for finding in analysis.findings]
+
+
+def test_layout_and_comments_do_not_change_the_cache_key():
+    query = """
+        // Suspicious encoded PowerShell
+        DeviceProcessEvents
+        |   where FileName == "powershell.exe"   // launched by anyone
+        | take 10
+    """
+
+    expected = 'DeviceProcessEvents | where FileName == "powershell.exe" | take 10'
+
+    assert normalize_query(query) == normalize_query(expected)
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        "DeviceProcessEvents | where FileName == 'Powershell.exe'",  # KQL strings are case-sensitive
+        "DeviceProcessEvents | where FileName == 'powershell.exe  '",
+        "DeviceProcessEvents | where FileName == '// not a comment'",
+    ],
+)
+def test_string_literals_are_kept_verbatim(other):
+    assert normalize_query(other) != normalize_query("DeviceProcessEvents | where FileName == 'powershell.exe'")
+
+
+def test_hunts_differing_only_in_layout_share_a_cache_entry(server, run):
+    run(server.hunt("DeviceInfo | take 5", days=1))
+    run(server.hunt("DeviceInfo\n  | take 5  // again", days=1))
+    run(server.hunt("DeviceInfo | take 5", days=2))
+
+    assert server.hunt_cache.stats()["hits"] == 1
+    assert len(server.hunt_cache) == 2
+
+
+def test_missing_time_filter_is_rewritten():
+    query, analysis = preflight("DeviceProcessEvents | where FileName == 'a'", 7, mode="rewrite")
+
+    assert "no-time-filter" in _codes(analysis)
+    assert query == "DeviceProcessEvents\n| where Timestamp > ago(7d) | where FileName == 'a'"
+
+
+def test_warn_mode_sends_the_query_as_written():
+    query = "DeviceProcessEvents | where FileName == 'a'"
+
+    assert preflight(query, 7, mode="warn")[0] == query
+
+
+def test_reject_mode_refuses_errors():
+    with pytest.raises(PreflightError, match="No Timestamp filter"):
+        preflight("DeviceNetworkEvents | where RemotePort == 4444", 30, mode="reject")
+
+
+def test_take_guard_is_added_to_unbounded_queries():
+    analysis = analyze_query("DeviceInfo | where Timestamp > ago(1d)", 1, limit=500)
+
+    assert "unbounded" in _codes(analysis)
+    assert analysis.rewritten == "DeviceInfo | where Timestamp > ago(1d)\n| take 500"
+
+
+def test_untimed_tables_need_no_time_filter():
+    query = "DeviceTvmSoftwareVulnerabilities | where CveId == 'CVE-2024-0001' | take 10"
+    rewritten, analysis = preflight(query, 30, mode="rewrite")
+
+    assert "no-time-filter" not in _codes(analysis)
+    assert rewritten == query
+    # A snapshot costs the same whatever the lookback
+    assert analyze_query(query, 30).cost == analyze_query(query, 1).cost
+
+
+def test_untimed_table_joined_with_an_event_table_still_needs_a_filter():
+    analysis = analyze_query("DeviceTvmSoftwareInventory | join DeviceProcessEvents on DeviceId", 30)
+
+    assert "no-time-filter" in _codes(analysis)
+    assert analysis.rewritten == analysis.query
+
+
+def test_search_scans_every_table():
+    analysis = analyze_query('search "evil.example"', 30)
+
+    assert "all-tables" in [finding.code for finding in analysis.errors]
+
+
+@pytest.mark.parametrize(
+    ("query", "limited"),
+    [
+        ("T | take 1000", "T | take 500"),
+        ("T | limit 1000", "T | limit 500"),
+        ("T | top 1000 by X", "T | top 500 by X"),
+        ("T | take 10", "T | take 10"),
+        ("T | where X > 1;", "T | where X > 1\n| take 500"),
+        ("T | summarize count() by X", "T | summarize count() by X\n| take 500"),
+        ("T | where X in ((U | take 1000))", "T | where X in ((U | take 1000))\n| take 500"),
+    ],
+)
+def test_limit_rows(query, limited):
+    assert limit_rows(query, 500) == limited
+
+
+def test_bounded_caller_suppresses_unbounded_finding():
+    assert "unbounded" in _codes(analyze_query("DeviceInfo", 1))
+    assert "unbounded" not in _codes(analyze_query("DeviceInfo", 1, bounded=True))
+
+
+def test_count_matches_the_rewritten_query():
+    rewritten, _ = preflight("DeviceProcessEvents | take 1000", 3, bounded=True, mode="rewrite")
+
+    assert limit_rows(rewritten, 500) == "DeviceProcessEvents\n| where Timestamp > ago(3d) | take 500"
+    assert count_query(rewritten) == "DeviceProcessEvents\n| where Timestamp > ago(3d) | take 1000\n| count"
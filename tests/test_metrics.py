@@ -0,0 +1,123 @@
+"""Rendering metrics in the Prometheus text exposition format, and serving them."""
+
+import asyncio
+import re
+import socket
+
+import pytest
+
+import metrics
+from metrics import Counter, Gauge, Histogram, MetricsExporter, instrument_tool, render
+
+# metric_name{label="value",...} value
+SAMPLE = re.compile(r'[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_]\w*="(?:[^"\\\n]|\\.)*",?)*\})? \S+')
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Render only the metrics a test creates."""
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+
+
+def _check_exposition(text: str) -> list[str]:
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    for line in lines:
+        assert line.startswith(("# HELP ", "# TYPE ")) or SAMPLE.fullmatch(line), line
+    return lines
+
+
+def test_counter_and_gauge():
+    requests = Counter("test_requests_total", "Requests", ["endpoint", "status"])
+    requests.labels("/users", 200).inc()
+    requests.labels(endpoint="/users", status="200").inc(2)
+    in_flight = Gauge("test_in_flight", "In flight")
+    in_flight.set(3)
+    in_flight.labels().dec()
+
+    assert _check_exposition(render()) == [
+        "# HELP test_requests_total Requests",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{endpoint="/users",status="200"} 3',
+        "# HELP test_in_flight In flight",
+        "# TYPE test_in_flight gauge",
+        "test_in_flight 2",
+    ]
+
+
+def test_label_values_are_escaped():
+    errors = Counter("test_errors_total", "Errors", ["message"])
+    errors.labels('bad "quote" \\ and\nnewline').inc()
+
+    [sample] = [line for line in _check_exposition(render()) if not line.startswith("#")]
+    assert sample == 'test_errors_total{message="bad \\"quote\\" \\\\ and\\nnewline"} 1'
+
+
+def test_histogram_buckets_are_cumulative():
+    duration = Histogram("test_duration_seconds", "Duration", ["tool"], buckets=[1.0, 0.1])
+    for value in (0.05, 0.5, 0.5, 5):
+        duration.labels("hunt").observe(value)
+
+    assert _check_exposition(render())[2:] == [
+        'test_duration_seconds_bucket{tool="hunt",le="0.1"} 1',
+        'test_duration_seconds_bucket{tool="hunt",le="1"} 3',
+        'test_duration_seconds_bucket{tool="hunt",le="+Inf"} 4',
+        'test_duration_seconds_sum{tool="hunt"} 6.05',
+        'test_duration_seconds_count{tool="hunt"} 4',
+    ]
+
+
+def test_instrumented_tool_records_outcomes(monkeypatch):
+    duration = Histogram("test_tool_duration_seconds", "Tool duration", ["tool", "outcome"])
+    monkeypatch.setattr(metrics, "TOOL_DURATION", duration)
+
+    @instrument_tool
+    async def lookup(fail: bool) -> str:
+        return "Error: no such user" if fail else "User Profile:"
+
+    asyncio.run(lookup(False))
+    asyncio.run(lookup(True))
+
+    samples = [line for line in render().splitlines() if "_count" in line]
+    assert samples == [
+        'test_tool_duration_seconds_count{tool="lookup",outcome="ok"} 1',
+        'test_tool_duration_seconds_count{tool="lookup",outcome="error"} 1',
+    ]
+
+
+def test_metrics_endpoint():
+    Counter("test_served_total", "Served").inc()
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    async def scenario():
+        exporter = MetricsExporter(port=port, path=None)
+        await exporter.start()
+        try:
+            responses = []
+            for path in ("/metrics", "/other"):
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+                responses.append((await reader.read()).decode())
+                writer.close()
+            return responses
+        finally:
+            await exporter.close()
+
+    metrics_response, other = asyncio.run(scenario())
+
+    assert metrics_response.startswith("HTTP/1.1 200 OK\r\n")
+    assert "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n" in metrics_response
+    assert metrics_response.endswith("test_served_total 1\n")
+    assert other.startswith("HTTP/1.1 404")
+
+
+def test_metrics_file(tmp_path):
+    Counter("test_written_total", "Written").inc(5)
+    path = tmp_path / "metrics.prom"
+
+    metrics.write_file(path)
+
+    assert path.read_text(encoding="utf-8").splitlines()[-1] == "test_written_total 5"
@@ -0,0 +1,89 @@
+"""Following @odata.nextLink with graph_pages."""
+
+import asyncio
+from contextlib import aclosing
+
+import httpx
+import pytest
+
+import auth
+from throttling import RateLimiter
+
+PAGES = 5
+
+
+@pytest.fixture
+def directory(monkeypatch):
+    """A paged /users collection whose pages take delay seconds to serve."""
+    state = {"delay": 0.0, "started": [], "finished": [], "fail_at": None}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/oauth2/v2.0/token"):
+            return httpx.Response(200, json={"access_token": "token", "expires_in": 3599})
+        page = int(request.url.params.get("page", 0))
+        state["started"].append(page)
+        await asyncio.sleep(state["delay"])
+        state["finished"].append(page)
+        if page == state["fail_at"]:
+            return httpx.Response(404, json={"error": {"code": "Request_ResourceNotFound"}})
+        body = {"value": [{"id": f"{page}-{i}"} for i in range(3)]}
+        if page + 1 < PAGES:
+            body["@odata.nextLink"] = f"https://graph.test/v1.0/users?page={page + 1}"
+        return httpx.Response(200, json=body)
+
+    monkeypatch.setattr(auth, "rate_limiter", RateLimiter({}))
+    monkeypatch.setattr(auth, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return state
+
+
+@pytest.mark.parametrize("prefetch", [0, 1, 3])
+def test_every_page_is_returned_in_order(directory, run, prefetch):
+    async def scenario():
+        return [page async for page in auth.graph_pages("/users?page=0", prefetch=prefetch)]
+
+    pages = run(scenario())
+
+    assert [user["id"] for page in pages for user in page["value"]] == [
+        f"{page}-{i}" for page in range(PAGES) for i in range(3)
+    ]
+
+
+# With prefetch=1, page 1 waits in the queue and page 2 for room in it
+@pytest.mark.parametrize(("prefetch", "requested"), [(0, [0]), (1, [0, 1, 2])])
+def test_next_page_is_fetched_while_the_consumer_works(directory, run, prefetch, requested):
+    async def scenario():
+        async with aclosing(auth.graph_pages("/users?page=0", prefetch=prefetch)) as pages:
+            async for _ in pages:
+                await asyncio.sleep(0.1)
+                return list(directory["finished"])
+
+    assert run(scenario()) == requested
+
+
+def test_stopping_early_cancels_the_outstanding_fetch(directory, run):
+    directory["delay"] = 0.05
+
+    async def scenario():
+        async with aclosing(auth.graph_pages("/users?page=0", prefetch=1)) as pages:
+            async for _ in pages:
+                break
+        await asyncio.sleep(0.3)
+
+    run(scenario())
+
+    # Page 1 was still downloading when the consumer stopped
+    assert directory["started"] == [0, 1]
+    assert directory["finished"] == [0]
+
+
+def test_errors_reach_the_consumer_after_the_pages_before_them(directory, run):
+    directory["fail_at"] = 2
+
+    async def scenario():
+        received = []
+        with pytest.raises(httpx.HTTPStatusError):
+            async for page in auth.graph_pages("/users?page=0", prefetch=2):
+                received.append(page)
+        return received
+
+    assert len(run(scenario())) == 2
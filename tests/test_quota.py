@@ -0,0 +1,48 @@
+"""Hunting quota accounting against the mock Graph server."""
+
+import asyncio
+import time
+
+import auth
+from quota import HuntingQuota
+from throttling import RateLimiter, TokenBucket
+
+
+def test_cost_excludes_rate_limit_queueing(server, run, monkeypatch):
+    # One query at once, then one every 0.25s
+    monkeypatch.setattr(auth, "rate_limiter", RateLimiter({"/security/runHuntingQuery": TokenBucket(4, 1)}))
+
+    async def scenario():
+        started = time.monotonic()
+        await asyncio.gather(*(server._run_hunting_query(f"DeviceInfo | take {n}", "P1D") for n in range(1, 5)))
+        return time.monotonic() - started
+
+    elapsed = run(scenario())
+    status = server.hunting_quota.status()
+    assert elapsed >= 0.7
+    assert status["queries"] == 4
+    assert status["sources"] == {"wall": 4}
+    # Each query is charged for its own request (~5 ms against the stand-in), not its wait in the queue
+    assert max(usage.cost for usage in status["heaviest"]) < 0.2
+
+
+def test_export_hunt_is_charged(server, run):
+    output = run(server.export_hunt("DeviceInfo | take 25", days=1))
+
+    assert output.startswith("Exported 25 rows")
+    status = server.hunting_quota.status()
+    assert status["queries"] == 1
+    assert status["heaviest"][0].rows == 25
+    assert status["reserved"] == 0
+
+
+def test_export_hunt_is_refused_over_quota(server, run, monkeypatch, tmp_path):
+    quota = HuntingQuota(budget=10, policy="refuse")
+    quota.throttled(60)
+    monkeypatch.setattr(server, "hunting_quota", quota)
+
+    output = run(server.export_hunt("DeviceInfo | take 25", days=1))
+
+    assert output.startswith("Error: Advanced Hunting quota exceeded")
+    assert not any((tmp_path / "exports").iterdir())
+    assert quota.status()["queries"] == 0
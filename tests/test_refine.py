@@ -0,0 +1,166 @@
+"""Refining stored hunt results with where, summarize, top and distinct."""
+
+import pytest
+
+from columnar import ColumnarResult
+from refine import RefineError, refine_result
+
+SCHEMA = [
+    {"Name": "Timestamp", "Type": "DateTime"},
+    {"Name": "DeviceName", "Type": "String"},
+    {"Name": "FileName", "Type": "String"},
+    {"Name": "RemotePort", "Type": "Int32"},
+    {"Name": "Bytes", "Type": "Long"},
+]
+
+# Advanced Hunting writes timestamps with varying precision
+TIMESTAMPS = [
+    "2026-09-30T23:59:59.9999999Z",
+    "2026-10-01T00:00:00Z",
+    "2026-10-01T00:00:00.000Z",
+    "2026-10-01T00:00:00.5Z",
+    "2026-10-02T08:00:00.1234567Z",
+]
+
+ROWS = [
+    {"Timestamp": timestamp, "DeviceName": device, "FileName": file, "RemotePort": port, "Bytes": size}
+    for timestamp, device, file, port, size in zip(
+        TIMESTAMPS,
+        ["a", "a", "b", "b", "c"],
+        ["cmd.exe", "PowerShell.exe", "powershell.exe", None, "cmd.exe"],
+        [9, 443, 80, 10, 443],
+        [5, 7, None, 1, 2],
+    )
+]
+
+
+@pytest.fixture
+def result():
+    return ColumnarResult.from_rows(ROWS, SCHEMA)
+
+
+def _column(result, name):
+    return [row[name] for row in result.rows()]
+
+
+@pytest.mark.parametrize(
+    ("condition", "devices"),
+    [
+        ("Timestamp == datetime(2026-10-01T00:00:00Z)", ["a", "b"]),
+        ("Timestamp == datetime(2026-10-01)", ["a", "b"]),
+        ("Timestamp < datetime(2026-10-01)", ["a"]),
+        ("Timestamp <= datetime(2026-10-01)", ["a", "a", "b"]),
+        ("Timestamp > datetime(2026-10-01)", ["b", "c"]),
+        ("Timestamp >= datetime(2026-10-01 00:00:00.5)", ["b", "c"]),
+        ("Timestamp != datetime(2026-10-01T00:00:00Z)", ["a", "b", "c"]),
+        ("Timestamp > datetime(2026-10-01T02:00:00+02:00)", ["b", "c"]),
+        ('Timestamp == "2026-10-01T00:00:00Z"', ["a", "b"]),
+    ],
+)
+def test_datetimes_compare_as_instants(result, condition, devices):
+    assert _column(refine_result(result, f"where {condition}"), "DeviceName") == devices
+
+
+@pytest.mark.parametrize(
+    ("condition", "ports"),
+    [
+        ("RemotePort > 80", [443, 443]),
+        ('RemotePort > "80"', [443, 443]),
+        ('RemotePort == "443"', [443, 443]),
+        ("RemotePort in (9, 10)", [9, 10]),
+        ("RemotePort !in (443, 80)", [9, 10]),
+    ],
+)
+def test_numbers_compare_numerically(result, condition, ports):
+    assert _column(refine_result(result, f"where {condition}"), "RemotePort") == ports
+
+
+def test_text_literal_for_a_number_column_is_rejected(result):
+    with pytest.raises(RefineError, match="holds numbers"):
+        refine_result(result, 'where RemotePort > "eighty"')
+    with pytest.raises(RefineError, match="holds datetimes"):
+        refine_result(result, "where Timestamp > 5")
+
+
+@pytest.mark.parametrize(
+    ("condition", "count"),
+    [
+        ('FileName =~ "POWERSHELL.EXE"', 2),
+        ('FileName == "powershell.exe"', 1),
+        ('FileName !~ "powershell.exe"', 2),
+        ('FileName has "cmd"', 2),
+        ('FileName !contains "shell"', 3),  # null contains nothing
+        ("isnull(FileName)", 1),
+        ('FileName startswith "cmd" and RemotePort == 443', 1),
+        ('FileName startswith "cmd" or isempty(FileName)', 3),
+        ('not(FileName endswith ".exe")', 1),
+    ],
+)
+def test_string_and_null_predicates(result, condition, count):
+    assert len(refine_result(result, f"| where {condition}")) == count
+
+
+def test_summarize(result):
+    summary = refine_result(
+        result,
+        "summarize Rows = count(), Ports = dcount(RemotePort), sum(Bytes), First = min(Timestamp), "
+        "Last = max(Timestamp) by DeviceName",
+    )
+
+    assert [(row["DeviceName"], row["Rows"], row["Ports"], row["sum_Bytes"]) for row in summary.rows()] == [
+        ("a", 2, 2, 12),
+        ("b", 2, 2, 1),
+        ("c", 1, 1, 2),
+    ]
+    # Earliest and latest by instant, although "...00Z" sorts after "...00.5Z" as text
+    assert [(row["First"], row["Last"]) for row in summary.rows()] == [
+        (TIMESTAMPS[0], TIMESTAMPS[1]),
+        (TIMESTAMPS[2], TIMESTAMPS[3]),
+        (TIMESTAMPS[4], TIMESTAMPS[4]),
+    ]
+
+
+def test_summarize_without_by_on_no_rows(result):
+    summary = refine_result(result, "where RemotePort > 1000 | summarize count(), avg(Bytes)")
+
+    assert list(summary.rows()) == [{"count_": 0, "avg_Bytes": None}]
+
+
+def test_top_orders_datetimes_by_instant(result):
+    latest = refine_result(result, "top 2 by Timestamp")
+    earliest = refine_result(result, "top 2 by Timestamp asc")
+
+    assert _column(latest, "Timestamp") == [TIMESTAMPS[4], TIMESTAMPS[3]]
+    assert _column(earliest, "Timestamp")[0] == TIMESTAMPS[0]
+
+
+def test_top_puts_nulls_last(result):
+    assert _column(refine_result(result, "top 5 by Bytes asc"), "Bytes") == [1, 2, 5, 7, None]
+
+
+def test_distinct(result):
+    devices = refine_result(result, "where RemotePort == 443 | distinct DeviceName, RemotePort")
+
+    assert list(devices.rows()) == [{"DeviceName": "a", "RemotePort": 443}, {"DeviceName": "c", "RemotePort": 443}]
+
+
+def test_dictionary_encoded_columns_filter_the_same(result):
+    many = ColumnarResult.from_rows(ROWS * 20, SCHEMA)
+
+    assert len(refine_result(many, "where DeviceName == 'b' and Timestamp >= datetime(2026-10-01)")) == 40
+
+
+@pytest.mark.parametrize(
+    ("expression", "message"),
+    [
+        ("where Missing == 1", "Unknown column 'Missing'"),
+        ("where DeviceName ==", "Unexpected end"),
+        ("extend X = 1", "Unsupported operator 'extend'"),
+        ("summarize median(Bytes)", "Unsupported aggregation"),
+        ("where 443 == RemotePort", "Expected a column name"),
+        ("where RemotePort between (1 .. 2)", "Unsupported operator 'between'"),
+    ],
+)
+def test_errors(result, expression, message):
+    with pytest.raises(RefineError, match=message):
+        refine_result(result, expression)
@@ -0,0 +1,78 @@
+"""Keeping hunt results under handles, spilling them to disk and reloading them."""
+
+import pytest
+
+from columnar import ColumnarResult
+from result_store import ResultStore
+
+SCHEMA = [{"Name": "DeviceName", "Type": "String"}, {"Name": "ReportId", "Type": "Long"}]
+
+
+def _result(rows: int, device: str = "host") -> ColumnarResult:
+    return ColumnarResult.from_rows(
+        ({"DeviceName": f"{device}-{i % 3}", "ReportId": i} for i in range(rows)), SCHEMA
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    size = _result(1000).nbytes
+    # Room in memory for one result, on disk for two
+    store = ResultStore(max_memory=size, max_disk=2 * size, max_handles=10, directory=str(tmp_path))
+    yield store
+    store.close()
+
+
+def test_least_recently_used_result_is_spilled(store, tmp_path):
+    first = store.put(_result(1000, "a"), "A")
+    second = store.put(_result(1000, "b"), "B")
+
+    assert store.info(first).data is None
+    assert store.info(first).path.parent == tmp_path
+    assert store.info(second).data is not None
+    assert store.stats()["in_memory"] == 1
+
+
+def test_spilled_result_reloads_unchanged(store):
+    first = store.put(_result(1000, "a"), "A")
+    store.put(_result(1000, "b"), "B")
+    path = store.info(first).path
+
+    reloaded = store.get(first)
+
+    assert list(reloaded.rows()) == list(_result(1000, "a").rows())
+    assert not path.exists()
+    # Reloading it spilled the other one to stay within the memory budget
+    assert store.stats() == {
+        "handles": 2,
+        "in_memory": 1,
+        "memory_bytes": reloaded.nbytes,
+        "disk_bytes": reloaded.nbytes,
+    }
+
+
+def test_disk_budget_drops_the_oldest_results(store):
+    handles = [store.put(_result(1000, name), name) for name in "abcd"]
+
+    # One in memory, two on disk
+    assert [handle in store for handle in handles] == [False, True, True, True]
+    assert store.get(handles[0]) is None
+
+
+def test_handle_limit(tmp_path):
+    store = ResultStore(max_handles=2, directory=str(tmp_path))
+    handles = [store.put(_result(10), "q") for _ in range(3)]
+
+    assert handles[0] not in store
+    assert store.stats()["handles"] == 2
+
+
+def test_discard_removes_the_spilled_file(store):
+    first = store.put(_result(1000, "a"), "A")
+    store.put(_result(1000, "b"), "B")
+    path = store.info(first).path
+
+    store.discard(first)
+
+    assert not path.exists()
+    assert store.disk_bytes == 0
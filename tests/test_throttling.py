@@ -0,0 +1,136 @@
+"""Retry decisions and client-side rate limiting for Graph requests."""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from throttling import RateLimiter, RetryBudget, RetryPolicy, TokenBucket, endpoint_key, parse_retry_after
+
+HUNT = "/security/runHuntingQuery"
+
+
+def _response(status: int, retry_after: str | None = None) -> httpx.Response:
+    return httpx.Response(status, headers={"Retry-After": retry_after} if retry_after else None)
+
+
+@pytest.fixture
+def policy():
+    return RetryPolicy(max_attempts=5, base_delay=1, max_delay=60, budget=RetryBudget(max_retries=100, window=60))
+
+
+def test_retry_after_seconds_is_honoured_exactly(policy):
+    assert policy.next_delay("GET", "/users/alice", 0, response=_response(429, "7")) == 7
+
+
+def test_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    assert 28 <= parse_retry_after(format_datetime(when, usegmt=True)) <= 30
+    assert parse_retry_after("not a date") is None
+
+
+def test_retry_after_beyond_max_delay_gives_up(policy):
+    assert policy.next_delay("GET", "/users", 0, response=_response(429, "3600")) is None
+
+
+def test_backoff_without_retry_after_stays_within_the_exponential_cap(policy):
+    for attempt in range(4):
+        delay = policy.next_delay("GET", "/users", attempt, response=_response(503))
+        assert 0 <= delay <= 2**attempt
+
+
+@pytest.mark.parametrize(
+    ("method", "endpoint", "status", "retried"),
+    [
+        ("POST", "/users", 429, True),  # rejected before processing, always safe
+        ("POST", "/users", 503, False),  # may have been applied
+        ("POST", HUNT, 503, True),  # read-only POST
+        ("GET", "/users", 504, True),
+        ("GET", "/users", 500, False),
+        ("GET", "/users", 404, False),
+    ],
+)
+def test_which_failures_are_retried(policy, method, endpoint, status, retried):
+    delay = policy.next_delay(method, endpoint, 0, response=_response(status, "1"))
+
+    assert (delay is not None) == retried
+
+
+def test_transport_errors_are_retried_only_when_safe(policy):
+    request = httpx.Request("POST", "https://graph.microsoft.com/v1.0/users")
+
+    assert policy.next_delay("POST", "/users", 0, error=httpx.ConnectError("refused", request=request)) is not None
+    assert policy.next_delay("POST", "/users", 0, error=httpx.ReadTimeout("slow", request=request)) is None
+    assert policy.next_delay("GET", "/users", 0, error=httpx.ReadTimeout("slow", request=request)) is not None
+
+
+def test_attempts_are_capped(policy):
+    assert policy.next_delay("GET", "/users", 3, response=_response(429, "1")) == 1
+    assert policy.next_delay("GET", "/users", 4, response=_response(429, "1")) is None
+
+
+def test_retry_budget_is_per_endpoint():
+    policy = RetryPolicy(budget=RetryBudget(max_retries=2, window=60))
+
+    for _ in range(2):
+        assert policy.next_delay("GET", "/users/a", 0, response=_response(429, "1")) == 1
+    # Every user lookup counts against the /users workload
+    assert policy.next_delay("GET", "/users/b", 0, response=_response(429, "1")) is None
+    assert policy.next_delay("POST", HUNT, 0, response=_response(429, "1")) == 1
+
+
+def test_endpoint_key():
+    assert endpoint_key("/users/alice@contoso.com?$select=id") == "/users"
+    assert endpoint_key("https://graph.microsoft.com/v1.0/users?$skiptoken=x") == "/users"
+    assert endpoint_key(HUNT) == HUNT
+
+
+def test_bucket_paces_requests_after_the_burst():
+    async def scenario():
+        bucket = TokenBucket(rate=20, capacity=2)
+        started = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # Two go at once, the other four wait 50 ms each
+    assert 0.18 <= asyncio.run(scenario()) < 0.5
+
+
+def test_bucket_serves_waiters_in_arrival_order():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=1)
+        served = []
+
+        async def caller(index):
+            await bucket.acquire()
+            served.append(index)
+
+        tasks = []
+        for index in range(8):
+            tasks.append(asyncio.create_task(caller(index)))
+            await asyncio.sleep(0.001)
+        await asyncio.gather(*tasks)
+        return served
+
+    assert asyncio.run(scenario()) == list(range(8))
+
+
+def test_pause_holds_back_callers():
+    async def scenario():
+        bucket = TokenBucket(rate=10, capacity=10)
+        bucket.pause(0.2)
+        return await bucket.acquire()
+
+    assert asyncio.run(scenario()) >= 0.2
+
+
+def test_endpoints_without_a_bucket_are_not_limited():
+    limiter = RateLimiter({"/users": TokenBucket(rate=1, capacity=1)})
+
+    assert limiter.bucket_for("/users/alice") is limiter.buckets["/users"]
+    assert asyncio.run(limiter.acquire("/groups")) == 0
@@ -0,0 +1,86 @@
+"""Syncing the local user mirror, answering lookups from it, and falling back to Graph when it can't."""
+
+import httpx
+import pytest
+from conftest import USERS
+
+import auth
+from throttling import RateLimiter
+from user_directory import UnsupportedQuery, UserDirectoryMirror
+
+MIRROR_NOTE = "From local directory mirror"
+
+
+@pytest.fixture
+def mirror(server, run, tmp_path, monkeypatch):
+    mirror = UserDirectoryMirror(tmp_path / "mirror.sqlite3")
+    run(mirror.sync())
+    monkeypatch.setattr(server, "user_mirror", mirror)
+    yield mirror
+    mirror.close()
+
+
+def test_mirror_is_synced(mirror):
+    assert mirror.is_ready
+    assert mirror.user_count == USERS
+
+
+def test_property_names_are_case_insensitive(server, mirror, run):
+    output = run(server.list_users(filter="DEPARTMENT eq 'it'", orderby="DisplayName desc", count=True))
+
+    assert MIRROR_NOTE in output
+    # The stand-in puts every fourth user in IT
+    assert f"Total count: {USERS // 4}" in output
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"filter": "employeeId eq '42'"},
+        {"filter": "startswith(city, 'Sea')"},
+        {"orderby": "employeeId desc"},
+        {"search": '"employeeId:42"'},
+    ],
+)
+def test_unstored_property_falls_back_to_graph(server, mirror, run, query):
+    with pytest.raises(UnsupportedQuery):
+        mirror.list_users(**query)
+
+    output = run(server.list_users(**query))
+
+    assert MIRROR_NOTE not in output
+    assert "No users found" not in output
+
+
+def test_get_user_returns_the_default_properties_unless_asked(server, mirror, run):
+    # The mirror holds properties get_user doesn't return by default
+    with mirror._db:
+        mirror._apply_page([{"id": "00000000-0000-0000-0000-000000000003", "givenName": "Ada"}])
+
+    output = run(server.get_user("user3@contoso.example"))
+    selected = run(server.get_user("user3@contoso.example", select=["displayName", "givenName"]))
+
+    assert MIRROR_NOTE in output
+    assert "displayName: User 3" in output
+    assert "givenName" not in output
+    assert "givenName: Ada" in selected
+
+
+def test_expired_delta_token_is_rebuilt_only_once(run, tmp_path, monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/oauth2/v2.0/token"):
+            return httpx.Response(200, json={"access_token": "token", "expires_in": 3599})
+        requests.append(request.url.path)
+        return httpx.Response(410, json={"error": {"code": "syncStateNotFound"}})
+
+    monkeypatch.setattr(auth, "rate_limiter", RateLimiter({}))
+    monkeypatch.setattr(auth, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    mirror = UserDirectoryMirror(tmp_path / "mirror.sqlite3")
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(mirror.sync())
+    mirror.close()
+
+    assert len(requests) == 2
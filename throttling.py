@@ -0,0 +1,249 @@
+"""
+Throttling handling for Microsoft Graph requests.
+
+Decides whether a failed request should be retried and how long to wait:
+- 429 responses are always retried, the request was rejected unprocessed
+- 503/504 responses and network errors are retried only for requests that
+  are safe to resend (idempotent methods and read-only POST endpoints)
+- Retry-After is honoured exactly; otherwise exponential backoff with jitter
+- Each endpoint has a retry budget so a sustained outage fails fast instead
+  of multiplying load on Graph
+
+Also paces requests per workload with token buckets, so bursts of tool calls
+stay under Graph's quotas instead of running into 429s.
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict, deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import httpx
+
+RETRY_MAX_ATTEMPTS = int(os.environ.get("GRAPH_RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.environ.get("GRAPH_RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.environ.get("GRAPH_RETRY_MAX_DELAY", "60"))
+
+# Retries allowed per endpoint within a sliding window
+RETRY_BUDGET = int(os.environ.get("GRAPH_RETRY_BUDGET", "20"))
+RETRY_BUDGET_WINDOW = float(os.environ.get("GRAPH_RETRY_BUDGET_WINDOW", "60"))
+
+# Client-side request rates in requests per second, with burst capacity.
+# Advanced Hunting allows 45 calls per minute per tenant.
+HUNTING_RATE = float(os.environ.get("GRAPH_HUNTING_RATE", "0.75"))
+HUNTING_BURST = float(os.environ.get("GRAPH_HUNTING_BURST", "10"))
+USERS_RATE = float(os.environ.get("GRAPH_USERS_RATE", "50"))
+USERS_BURST = float(os.environ.get("GRAPH_USERS_BURST", "100"))
+
+RETRYABLE_STATUS_CODES = {429, 503, 504}
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# POST endpoints that only read data and can be resent safely
+READ_ONLY_POST_ENDPOINTS = {"/security/runHuntingQuery"}
+
+# Errors raised before the request reached the server
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def endpoint_key(endpoint: str) -> str:
+    """
+    Reduce an endpoint or URL to the Graph workload it targets.
+
+    "/users/alice@contoso.com?$select=id" -> "/users"
+    "/security/runHuntingQuery"           -> "/security/runHuntingQuery"
+    """
+    path = urlsplit(endpoint).path
+    segments = [s for s in path.split("/") if s]
+    if segments[:1] in (["v1.0"], ["beta"]):
+        segments = segments[1:]
+    depth = 2 if segments[:1] == ["security"] else 1
+    return "/" + "/".join(segments[:depth])
+
+
+def is_idempotent(method: str, endpoint: str) -> bool:
+    """Check whether a request can be resent without side effects."""
+    method = method.upper()
+    if method in IDEMPOTENT_METHODS:
+        return True
+    return method == "POST" and endpoint_key(endpoint) in READ_ONLY_POST_ENDPOINTS
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """Sliding-window cap on the number of retries per endpoint."""
+
+    def __init__(self, max_retries: int = RETRY_BUDGET, window: float = RETRY_BUDGET_WINDOW):
+        self.max_retries = max_retries
+        self.window = window
+        self._spent: dict[str, deque[float]] = defaultdict(deque)
+
+    def try_spend(self, key: str) -> bool:
+        """Consume one retry for the endpoint, returning False if none are left."""
+        now = time.monotonic()
+        spent = self._spent[key]
+        while spent and spent[0] <= now - self.window:
+            spent.popleft()
+        if len(spent) >= self.max_retries:
+            return False
+        spent.append(now)
+        return True
+
+
+class RetryPolicy:
+    """Backoff and retry decisions for Graph requests."""
+
+    def __init__(
+        self,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        budget: RetryBudget | None = None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def next_delay(
+        self,
+        method: str,
+        endpoint: str,
+        attempt: int,
+        response: httpx.Response | None = None,
+        error: Exception | None = None,
+    ) -> float | None:
+        """
+        Decide whether to retry after a failed attempt.
+
+        Args:
+            method: HTTP method of the request
+            endpoint: Endpoint or URL of the request
+            attempt: Zero-based number of the attempt that just failed
+            response: Response received, if any
+            error: Transport error raised instead of a response, if any
+
+        Returns:
+            Seconds to wait before the next attempt, or None to give up
+        """
+        if attempt + 1 >= self.max_attempts:
+            return None
+
+        retry_after = None
+        if response is not None:
+            status = response.status_code
+            if status not in RETRYABLE_STATUS_CODES:
+                return None
+            if status != 429 and not is_idempotent(method, endpoint):
+                return None
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        elif isinstance(error, httpx.TransportError):
+            if not isinstance(error, _UNSENT_ERRORS) and not is_idempotent(method, endpoint):
+                return None
+        else:
+            return None
+
+        if retry_after is not None:
+            # Waiting longer than this would outlast any reasonable tool call
+            if retry_after > self.max_delay:
+                return None
+            delay = retry_after
+        else:
+            delay = self.backoff(attempt)
+
+        if not self.budget.try_spend(endpoint_key(endpoint)):
+            return None
+        return delay
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter.
+
+    Callers wait on a shared asyncio.Lock, which wakes waiters in FIFO order,
+    so concurrent tool calls are served fairly in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, cost: float = 1.0) -> float:
+        """
+        Wait until cost tokens are available and consume them.
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        cost = min(cost, self.capacity)
+        start = time.monotonic()
+        async with self._lock:
+            self._refill()
+            while self._tokens < cost:
+                await asyncio.sleep((cost - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= cost
+        return time.monotonic() - start
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all callers for the given time, e.g. after a 429 with Retry-After."""
+        self._refill()
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class RateLimiter:
+    """Token buckets keyed by Graph workload (see endpoint_key)."""
+
+    def __init__(self, buckets: dict[str, TokenBucket] | None = None):
+        if buckets is None:
+            buckets = {
+                "/security/runHuntingQuery": TokenBucket(HUNTING_RATE, HUNTING_BURST),
+                "/users": TokenBucket(USERS_RATE, USERS_BURST),
+            }
+        self.buckets = buckets
+
+    def bucket_for(self, endpoint: str) -> TokenBucket | None:
+        return self.buckets.get(endpoint_key(endpoint))
+
+    async def acquire(self, endpoint: str, cost: float = 1.0) -> float:
+        """Wait for the endpoint's bucket; endpoints without a bucket pass straight through."""
+        bucket = self.bucket_for(endpoint)
+        if bucket is None:
+            return 0.0
+        return await bucket.acquire(cost)
+
+    def pause(self, endpoint: str, seconds: float) -> None:
+        bucket = self.bucket_for(endpoint)
+        if bucket is not None:
+            bucket.pause(seconds)
@@ -0,0 +1,140 @@
+"""
+OpenTelemetry tracing for tool calls and Graph requests.
+
+Each MCP tool call gets a span, with child spans for token acquisition,
+every Graph HTTP attempt (including Graph's request-id and client-request-id)
+and result formatting, so a slow call shows whether the time went to auth,
+rate-limit queueing, Graph or rendering.
+
+OpenTelemetry is optional: install the "tracing" extra and set
+GRAPH_TRACE_EXPORTER to "otlp" (OTLP/HTTP, endpoint from the standard
+OTEL_EXPORTER_OTLP_ENDPOINT, default http://localhost:4318) or "console"
+(printed to stderr). If the packages are missing, spans are no-ops. If a
+tracer provider was already configured (e.g. by opentelemetry-instrument),
+it is used as is.
+"""
+
+import logging
+import os
+import sys
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:
+    trace = None
+
+TRACE_EXPORTER = os.environ.get("GRAPH_TRACE_EXPORTER", "").lower()
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "microsoft-security")
+
+logger = logging.getLogger(__name__)
+
+
+class _NoOpSpan:
+    """Stands in for a span when OpenTelemetry isn't installed."""
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def set_attributes(self, attributes: dict) -> None:
+        pass
+
+    def record_error(self, description: str) -> None:
+        pass
+
+
+class _Span:
+    """Thin wrapper so callers don't need OpenTelemetry types."""
+
+    __slots__ = ("_span",)
+
+    def __init__(self, span):
+        self._span = span
+
+    def set_attribute(self, key: str, value) -> None:
+        if value is not None:
+            self._span.set_attribute(key, value)
+
+    def set_attributes(self, attributes: dict) -> None:
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_error(self, description: str) -> None:
+        """Mark the span as failed without an exception, e.g. for an error returned as text."""
+        self._span.set_status(Status(StatusCode.ERROR, description))
+
+
+_NOOP_SPAN = _NoOpSpan()
+
+
+def configure_tracing() -> bool:
+    """
+    Install a tracer provider with the exporter named by GRAPH_TRACE_EXPORTER.
+
+    Returns whether spans will be exported.
+    """
+    if trace is None:
+        if TRACE_EXPORTER:
+            logger.warning(
+                "GRAPH_TRACE_EXPORTER is set but OpenTelemetry is not installed; install the 'tracing' extra"
+            )
+        return False
+    if not TRACE_EXPORTER:
+        # Spans still go to a provider configured elsewhere, if any
+        return False
+
+    if TRACE_EXPORTER not in ("otlp", "console"):
+        logger.warning("Unknown GRAPH_TRACE_EXPORTER %r; use 'otlp' or 'console'", TRACE_EXPORTER)
+        return False
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+        if TRACE_EXPORTER == "otlp":
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+            exporter = OTLPSpanExporter()
+        else:
+            # stdout carries the MCP stdio protocol
+            exporter = ConsoleSpanExporter(out=sys.stderr)
+    except ImportError as e:
+        logger.warning("Cannot export traces (%s); install the 'tracing' extra", e)
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Flush spans still buffered by the exporter."""
+    if trace is None:
+        return
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+@contextmanager
+def span(name: str, attributes: dict | None = None, client: bool = False) -> Iterator[_Span | _NoOpSpan]:
+    """
+    Run the enclosed block in a span that is a child of the current one.
+
+    Exceptions are recorded on the span and re-raised. client=True marks an
+    outgoing request (SpanKind.CLIENT).
+    """
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+
+    tracer = trace.get_tracer(__name__)
+    kind = SpanKind.CLIENT if client else SpanKind.INTERNAL
+    with tracer.start_as_current_span(name, kind=kind) as current:
+        wrapped = _Span(current)
+        if attributes:
+            wrapped.set_attributes(attributes)
+        yield wrapped
@@ -0,0 +1,359 @@
+"""
+Local mirror of the Entra ID user directory.
+
+Keeps a SQLite copy of the tenant's users in sync with Microsoft Graph delta
+queries (/users/delta), so get_user and list_users can be answered locally.
+
+- The initial sync streams pages into the database and stores the
+  @odata.nextLink after every page, so an interrupted sync resumes where it
+  stopped instead of starting over.
+- Later syncs send the stored @odata.deltaLink and only receive changes.
+- Only the properties in MIRROR_PROPERTIES are stored; queries asking for
+  anything else are left to Graph.
+"""
+
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import httpx
+
+from auth import graph_request
+
+MIRROR_ENABLED = os.environ.get("GRAPH_USER_MIRROR", "").lower() in ("1", "true", "yes")
+MIRROR_PATH = Path(os.environ.get("GRAPH_USER_MIRROR_PATH", Path(__file__).parent / ".user_mirror.sqlite3"))
+
+# Age in seconds after which a read triggers a background delta sync
+MIRROR_MAX_AGE = float(os.environ.get("GRAPH_USER_MIRROR_MAX_AGE", "900"))
+
+MIRROR_PROPERTIES = os.environ.get(
+    "GRAPH_USER_MIRROR_PROPERTIES",
+    "id,displayName,userPrincipalName,mail,jobTitle,department,officeLocation,"
+    "mobilePhone,businessPhones,accountEnabled,createdDateTime,userType,givenName,surname",
+).split(",")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    upn TEXT COLLATE NOCASE,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_upn ON users (upn);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_PROPERTY = r"[A-Za-z_]\w*"
+_STRING = r"'(?:[^']|'')*'"
+_EQ_CLAUSE = re.compile(
+    rf"^(?P<prop>{_PROPERTY})\s+(?P<op>eq|ne)\s+(?P<value>{_STRING}|true|false|null|-?\d+(?:\.\d+)?)$",
+    re.IGNORECASE,
+)
+_STARTSWITH_CLAUSE = re.compile(
+    rf"^startswith\(\s*(?P<prop>{_PROPERTY})\s*,\s*(?P<value>{_STRING})\s*\)$",
+    re.IGNORECASE,
+)
+_ORDERBY = re.compile(rf"^(?P<prop>{_PROPERTY})(?:\s+(?P<dir>asc|desc))?$", re.IGNORECASE)
+_SEARCH_CLAUSE = re.compile(rf'^"(?P<prop>{_PROPERTY}):(?P<value>[^"]*)"$')
+
+
+class UnsupportedQuery(ValueError):
+    """The query can't be answered from the mirror and must go to Graph."""
+
+
+def _split_outside_quotes(expression: str, separator: str) -> list[str]:
+    """Split on a keyword (e.g. " and ") that appears outside quoted strings."""
+    parts, start, quote = [], 0, None
+    lowered = expression.lower()
+    i = 0
+    while i < len(expression):
+        char = expression[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif lowered.startswith(separator, i):
+            parts.append(expression[start:i].strip())
+            i += len(separator)
+            start = i
+            continue
+        i += 1
+    if quote:
+        raise UnsupportedQuery("Unbalanced quotes")
+    parts.append(expression[start:].strip())
+    return parts
+
+
+def _literal(value: str):
+    if value.startswith("'"):
+        return value[1:-1].replace("''", "'")
+    lowered = value.lower()
+    if lowered in ("true", "false"):
+        return 1 if lowered == "true" else 0
+    if lowered == "null":
+        return None
+    return float(value) if "." in value else int(value)
+
+
+def _json_path(prop: str) -> str:
+    return f"json_extract(data, '$.{prop}')"
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _compile_filter(expression: str, resolve: Callable[[str], str]) -> tuple[list[str], list]:
+    """
+    Translate a simple OData $filter (eq/ne/startswith joined by 'and') into SQL.
+
+    resolve maps a property name as written to its stored name, raising
+    UnsupportedQuery for properties the mirror doesn't keep.
+    """
+    clauses, params = [], []
+    for part in _split_outside_quotes(expression, " and "):
+        if match := _EQ_CLAUSE.match(part):
+            column = _json_path(resolve(match["prop"]))
+            value = _literal(match["value"])
+            if value is None:
+                clauses.append(f"{column} IS {'NOT ' if match['op'].lower() == 'ne' else ''}NULL")
+                continue
+            operator = "=" if match["op"].lower() == "eq" else "IS NOT"
+            collate = " COLLATE NOCASE" if isinstance(value, str) else ""
+            clauses.append(f"{column} {operator} ?{collate}")
+            params.append(value)
+        elif match := _STARTSWITH_CLAUSE.match(part):
+            clauses.append(f"{_json_path(resolve(match['prop']))} LIKE ? ESCAPE '\\'")
+            params.append(_escape_like(_literal(match["value"])) + "%")
+        else:
+            raise UnsupportedQuery(f"Unsupported filter clause: {part}")
+    return clauses, params
+
+
+def _compile_search(expression: str, resolve: Callable[[str], str]) -> tuple[str, list]:
+    """Translate '"prop:value"' clauses joined by AND or OR into a substring match."""
+    expression = expression.strip()
+    joiner = " OR " if " OR " in expression else " AND "
+    clauses, params = [], []
+    for part in _split_outside_quotes(expression, joiner.lower()):
+        match = _SEARCH_CLAUSE.match(part)
+        if not match:
+            raise UnsupportedQuery(f"Unsupported search clause: {part}")
+        clauses.append(f"{_json_path(resolve(match['prop']))} LIKE ? ESCAPE '\\'")
+        params.append(f"%{_escape_like(match['value'])}%")
+    return "(" + joiner.join(clauses) + ")", params
+
+
+class UserDirectoryMirror:
+    """SQLite-backed copy of the tenant's users, kept current with /users/delta."""
+
+    def __init__(self, path: Path = MIRROR_PATH, properties: list[str] | None = None):
+        self.path = path
+        self.properties = properties or MIRROR_PROPERTIES
+        self._available = {p.lower(): p for p in self.properties}
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+        self._sync_lock = asyncio.Lock()
+        self._sync_task: asyncio.Task | None = None
+
+        # A different property set needs a full resync
+        if self._get_state("properties") != ",".join(self.properties):
+            self._reset()
+
+    def close(self) -> None:
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+        self._db.close()
+
+    def _get_state(self, key: str) -> str | None:
+        row = self._db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str | None) -> None:
+        if value is None:
+            self._db.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+        else:
+            self._db.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def _reset(self) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM users")
+            self._db.execute("DELETE FROM sync_state")
+            self._set_state("properties", ",".join(self.properties))
+
+    @property
+    def is_ready(self) -> bool:
+        """True once an initial sync has completed."""
+        return self._get_state("delta_link") is not None
+
+    @property
+    def synced_at(self) -> float | None:
+        value = self._get_state("synced_at")
+        return float(value) if value else None
+
+    @property
+    def user_count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def covers(self, select: list[str]) -> bool:
+        """Check whether every requested property is stored in the mirror."""
+        return all(p.lower() in self._available for p in select)
+
+    def _property(self, name: str) -> str:
+        """Resolve a property name case-insensitively to the name it is stored under."""
+        try:
+            return self._available[name.lower()]
+        except KeyError:
+            raise UnsupportedQuery(f"Property not in the mirror: {name}") from None
+
+    def _project(self, user: dict, select: list[str] | None) -> dict:
+        if select is None:
+            return user
+        wanted = {p.lower() for p in select}
+        return {k: v for k, v in user.items() if k.lower() in wanted}
+
+    def get_user(self, user_id: str, select: list[str] | None = None) -> dict | None:
+        """Look up a user by object ID or UPN."""
+        row = self._db.execute(
+            "SELECT data FROM users WHERE id = ? OR upn = ? LIMIT 1", (user_id, user_id)
+        ).fetchone()
+        return self._project(json.loads(row[0]), select) if row else None
+
+    def list_users(
+        self,
+        filter: str | None = None,
+        select: list[str] | None = None,
+        orderby: str | None = None,
+        search: str | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[dict], int]:
+        """
+        Query the mirror with a subset of OData list semantics.
+
+        Supports $filter clauses using eq/ne/startswith joined by "and",
+        a single-property $orderby, and '"prop:value"' $search clauses, on
+        the stored properties only; property names are case-insensitive.
+
+        Returns:
+            The matching users (up to limit) and the total number of matches
+
+        Raises:
+            UnsupportedQuery: If the query needs Graph to answer it
+        """
+        clauses, params = [], []
+        if filter:
+            filter_clauses, filter_params = _compile_filter(filter, self._property)
+            clauses.extend(filter_clauses)
+            params.extend(filter_params)
+        if search:
+            search_clause, search_params = _compile_search(search, self._property)
+            clauses.append(search_clause)
+            params.extend(search_params)
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = ""
+        if orderby:
+            match = _ORDERBY.match(orderby.strip())
+            if not match:
+                raise UnsupportedQuery(f"Unsupported orderby: {orderby}")
+            column = _json_path(self._property(match["prop"]))
+            order = f" ORDER BY {column} COLLATE NOCASE {(match['dir'] or 'asc').upper()}"
+
+        try:
+            total = self._db.execute(f"SELECT COUNT(*) FROM users{where}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT data FROM users{where}{order} LIMIT ?", [*params, -1 if limit is None else limit]
+            ).fetchall()
+        except sqlite3.Error as e:
+            raise UnsupportedQuery(str(e)) from e
+
+        return [self._project(json.loads(row[0]), select) for row in rows], total
+
+    def _apply_page(self, users: list[dict]) -> tuple[int, int]:
+        upserts = deletes = 0
+        for user in users:
+            if "@removed" in user:
+                self._db.execute("DELETE FROM users WHERE id = ?", (user["id"],))
+                deletes += 1
+                continue
+
+            # Delta pages may only carry the properties that changed
+            row = self._db.execute("SELECT data FROM users WHERE id = ?", (user["id"],)).fetchone()
+            merged = json.loads(row[0]) if row else {}
+            merged.update({k: v for k, v in user.items() if not k.startswith("@")})
+            self._db.execute(
+                "INSERT OR REPLACE INTO users (id, upn, data) VALUES (?, ?, ?)",
+                (merged["id"], merged.get("userPrincipalName"), json.dumps(merged)),
+            )
+            upserts += 1
+        return upserts, deletes
+
+    async def sync(self) -> dict:
+        """
+        Bring the mirror up to date.
+
+        Resumes an interrupted initial sync, otherwise runs a delta sync from
+        the stored deltaLink, or a full sync if there is none. If Graph
+        reports the delta token as expired (410), the mirror is rebuilt, at
+        most once per call.
+
+        Returns:
+            Summary with the number of pages, upserts and deletes applied
+
+        Raises:
+            httpx.HTTPStatusError: If Graph fails, or answers 410 again during the rebuild
+        """
+        async with self._sync_lock:
+            summary = {"pages": 0, "upserts": 0, "deletes": 0, "full": not self.is_ready}
+            resynced = False
+            link = (
+                self._get_state("next_link")
+                or self._get_state("delta_link")
+                or f"/users/delta?$select={','.join(self.properties)}"
+            )
+
+            while link:
+                try:
+                    page = await graph_request("GET", link)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 410 or resynced:
+                        raise
+                    self._reset()
+                    resynced = True
+                    summary["full"] = True
+                    link = f"/users/delta?$select={','.join(self.properties)}"
+                    continue
+
+                with self._db:
+                    upserts, deletes = self._apply_page(page.get("value", []))
+                    link = page.get("@odata.nextLink")
+                    self._set_state("next_link", link)
+                    if "@odata.deltaLink" in page:
+                        self._set_state("delta_link", page["@odata.deltaLink"])
+                        self._set_state("synced_at", str(time.time()))
+
+                summary["pages"] += 1
+                summary["upserts"] += upserts
+                summary["deletes"] += deletes
+
+            return summary
+
+    def sync_in_background(self) -> None:
+        """Start a sync task unless one is already running."""
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self.sync())
+            # Failures are retried on the next stale read or sync call
+            self._sync_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    def refresh_if_stale(self) -> None:
+        synced_at = self.synced_at
+        if synced_at is None or time.time() - synced_at > MIRROR_MAX_AGE:
+            self.sync_in_background()